@@ -0,0 +1,293 @@
+# admission.py
+from contextlib import asynccontextmanager, contextmanager
+from collections import Counter
+from typing import Optional
+from Timing import phase
+import asyncio, heapq, itertools, math, os, threading, time, logging
+
+logger = logging.getLogger(__name__)
+
+# Menor valor é atendido primeiro: chat interativo, depois imagem, depois jobs em segundo plano
+PRIORITIES = {"chat": 0, "image": 1, "batch": 2}
+
+
+class AdmissionRejected(Exception):
+    """Pedido recusado pelo controle de admissão; a rota responde `status` com Retry-After"""
+
+    def __init__(self, message: str, status: int = 503, retry_after: int = 5, reason: str = "queue_full"):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "endpoint", "user_id", "bounded", "state", "notify", "enqueued_at")
+
+    def __init__(self, priority, seq, endpoint, user_id, bounded, notify):
+        self.priority = priority
+        self.seq = seq
+        self.endpoint = endpoint
+        self.user_id = user_id
+        self.bounded = bounded
+        self.state = "waiting"  # waiting -> granted | shed | cancelled
+        self.notify = notify
+        self.enqueued_at = time.monotonic()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class Ticket:
+    """Vaga concedida; release() é idempotente"""
+    __slots__ = ("controller", "endpoint", "user_id", "granted_at", "released")
+
+    def __init__(self, controller, endpoint, user_id):
+        self.controller = controller
+        self.endpoint = endpoint
+        self.user_id = user_id
+        self.granted_at = time.monotonic()
+        self.released = False
+
+    def release(self):
+        self.controller.release(self)
+
+
+class AdmissionController:
+    """Limite global de chamadas simultâneas ao LLM, com fila por prioridade.
+
+    Até `max_concurrent` pedidos executam ao mesmo tempo; os demais esperam em uma fila
+    ordenada por prioridade (PRIORITIES) e chegada, por no máximo `queue_timeout` segundos.
+    Com a fila cheia, um pedido de prioridade maior desloca o pior da fila; se não houver
+    quem deslocar, é recusado na hora (503). Cada usuário tem no máximo `per_user_limit`
+    pedidos entre executando e na fila (429 acima disso). Jobs em segundo plano
+    (`background=True`) esperam sem prazo e fora do limite da fila.
+    Funciona tanto em threads (acquire/slot) quanto no asyncio (aacquire/aslot).
+    """
+
+    def __init__(self, max_concurrent: int = 32, max_queue: int = 128, queue_timeout: float = 15.0,
+                 per_user_limit: int = 4):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.per_user_limit = per_user_limit
+        self._lock = threading.Lock()
+        self._heap = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._queued_bounded = 0
+        self._queued_by_endpoint = Counter()
+        self._per_user = Counter()  # executando + na fila
+        self._admitted = Counter()
+        self._rejected = Counter()
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._hold_total = 0.0
+        self._released = 0
+
+    # ----------------- API síncrona -----------------
+    def acquire(self, endpoint: str, user_id: Optional[int] = None, background: bool = False) -> Ticket:
+        event = threading.Event()
+        waiter = self._enqueue(endpoint, user_id, background, event.set)
+        if waiter is None:
+            return Ticket(self, endpoint, user_id)
+        with phase("queue"):
+            event.wait(None if background else self.queue_timeout)
+        return self._settle(waiter)
+
+    @contextmanager
+    def slot(self, endpoint: str, user_id: Optional[int] = None, background: bool = False):
+        ticket = self.acquire(endpoint, user_id, background)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    # ----------------- API assíncrona -----------------
+    async def aacquire(self, endpoint: str, user_id: Optional[int] = None, background: bool = False) -> Ticket:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def notify():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = self._enqueue(endpoint, user_id, background, notify)
+        if waiter is None:
+            return Ticket(self, endpoint, user_id)
+        try:
+            with phase("queue"):
+                await asyncio.wait_for(asyncio.shield(future), None if background else self.queue_timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        return self._settle(waiter)
+
+    @asynccontextmanager
+    async def aslot(self, endpoint: str, user_id: Optional[int] = None, background: bool = False):
+        ticket = await self.aacquire(endpoint, user_id, background)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    # ----------------- Fila -----------------
+    def _enqueue(self, endpoint: str, user_id: Optional[int], background: bool, notify) -> Optional[_Waiter]:
+        """None se a vaga foi concedida na hora; senão o _Waiter na fila"""
+        priority = PRIORITIES.get(endpoint, max(PRIORITIES.values()))
+        shed = None
+        with self._lock:
+            if not background and user_id is not None and self._per_user[user_id] >= self.per_user_limit:
+                self._rejected["user_limit"] += 1
+                raise AdmissionRejected(
+                    f"Limite de {self.per_user_limit} pedidos simultâneos por usuário atingido",
+                    status=429, retry_after=self._retry_after(), reason="user_limit",
+                )
+            if self._active < self.max_concurrent and not sum(self._queued_by_endpoint.values()):
+                self._grant_now(endpoint, user_id)
+                return None
+
+            bounded = not background
+            if bounded and self._queued_bounded >= self.max_queue:
+                shed = self._worst_bounded()
+                if shed is None or shed.priority <= priority:
+                    self._rejected["queue_full"] += 1
+                    raise AdmissionRejected(
+                        "Servidor ocupado, tente novamente em instantes",
+                        status=503, retry_after=self._retry_after(), reason="queue_full",
+                    )
+                self._remove(shed, "shed")
+                self._rejected["shed"] += 1
+
+            waiter = _Waiter(priority, next(self._seq), endpoint, user_id, bounded, notify)
+            heapq.heappush(self._heap, waiter)
+            self._queued_by_endpoint[endpoint] += 1
+            self._queued_bounded += bounded
+            if user_id is not None:
+                self._per_user[user_id] += 1
+        if shed is not None:
+            shed.notify()
+        return waiter
+
+    def _settle(self, waiter: _Waiter) -> Ticket:
+        """Depois da espera: devolve a vaga ou remove o pedido da fila e recusa"""
+        with self._lock:
+            if waiter.state == "granted":
+                wait = time.monotonic() - waiter.enqueued_at
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+                return Ticket(self, waiter.endpoint, waiter.user_id)
+            if waiter.state == "shed":
+                raise AdmissionRejected(
+                    "Servidor ocupado, tente novamente em instantes",
+                    status=503, retry_after=self._retry_after(), reason="shed",
+                )
+            self._remove(waiter, "cancelled")
+            self._rejected["timeout"] += 1
+            raise AdmissionRejected(
+                f"Tempo de espera na fila esgotado ({self.queue_timeout:.0f} s)",
+                status=503, retry_after=self._retry_after(), reason="timeout",
+            )
+
+    def _abandon(self, waiter: _Waiter):
+        """Cliente desistiu durante a espera: sai da fila ou devolve a vaga já concedida"""
+        with self._lock:
+            granted = waiter.state == "granted"
+            if waiter.state == "waiting":
+                self._remove(waiter, "cancelled")
+        if granted:
+            self.release(Ticket(self, waiter.endpoint, waiter.user_id))
+
+    def release(self, ticket: Ticket):
+        granted = []
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            self._active -= 1
+            if ticket.user_id is not None and self._per_user[ticket.user_id] > 0:
+                self._per_user[ticket.user_id] -= 1
+                if not self._per_user[ticket.user_id]:
+                    del self._per_user[ticket.user_id]
+            self._hold_total += time.monotonic() - ticket.granted_at
+            self._released += 1
+            while self._heap and self._active < self.max_concurrent:
+                waiter = heapq.heappop(self._heap)
+                if waiter.state != "waiting":
+                    continue  # removido por timeout/deslocamento
+                self._dequeued(waiter)
+                waiter.state = "granted"
+                self._active += 1
+                self._admitted[waiter.endpoint] += 1
+                if waiter.user_id is not None:
+                    self._per_user[waiter.user_id] += 1
+                granted.append(waiter)
+        for waiter in granted:
+            waiter.notify()
+
+    def _grant_now(self, endpoint: str, user_id: Optional[int]):
+        self._active += 1
+        self._admitted[endpoint] += 1
+        if user_id is not None:
+            self._per_user[user_id] += 1
+
+    def _worst_bounded(self) -> Optional[_Waiter]:
+        candidates = [w for w in self._heap if w.state == "waiting" and w.bounded]
+        return max(candidates) if candidates else None
+
+    def _remove(self, waiter: _Waiter, state: str):
+        """Tira o pedido da fila (o heap é limpo preguiçosamente em release)"""
+        waiter.state = state
+        self._dequeued(waiter)
+
+    def _dequeued(self, waiter: _Waiter):
+        self._queued_by_endpoint[waiter.endpoint] -= 1
+        self._queued_bounded -= waiter.bounded
+        if waiter.user_id is not None:
+            self._per_user[waiter.user_id] -= 1
+            if not self._per_user[waiter.user_id]:
+                del self._per_user[waiter.user_id]
+
+    def _retry_after(self) -> int:
+        """Estimativa em segundos para a fila atual escoar (entre 1 e 60)"""
+        avg_hold = self._hold_total / self._released if self._released else 5.0
+        queued = sum(self._queued_by_endpoint.values())
+        return max(1, min(60, math.ceil((queued / self.max_concurrent + 1) * avg_hold)))
+
+    def stats(self) -> dict:
+        with self._lock:
+            admitted = sum(self._admitted.values())
+            return {
+                "max_concurrent": self.max_concurrent,
+                "in_flight": self._active,
+                "queue_depth": sum(self._queued_by_endpoint.values()),
+                "queue_depth_by_endpoint": {k: v for k, v in self._queued_by_endpoint.items() if v},
+                "admitted": dict(self._admitted),
+                "rejected": dict(self._rejected),
+                "wait_ms_avg": round(self._wait_total / admitted * 1000, 2) if admitted else 0.0,
+                "wait_ms_max": round(self._wait_max * 1000, 2),
+                "wait_ms_total": round(self._wait_total * 1000, 2),
+            }
+
+
+# ----------------- Instância do processo -----------------
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> Optional[AdmissionController]:
+    """Controle compartilhado do processo, ou None se ADMISSION_ENABLED=0"""
+    global _controller
+    if os.getenv("ADMISSION_ENABLED", "1") != "1":
+        return None
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController(
+                    max_concurrent=int(os.getenv("ADMISSION_MAX_CONCURRENT", 32)),
+                    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", 128)),
+                    queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 15)),
+                    per_user_limit=int(os.getenv("ADMISSION_PER_USER_LIMIT", 4)),
+                )
+    return _controller
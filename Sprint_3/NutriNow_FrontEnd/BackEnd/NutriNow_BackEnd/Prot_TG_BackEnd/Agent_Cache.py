@@ -0,0 +1,138 @@
+# agent_cache.py
+from collections import OrderedDict
+from typing import Callable
+import threading, time, logging
+
+logger = logging.getLogger(__name__)
+
+
+class AgentCache:
+    """Cache limitado de NutritionistAgent por sessão.
+
+    Despeja por uso menos recente (LRU), por tempo ocioso (TTL) e, opcionalmente,
+    por um orçamento aproximado de memória. Agentes despejados são fechados na hora
+    com agent.close(). O total de bytes é mantido a cada inserção e despejo; só o tamanho
+    da entrada acessada é recalculado, nunca o de todas.
+    """
+
+    def __init__(self, max_entries: int = 256, idle_ttl: float = 1800, max_bytes: int = 0):
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> [agent, last_used, approx_size]
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = {"lru": 0, "ttl": 0, "memory": 0}
+
+    def get_or_create(self, key: str, factory: Callable[[], object]):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[1] = time.monotonic()
+                self._entries.move_to_end(key)
+                self._refresh_size(entry)
+                self._hits += 1
+                evicted = self._collect_evictions()
+            else:
+                self._misses += 1
+        if entry is not None:
+            self._close(evicted)
+            return entry[0]
+
+        # Criação fora do lock para não serializar as outras sessões
+        agent = factory()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                # Outra thread criou o mesmo agente enquanto isso
+                duplicate, agent = agent, entry[0]
+                entry[1] = time.monotonic()
+            else:
+                duplicate = None
+                size = self._approx_size(agent)
+                self._entries[key] = [agent, time.monotonic(), size]
+                self._total_bytes += size
+            evicted = self._collect_evictions()
+        if duplicate is not None:
+            evicted.append(duplicate)
+        self._close(evicted)
+        return agent
+
+    def pop(self, key: str):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._total_bytes -= entry[2]
+        if entry is not None:
+            self._close([entry[0]])
+
+    def evict_expired(self):
+        with self._lock:
+            evicted = self._collect_evictions()
+        self._close(evicted)
+
+    def clear(self):
+        with self._lock:
+            agents = [entry[0] for entry in self._entries.values()]
+            self._entries.clear()
+            self._total_bytes = 0
+        self._close(agents)
+
+    # ----------------- Funções auxiliares -----------------
+    def _collect_evictions(self) -> list:
+        """Remove as entradas excedentes; chamar com o lock adquirido"""
+        evicted = []
+        now = time.monotonic()
+        if self.idle_ttl:
+            for key, (_, last_used, _) in list(self._entries.items()):
+                # OrderedDict em ordem de uso: a primeira entrada recente encerra a varredura
+                if now - last_used < self.idle_ttl:
+                    break
+                evicted.append(self._evict_oldest("ttl"))
+        while len(self._entries) > self.max_entries:
+            evicted.append(self._evict_oldest("lru"))
+        if self.max_bytes:
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                evicted.append(self._evict_oldest("memory"))
+        return evicted
+
+    def _evict_oldest(self, reason: str):
+        """Remove a entrada menos recente e desconta o seu tamanho; chamar com o lock adquirido"""
+        _, (agent, _, size) = self._entries.popitem(last=False)
+        self._total_bytes -= size
+        self._evictions[reason] += 1
+        return agent
+
+    def _refresh_size(self, entry: list):
+        """Atualiza o tamanho da entrada acessada (o histórico cresce a cada turno)"""
+        size = self._approx_size(entry[0])
+        self._total_bytes += size - entry[2]
+        entry[2] = size
+
+    @staticmethod
+    def _approx_size(agent) -> int:
+        try:
+            return agent.approx_size()
+        except Exception:
+            return 0
+
+    @staticmethod
+    def _close(agents: list):
+        for agent in agents:
+            try:
+                agent.close()
+            except Exception as e:
+                logger.error(f"Erro ao fechar agente despejado: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "approx_bytes": self._total_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": dict(self._evictions),
+            }
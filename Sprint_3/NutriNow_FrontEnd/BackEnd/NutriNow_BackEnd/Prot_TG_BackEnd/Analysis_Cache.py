@@ -0,0 +1,237 @@
+# analysis_cache.py
+from collections import OrderedDict
+from typing import Optional
+import hashlib, os, sqlite3, threading, time, logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "analysis_cache.db")
+
+
+def make_cache_key(image_bytes: bytes, model: str, prompt_version: str) -> str:
+    """SHA-256 do JPEG normalizado + modelo + versão do prompt"""
+    digest = hashlib.sha256()
+    digest.update(f"{model}|{prompt_version}|".encode("utf-8"))
+    digest.update(image_bytes)
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """Cache de resultados do FoodAnalyser endereçado por conteúdo.
+
+    Duas camadas: LRU em memória do processo e SQLite local (sobrevive a reinícios
+    e é compartilhado entre workers da mesma máquina), com TTL e limite de entradas.
+    O SQLite também guarda o índice de hashes perceptuais por usuário.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, memory_entries: int = 256,
+                 ttl: float = 7 * 24 * 3600, max_entries: int = 10000,
+                 phash_max_distance: int = 5, phash_window: float = 24 * 3600, color_tolerance: int = 24):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.phash_max_distance = phash_max_distance
+        self.phash_window = phash_window
+        self.color_tolerance = color_tolerance
+        self._memory = OrderedDict()  # key -> (texto, criado_em)
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db = None
+        self._puts = 0
+        self._hits_memory = 0
+        self._hits_disk = 0
+        self._misses = 0
+        self._near_duplicates = 0
+
+    # ----------------- Camada persistente -----------------
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS analysis_cache (
+                    key TEXT PRIMARY KEY,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_access ON analysis_cache (last_access)")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS phash_index (
+                    user_id INTEGER NOT NULL,
+                    phash TEXT NOT NULL,
+                    color TEXT NOT NULL,
+                    cache_key TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_phash_user ON phash_index (user_id, created_at)")
+            self._db.commit()
+        return self._db
+
+    def _disk_get(self, key: str) -> Optional[tuple]:
+        now = time.time()
+        with self._db_lock:
+            db = self._connection()
+            row = db.execute("SELECT result, created_at FROM analysis_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                db.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+                db.commit()
+                return None
+            db.execute("UPDATE analysis_cache SET last_access = ? WHERE key = ?", (now, key))
+            db.commit()
+            return row
+
+    def _disk_put(self, key: str, result: str, created_at: float):
+        with self._db_lock:
+            db = self._connection()
+            db.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, result, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, result, created_at, created_at)
+            )
+            self._puts += 1
+            # Limpeza periódica: expirados e excedentes (menos acessados primeiro)
+            if self._puts % 100 == 1:
+                db.execute("DELETE FROM analysis_cache WHERE created_at < ?", (time.time() - self.ttl,))
+                count = db.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+                if count > self.max_entries:
+                    db.execute(
+                        """
+                        DELETE FROM analysis_cache WHERE key IN (
+                            SELECT key FROM analysis_cache ORDER BY last_access ASC LIMIT ?
+                        )
+                        """,
+                        (count - self.max_entries,)
+                    )
+            db.commit()
+
+    # ----------------- API pública -----------------
+    def get(self, key: str, count_miss: bool = True) -> Optional[str]:
+        """Resultado em cache ou None; count_miss=False para consultas preliminares"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self._memory.move_to_end(key)
+                self._hits_memory += 1
+                return entry[0]
+            if entry is not None:
+                del self._memory[key]
+
+        try:
+            row = self._disk_get(key)
+        except sqlite3.Error as e:
+            logger.warning(f"Cache de análises indisponível: {e}")
+            row = None
+
+        with self._lock:
+            if row is None:
+                if count_miss:
+                    self._misses += 1
+                return None
+            self._hits_disk += 1
+            self._remember(key, row[0], row[1])
+            return row[0]
+
+    def put(self, key: str, result: str):
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, result, created_at)
+        try:
+            self._disk_put(key, result, created_at)
+        except sqlite3.Error as e:
+            logger.warning(f"Falha ao gravar no cache de análises: {e}")
+
+    # ----------------- Índice perceptual (quase duplicatas) -----------------
+    def add_perceptual(self, user_id: int, phash: int, color: tuple, cache_key: str):
+        try:
+            with self._db_lock:
+                db = self._connection()
+                db.execute(
+                    "INSERT INTO phash_index (user_id, phash, color, cache_key, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (user_id, f"{phash:016x}", "%02x%02x%02x" % tuple(color), cache_key, time.time())
+                )
+                db.execute("DELETE FROM phash_index WHERE created_at < ?", (time.time() - self.ttl,))
+                db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Falha ao gravar hash perceptual: {e}")
+
+    def find_similar(self, user_id: int, phash: int, color: tuple) -> Optional[str]:
+        """Chave da análise recente do usuário com menor distância de Hamming dentro do limite"""
+        if self.phash_max_distance <= 0:
+            return None
+        since = time.time() - self.phash_window
+        try:
+            with self._db_lock:
+                rows = self._connection().execute(
+                    """
+                    SELECT phash, color, cache_key FROM phash_index
+                    WHERE user_id = ? AND created_at >= ?
+                    ORDER BY created_at DESC
+                    LIMIT 200
+                    """,
+                    (user_id, since)
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Índice perceptual indisponível: {e}")
+            return None
+
+        best_key, best_distance = None, self.phash_max_distance + 1
+        for stored, stored_color, cache_key in rows:
+            distance = (int(stored, 16) ^ phash).bit_count()
+            stored_rgb = bytes.fromhex(stored_color)
+            if any(abs(a - b) > self.color_tolerance for a, b in zip(stored_rgb, color)):
+                continue
+            if distance < best_distance:
+                best_key, best_distance = cache_key, distance
+        with self._lock:
+            if best_key:
+                self._near_duplicates += 1
+        return best_key
+
+    def _remember(self, key: str, result: str, created_at: float):
+        """Insere na camada LRU em memória; chamar com o lock adquirido"""
+        self._memory[key] = (result, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits_memory + self._hits_disk + self._misses
+            return {
+                "memory_entries": len(self._memory),
+                "hits_memory": self._hits_memory,
+                "hits_disk": self._hits_disk,
+                "misses": self._misses,
+                "near_duplicates": self._near_duplicates,
+                "hit_rate": round((self._hits_memory + self._hits_disk) / lookups, 4) if lookups else 0.0,
+            }
+
+
+# ----------------- Instância do processo -----------------
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_analysis_cache() -> Optional[AnalysisCache]:
+    """Cache compartilhado do processo, ou None se ANALYSIS_CACHE_ENABLED=0"""
+    global _cache
+    if os.getenv("ANALYSIS_CACHE_ENABLED", "1") != "1":
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnalysisCache(
+                    path=os.getenv("ANALYSIS_CACHE_PATH", DEFAULT_CACHE_PATH),
+                    memory_entries=int(os.getenv("ANALYSIS_CACHE_MEMORY_ENTRIES", 256)),
+                    ttl=float(os.getenv("ANALYSIS_CACHE_TTL", 7 * 24 * 3600)),
+                    max_entries=int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", 10000)),
+                    phash_max_distance=int(os.getenv("PHASH_MAX_DISTANCE", 5)),
+                    phash_window=float(os.getenv("PHASH_WINDOW_HOURS", 24)) * 3600,
+                )
+    return _cache
@@ -1,9 +1,24 @@
-from flask import Flask, request, jsonify, session
+from flask import Flask, Response, request, jsonify, session, stream_with_context, g
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
-from Nutri import NutritionistAgent
+from werkzeug.exceptions import RequestEntityTooLarge
+from Nutri import NutritionistAgent, MySQLChatHistory, ChatStreamError
+from Database import get_db_connection, pool_stats
+from Agent_Cache import AgentCache
+from Schema import bootstrap_schema
+from Jobs import ImageJobQueue, JobQueueFull, AnalysisFailed
+from Analysis_Cache import get_analysis_cache
+from Rate_Limiter import get_model_rate_limiter
+from Chat_Writer import writer_stats
+from Meals import save_meal_analysis, nutrition_summary
+from Response_Cache import get_response_cache
+from Intent_Router import get_intent_router
+from Admission import get_admission_controller, AdmissionRejected, PRIORITIES
+from Metrics import REGISTRY, observe_request, render as render_metrics
+from Timing import phase, start_request, finish_request
+from Upload_Storage import get_upload_storage, size_limit_message, UploadTooLarge, FORM_OVERHEAD_BYTES
 import mysql.connector
-import os, uuid, logging
+import os, uuid, logging, json, time, threading
 from datetime import datetime
 import smtplib
 from email.mime.text import MIMEText
@@ -23,39 +38,98 @@ app.config.update(
     SESSION_COOKIE_SECURE=False,    # HTTPS = True, localhost = False
 )
 
-# CORS
-CORS(app, resources={r"/*": {"origins": "http://localhost:4200"}}, supports_credentials=True)
+# CORS (o modo ASGI, em Asgi.py, aplica a mesma origem)
+CORS_ORIGIN = "http://localhost:4200"
+CORS(app, resources={r"/*": {"origins": CORS_ORIGIN}}, supports_credentials=True)
 
 # Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-UPLOAD_FOLDER = r"C:\Users\eduar\Pictures\Uploads"
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# ---------------- Métricas e tempo por fase ----------------
+# Rótulo é o padrão da rota (ex.: /analyze_image/<job_id>), não o caminho, para não
+# explodir a cardinalidade. Em respostas em streaming mede até o início da resposta.
+# As fases (db, file, image, llm, queue) vão no cabeçalho Server-Timing (Timing.py).
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.timing_token = start_request()
 
-# ---------------- Conexão MySQL ----------------
-def get_db_connection():
-    return mysql.connector.connect(
-        host=os.getenv('MYSQL_HOST', 'localhost'),
-        user=os.getenv('MYSQL_USER', 'root'),
-        password=os.getenv('MYSQL_PASSWORD', ''),
-        database=os.getenv('MYSQL_DATABASE', 'nutrinow2')
-    )
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        observe_request(route, request.method, response.status_code, time.perf_counter() - started)
+        server_timing = finish_request(g.pop("timing_token"), route, request.method, response.status_code)
+        if server_timing:
+            response.headers["Server-Timing"] = server_timing
+    return response
+
+# ---------------- Uploads ----------------
+# Arquivos endereçados por conteúdo em UPLOAD_ROOT (Upload_Storage). O Werkzeug recusa
+# corpos acima do limite ainda durante a leitura, antes de montar o formulário.
+upload_storage = get_upload_storage()
+app.config["MAX_CONTENT_LENGTH"] = upload_storage.max_bytes + FORM_OVERHEAD_BYTES
+
+# ---------------- Esquema do banco ----------------
+# Migrações rodam uma vez por processo, na subida; as rotas não executam DDL
+@app.cli.command("init-db")
+def init_db_command():
+    """Aplica as migrações pendentes do esquema"""
+    print(f"Esquema na versão {bootstrap_schema()}")
+
+if os.getenv("NUTRINOW_AUTO_MIGRATE", "1") == "1":
+    try:
+        logger.info(f"Esquema do banco na versão {bootstrap_schema()}")
+    except Exception as e:
+        logger.error(f"Falha ao aplicar migrações do esquema: {e}")
 
 # ---------------- Cache de agentes ----------------
-agent_cache = {}
+agent_cache = AgentCache(
+    max_entries=int(os.getenv("AGENT_CACHE_MAX_ENTRIES", 256)),
+    idle_ttl=float(os.getenv("AGENT_CACHE_IDLE_TTL", 1800)),
+    max_bytes=int(float(os.getenv("AGENT_CACHE_MAX_MB", 0)) * 1024 * 1024),
+)
+
 def get_agent(session_id: str, user_id: int = None, email: str = None):
-    global agent_cache
     if not session_id:
         session_id = 'anon'
     key = f"{user_id}_{session_id}"
-    if key in agent_cache:
-        return agent_cache[key]
-    logger.info(f"Criando novo NutritionistAgent para user_id={user_id}, session_id={session_id}")
-    mysql_config = None
-    agent = NutritionistAgent(session_id=session_id, mysql_config=mysql_config, user_id=user_id, email=email)
-    agent_cache[key] = agent
-    return agent
+
+    def create_agent():
+        logger.info(f"Criando novo NutritionistAgent para user_id={user_id}, session_id={session_id}")
+        return NutritionistAgent(session_id=session_id, mysql_config=None, user_id=user_id, email=email)
+
+    return agent_cache.get_or_create(key, create_agent)
+
+# ---------------- Controle de admissão ----------------
+# Limita as chamadas simultâneas ao Gemini; pedidos excedentes esperam em fila por
+# prioridade (chat > imagem > jobs) ou recebem 429/503 com Retry-After
+admission = get_admission_controller()
+
+def admission_response(e: AdmissionRejected):
+    return jsonify({"success": False, "error": str(e), "reason": e.reason}), e.status, {"Retry-After": str(e.retry_after)}
+
+app.register_error_handler(AdmissionRejected, admission_response)
+
+def admission_metrics() -> list:
+    if admission is None:
+        return []
+    stats = admission.stats()
+    return [
+        ("nutrinow_admission_in_flight", "gauge", "Chamadas ao LLM em execução", [({}, stats["in_flight"])]),
+        ("nutrinow_admission_queue_depth", "gauge", "Pedidos na fila de admissão por rota",
+         [({"endpoint": endpoint}, stats["queue_depth_by_endpoint"].get(endpoint, 0)) for endpoint in PRIORITIES]),
+        ("nutrinow_admission_admitted_total", "counter", "Pedidos admitidos por rota",
+         [({"endpoint": endpoint}, count) for endpoint, count in stats["admitted"].items()]),
+        ("nutrinow_admission_rejected_total", "counter", "Pedidos recusados por motivo",
+         [({"reason": reason}, count) for reason, count in stats["rejected"].items()]),
+        ("nutrinow_admission_wait_seconds_total", "counter", "Tempo total de espera na fila",
+         [({}, stats["wait_ms_total"] / 1000)]),
+    ]
+
+REGISTRY.register_collector(admission_metrics)
 
 # ---------------- Rotas de autenticação ----------------
 @app.route("/cadastro", methods=["POST"])
@@ -158,19 +232,101 @@ def chat():
         return jsonify({"error": "Mensagem vazia"}), 400
 
     agent = get_agent(session_id=session_id, user_id=user_id, email=email)
+    if "text/event-stream" in request.headers.get("Accept", ""):
+        return stream_chat_response(agent, session_id, message)
+    # A vaga de admissão é obtida pelo agente só quando há chamada ao modelo
     response_text = agent.run_text(message)
     return jsonify({"success": True, "session_id": session_id, "response": response_text}), 200
 
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    if "user_id" not in session:
+        return jsonify({"error": "Usuário não autenticado"}), 401
+
+    session_id = request.headers.get("X-Session-ID") or str(uuid.uuid4())
+    data = request.get_json()
+    message = data.get("message")
+    if not message:
+        return jsonify({"error": "Mensagem vazia"}), 400
+
+    agent = get_agent(session_id=session_id, user_id=session.get("user_id"), email=session.get("user_email"))
+    return stream_chat_response(agent, session_id, message)
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def stream_chat_response(agent, session_id: str, message: str):
+    """Server-Sent Events: 'start', um 'token' por pedaço do modelo e 'done' ao final.
+
+    Se o modelo falhar no meio, 'done' sai com success=False e a mensagem em 'error'
+    (os tokens já enviados não formam uma resposta válida).
+    """
+    # A vaga é obtida antes da resposta (para poder responder 429/503) e devolvida ao fechá-la
+    ticket = agent.stream_ticket(message)
+
+    def generate():
+        yield sse_event("start", {"session_id": session_id})
+        try:
+            for token in agent.stream_text(message):
+                yield sse_event("token", {"token": token})
+        except ChatStreamError as e:
+            yield sse_event("done", {"success": False, "session_id": session_id, "error": str(e)})
+            return
+        yield sse_event("done", {"success": True, "session_id": session_id})
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    if ticket is not None:
+        response.call_on_close(ticket.release)
+    return response
+
+def cursor_arg(name: str) -> int:
+    """Cursor de paginação (id de mensagem) da query string; None se ausente.
+
+    Levanta ValueError para qualquer coisa que não seja um inteiro >= 0: com type=int o
+    Flask trocaria o valor inválido por None e devolveria a primeira página em silêncio.
+    """
+    value = request.args.get(name)
+    if value is None:
+        return None
+    if not (value.isascii() and value.isdigit()):
+        raise ValueError(f"{name} inválido: {value!r}")
+    return int(value)
+
 @app.route("/chat_history", methods=["GET"])
 def chat_history():
     if "user_id" not in session:
         return jsonify({"error": "Usuário não autenticado"}), 401
 
+    try:
+        limit = min(max(int(request.args.get("limit", 50)), 1), 200)
+        before_id = cursor_arg("before_id")
+        after_id = cursor_arg("after_id")
+    except ValueError:
+        return jsonify({"error": "Parâmetros de paginação inválidos"}), 400
+    if before_id is not None and after_id is not None:
+        return jsonify({"error": "Use before_id ou after_id, não ambos"}), 400
+
     session_id = request.args.get("session_id") or str(uuid.uuid4())
     user_id = session.get("user_id")
-    agent = get_agent(session_id=session_id, user_id=user_id)
-    history = agent.get_conversation_history(by_user=True)
-    return jsonify({"success": True, "history": history})
+
+    # Leitura direta do histórico: não precisa construir (nem cachear) um agente
+    history = MySQLChatHistory(session_id=session_id, user_id=user_id, email=None)
+    try:
+        page = history.get_history_page(by_user=True, before_id=before_id, after_id=after_id, limit=limit)
+    except mysql.connector.Error as e:
+        logger.error(f"Erro MySQL ao buscar histórico: {e}")
+        return jsonify({"error": "Erro no banco de dados"}), 500
+
+    return jsonify({
+        "success": True,
+        "history": page["messages"],
+        "next_cursor": page["next_cursor"],
+        "has_more": page["has_more"],
+    })
 
 @app.route("/analyze_image", methods=["POST", "OPTIONS"])
 def analyze_image():
@@ -199,43 +355,245 @@ def analyze_image():
         if message_type not in ['human', 'ai']:
             return jsonify({"error": "message_type inválido"}), 400
 
-        # Salva arquivo no servidor
-        file_ext = os.path.splitext(file.filename)[1]
-        filename = f"{uuid.uuid4()}{file_ext}"
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(file_path)
-
-        # Salva no banco de dados
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO uploads (user_id, file_path, uploaded_at, message_type) VALUES (%s, %s, NOW(), %s)",
-            (user_id, file_path, message_type)
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
+        # Modo assíncrono com a fila cheia: recusa antes de gravar arquivo e linha em uploads
+        async_mode = is_async_request()
+        if async_mode:
+            image_jobs.check_capacity()
+
+        # Salva o arquivo (uma cópia por conteúdo) e registra no banco
+        with phase("file"):
+            blob = upload_storage.save_stream(file.stream, file.filename)
+        file_path = blob["path"]
+        upload_id = save_upload(user_id, file_path, message_type, blob["content_hash"])
+
+        # Modo assíncrono: devolve o job na hora e analisa em segundo plano
+        if async_mode:
+            job_id = submit_image_job(user_id, session_id, email, upload_id, file_path)
+            return jsonify({
+                "success": True,
+                "session_id": session_id,
+                "file_path": file_path,
+                "message_type": message_type,
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": f"/analyze_image/{job_id}",
+            }), 202
 
         # Processa imagem com o agente
-        agent = get_agent(session_id=session_id, user_id=user_id, email=email)
-        analysis_result = agent.run_image(file_path)
+        # A vaga de admissão é obtida pelo FoodAnalyser só se a imagem precisar do modelo
+        analysis = run_image_analysis(session_id, user_id, email, upload_id, file_path)
 
         return jsonify({
             "success": True,
             "session_id": session_id,
             "file_path": file_path,
             "message_type": message_type,
-            "response": analysis_result
+            "response": analysis["text"],
+            "cache_hit": analysis["cache_hit"],
+            "reused": analysis["reused"],
         }), 200
 
+    except (UploadTooLarge, RequestEntityTooLarge):
+        return upload_too_large()
+    except JobQueueFull as e:
+        return jsonify({"success": False, "error": str(e)}), 503, {"Retry-After": "5"}
+    except AdmissionRejected as e:
+        return admission_response(e)
     except Exception as e:
         logger.exception("Erro no endpoint /analyze_image")
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route("/analyze_image/<job_id>", methods=["GET"])
+def analyze_image_status(job_id):
+    if "user_id" not in session:
+        return jsonify({"error": "Usuário não autenticado"}), 401
+
+    try:
+        job = image_jobs.get(job_id, session["user_id"])
+    except mysql.connector.Error as e:
+        logger.error(f"Erro MySQL ao buscar job: {e}")
+        return jsonify({"error": "Erro no banco de dados"}), 500
+    if job is None:
+        return jsonify({"error": "Job não encontrado"}), 404
+
+    return jsonify({
+        "success": job["status"] != "error",
+        "job_id": job["id"],
+        "status": job["status"],
+        "response": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }), 200
+
+@app.route("/nutricao/resumo", methods=["GET"])
+def nutrition_summary_route():
+    """Totais de nutrientes do dia, da semana e do mês (?data=AAAA-MM-DD, padrão hoje)"""
+    if "user_id" not in session:
+        return jsonify({"error": "Usuário não autenticado"}), 401
+
+    try:
+        day = datetime.strptime(request.args["data"], "%Y-%m-%d").date() if request.args.get("data") else None
+    except ValueError:
+        return jsonify({"error": "Data inválida, use AAAA-MM-DD"}), 400
+
+    try:
+        summary = nutrition_summary(session["user_id"], day)
+    except mysql.connector.Error as e:
+        logger.error(f"Erro MySQL ao buscar resumo nutricional: {e}")
+        return jsonify({"error": "Erro no banco de dados"}), 500
+    return jsonify({"success": True, **summary}), 200
+
+def is_async_request() -> bool:
+    return wants_async(request.args.get("async") or request.form.get("async"), request.headers.get("Prefer"))
+
+def wants_async(flag: str, prefer: str) -> bool:
+    """?async=1 / campo async=1 ou o cabeçalho Prefer: respond-async"""
+    return (flag or "").lower() in ("1", "true") or "respond-async" in (prefer or "")
+
+def upload_too_large():
+    return jsonify({"success": False, "error": size_limit_message(upload_storage.max_bytes)}), 413
+
+def save_upload(user_id: int, file_path: str, message_type: str, content_hash: str = None) -> int:
+    """Registra o arquivo enviado na tabela uploads e devolve o id"""
+    with phase("db"):
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "INSERT INTO uploads (user_id, file_path, content_hash, uploaded_at, message_type) "
+                "VALUES (%s, %s, %s, NOW(), %s)",
+                (user_id, file_path, content_hash, message_type)
+            )
+            upload_id = cursor.lastrowid
+            conn.commit()
+            return upload_id
+        finally:
+            cursor.close()
+            conn.close()
+
+def delete_upload(upload_id: int):
+    """Desfaz save_upload quando o job não chega a entrar na fila (o blob fica: pode ser compartilhado)"""
+    with phase("db"):
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("DELETE FROM uploads WHERE id = %s", (upload_id,))
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+def submit_image_job(user_id: int, session_id: str, email: str, upload_id: int, file_path: str) -> str:
+    """image_jobs.submit; se a fila encheu desde o check_capacity, apaga a linha do upload"""
+    try:
+        return image_jobs.submit(user_id, session_id, email, upload_id, file_path)
+    except JobQueueFull:
+        try:
+            delete_upload(upload_id)
+        except Exception as e:
+            logger.error(f"Falha ao remover o upload {upload_id} recusado pela fila: {e}")
+        raise
+
+def run_image_analysis(session_id: str, user_id: int, email: str, upload_id: int, file_path: str,
+                       endpoint: str = "image", background: bool = False) -> dict:
+    """Análise de uma imagem já salva; usada pela rota síncrona e pelos workers da fila"""
+    agent = get_agent(session_id=session_id, user_id=user_id, email=email)
+    analysis = agent.run_image_detailed(file_path, endpoint=endpoint, background=background)
+    record_meal(upload_id, analysis)
+    return analysis
+
+def record_meal(upload_id: int, analysis: dict):
+    """Grava os nutrientes em meal_analyses; falhas só vão para o log, a resposta segue igual"""
+    if not analysis.get("ok"):
+        return
+    try:
+        save_meal_analysis(upload_id, analysis)
+    except Exception as e:
+        logger.error(f"Falha ao gravar nutrientes do upload {upload_id}: {e}")
+
+# ---------------- Fila de análises assíncronas ----------------
+def run_image_job(job: dict) -> str:
+    # Jobs esperam a vez sem prazo, atrás do chat e das análises síncronas
+    analysis = run_image_analysis(
+        job["session_id"], job["user_id"], job["email"], job["upload_id"], job["file_path"],
+        endpoint="batch", background=True,
+    )
+    if not analysis.get("ok"):
+        raise AnalysisFailed(analysis["text"])
+    return analysis["text"]
+
+image_jobs = ImageJobQueue(
+    runner=run_image_job,
+    max_workers=int(os.getenv("IMAGE_JOB_WORKERS", 4)),
+    max_pending=int(os.getenv("IMAGE_JOB_MAX_PENDING", 100)),
+    lease_seconds=float(os.getenv("IMAGE_JOB_LEASE_SECONDS", 600)),
+)
+
+def recover_image_jobs() -> int:
+    """Reenfileira jobs pendentes; use recover_image_jobs_once na subida do servidor, não no import"""
+    try:
+        return image_jobs.recover()
+    except Exception as e:
+        logger.error(f"Falha ao recuperar jobs de análise pendentes: {e}")
+        return 0
+
+# Uma recuperação por processo, qualquer que seja a entrada (app.run com ou sem reloader,
+# flask run, gunicorn/uwsgi, Asgi.py). Guardamos o pid: workers criados por fork depois
+# do import (gunicorn --preload) recuperam a própria fila.
+_recovered_pid = None
+_recover_lock = threading.Lock()
+
+def recover_image_jobs_once() -> bool:
+    """Roda recover_image_jobs na primeira chamada do processo; True se foi esta chamada"""
+    global _recovered_pid
+    with _recover_lock:
+        if _recovered_pid == os.getpid():
+            return False
+        _recovered_pid = os.getpid()
+    recover_image_jobs()
+    return True
+
+@app.before_request
+def recover_jobs_on_first_request():
+    # Só o processo que atende chega aqui (o pai do reloader não); a consulta roda fora
+    # da requisição para não atrasar a primeira resposta
+    if _recovered_pid != os.getpid():
+        threading.Thread(target=recover_image_jobs_once, name="recover-image-jobs", daemon=True).start()
+
+@app.cli.command("recover-jobs")
+def recover_jobs_command():
+    """Reenfileira os jobs de análise pendentes e os com reivindicação vencida"""
+    print(f"{recover_image_jobs()} jobs reenfileirados")
+    image_jobs.shutdown(wait=True)
+
+analysis_cache = get_analysis_cache()
+model_rate_limiter = get_model_rate_limiter()
+response_cache = get_response_cache()
+intent_router = get_intent_router()
+
 # ---------------- Health check ----------------
 @app.route("/health", methods=["GET"])
 def health():
-    return jsonify({"status": "ok"})
+    return jsonify({
+        "status": "ok",
+        "db_pool": pool_stats(),
+        "agent_cache": agent_cache.stats(),
+        "image_jobs": image_jobs.stats(),
+        "analysis_cache": analysis_cache.stats() if analysis_cache else None,
+        "model_rate_limiter": model_rate_limiter.stats() if model_rate_limiter else None,
+        "chat_writer": writer_stats(),
+        "response_cache": response_cache.stats() if response_cache else None,
+        "intent_router": intent_router.stats() if intent_router else None,
+        "admission": admission.stats() if admission else None,
+        "upload_storage": upload_storage.stats(),
+    })
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Métricas no formato texto do Prometheus"""
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
 
 # ---------------- Headers CORS extra para pré-flight ----------------
 @app.after_request
@@ -632,4 +990,5 @@ def delete_item(item_id):
 
 # ---------------- Executar ----------------
 if __name__ == "__main__":
+    # A fila é recuperada na primeira requisição (recover_jobs_on_first_request)
     app.run(host="127.0.0.1", port=int(os.getenv("PORT", 8000)), debug=True)
@@ -0,0 +1,268 @@
+# asgi.py
+"""Modo ASGI do backend: mesmas rotas, mesmo cookie de sessão e mesmo CORS do App.py.
+
+As rotas que passam quase todo o tempo esperando o Gemini (POST /chat, /chat/stream e
+/analyze_image) têm views assíncronas em Quart; enquanto o modelo responde nenhuma
+thread fica presa. As demais rotas (e os pré-flights OPTIONS) continuam no Flask do
+App.py, executadas em um pool de threads (ASGI_WSGI_WORKERS, padrão 16).
+
+Uso (a partir de Prot_TG_BackEnd/):  hypercorn Asgi:application --bind 127.0.0.1:8000
+"""
+from quart import Quart, Response, request, session, jsonify, g
+from a2wsgi import WSGIMiddleware
+from App import (app as flask_app, logger, get_agent, image_jobs, sse_event, save_upload, record_meal,
+                 submit_image_job, recover_image_jobs_once, wants_async, upload_storage, CORS_ORIGIN)
+from Admission import AdmissionRejected
+from Nutri import ChatStreamError
+from Metrics import observe_request
+from Timing import phase, start_request, finish_request
+from Jobs import JobQueueFull
+from Upload_Storage import UploadTooLarge, size_limit_message
+from werkzeug.exceptions import RequestEntityTooLarge
+from concurrent.futures import ThreadPoolExecutor
+import asyncio, os, time, uuid, weakref
+
+quart_app = Quart(__name__)
+
+# Mesma chave e mesmas opções: o cookie "session" criado pelo /login do Flask vale aqui
+quart_app.secret_key = flask_app.secret_key
+for option in ("SESSION_COOKIE_NAME", "SESSION_COOKIE_SAMESITE", "SESSION_COOKIE_SECURE",
+               "SESSION_COOKIE_HTTPONLY", "PERMANENT_SESSION_LIFETIME"):
+    quart_app.config[option] = flask_app.config[option]
+# Limite do corpo também no Quart (413 durante o recebimento, antes de montar o formulário)
+quart_app.config["MAX_CONTENT_LENGTH"] = flask_app.config["MAX_CONTENT_LENGTH"]
+
+# Rotas atendidas pelas views assíncronas; o resto vai para o Flask
+ASYNC_ROUTES = {("POST", "/chat"), ("POST", "/chat/stream"), ("POST", "/analyze_image")}
+
+
+# ---------------- Trabalho bloqueante ----------------
+# MySQL, Pillow e a criação de agentes rodam via asyncio.to_thread. O executor padrão
+# do asyncio tem só min(32, CPUs + 4) threads; em máquinas pequenas isso viraria o gargalo.
+@quart_app.before_serving
+async def configure_executor():
+    workers = int(os.getenv("ASGI_BLOCKING_WORKERS", 32))
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=workers, thread_name_prefix="asgi-blocking")
+    )
+
+
+@quart_app.before_serving
+async def recover_pending_jobs():
+    # Mesma guarda do App.py: o hook de primeira requisição do Flask montado aqui vira no-op
+    await asyncio.to_thread(recover_image_jobs_once)
+
+
+# ---------------- CORS (equivalente ao flask_cors do App.py) ----------------
+@quart_app.after_request
+async def add_cors_headers(response):
+    if request.headers.get("Origin") == CORS_ORIGIN:
+        response.headers["Access-Control-Allow-Origin"] = CORS_ORIGIN
+        response.headers["Access-Control-Allow-Credentials"] = "true"
+        response.headers.add("Vary", "Origin")
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+    response.headers.add('Access-Control-Allow-Methods', 'GET,POST,OPTIONS')
+    return response
+
+
+# ---------------- Métricas e tempo por fase (mesmas séries e cabeçalhos do App.py) ----------------
+@quart_app.before_request
+async def start_request_timer():
+    g.request_started = time.perf_counter()
+    # Sem cProfile aqui: no loop do asyncio o perfil misturaria as outras requisições
+    g.timing_token = start_request(profile=False)
+
+@quart_app.after_request
+async def record_request_metrics(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        observe_request(route, request.method, response.status_code, time.perf_counter() - started)
+        server_timing = finish_request(g.pop("timing_token"), route, request.method, response.status_code)
+        if server_timing:
+            response.headers["Server-Timing"] = server_timing
+    return response
+
+
+# ---------------- Controle de admissão (o mesmo controlador do App.py) ----------------
+@quart_app.errorhandler(AdmissionRejected)
+async def admission_rejected(e):
+    return jsonify({"success": False, "error": str(e), "reason": e.reason}), e.status, {"Retry-After": str(e.retry_after)}
+
+
+# ---------------- Rotas do chatbot ----------------
+async def agent_for(session_id: str):
+    # Criar o agente lê o histórico no MySQL: roda no pool de threads, fora do loop
+    return await asyncio.to_thread(
+        get_agent, session_id=session_id, user_id=session.get("user_id"), email=session.get("user_email")
+    )
+
+@quart_app.route("/chat", methods=["POST"])
+async def chat():
+    if "user_id" not in session:
+        return jsonify({"error": "Usuário não autenticado"}), 401
+
+    session_id = request.headers.get("X-Session-ID") or str(uuid.uuid4())
+    data = await request.get_json()
+    message = data.get("message")
+    if not message:
+        return jsonify({"error": "Mensagem vazia"}), 400
+
+    agent = await agent_for(session_id)
+    if "text/event-stream" in request.headers.get("Accept", ""):
+        return await stream_chat_response(agent, session_id, message)
+    response_text = await agent.arun_text(message)
+    return jsonify({"success": True, "session_id": session_id, "response": response_text}), 200
+
+@quart_app.route("/chat/stream", methods=["POST"])
+async def chat_stream():
+    if "user_id" not in session:
+        return jsonify({"error": "Usuário não autenticado"}), 401
+
+    session_id = request.headers.get("X-Session-ID") or str(uuid.uuid4())
+    data = await request.get_json()
+    message = data.get("message")
+    if not message:
+        return jsonify({"error": "Mensagem vazia"}), 400
+
+    agent = await agent_for(session_id)
+    return await stream_chat_response(agent, session_id, message)
+
+class TicketedBody:
+    """Corpo assíncrono que devolve a vaga de admissão uma única vez: ao terminar, quando o
+    Quart o fecha (aclose, também em desconexão do cliente ou RESPONSE_TIMEOUT) ou, se a
+    resposta nunca chegar a ser enviada, quando o objeto é coletado"""
+
+    def __init__(self, body, ticket):
+        self._body = body
+        self._release = weakref.finalize(self, ticket.release) if ticket is not None else None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self._body.__anext__()
+        except BaseException:
+            self.release()
+            raise
+
+    async def aclose(self):
+        try:
+            await self._body.aclose()
+        finally:
+            self.release()
+
+    def release(self):
+        if self._release is not None:
+            self._release()
+
+async def stream_chat_response(agent, session_id: str, message: str):
+    """Mesmos eventos SSE do App.py ('start', 'token', 'done'), gerados com astream_text"""
+    # Vaga obtida antes de responder (429/503 ainda possíveis) e devolvida ao fim do stream
+    ticket = await agent.astream_ticket(message)
+
+    async def generate():
+        yield sse_event("start", {"session_id": session_id}).encode("utf-8")
+        try:
+            async for token in agent.astream_text(message):
+                yield sse_event("token", {"token": token}).encode("utf-8")
+        except ChatStreamError as e:
+            yield sse_event("done", {"success": False, "session_id": session_id, "error": str(e)}).encode("utf-8")
+            return
+        yield sse_event("done", {"success": True, "session_id": session_id}).encode("utf-8")
+
+    return Response(TicketedBody(generate(), ticket), 200, {
+        "Content-Type": "text/event-stream; charset=utf-8",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+@quart_app.route("/analyze_image", methods=["POST"])
+async def analyze_image():
+    try:
+        form = await request.form
+        files = await request.files
+
+        # Recupera sessão
+        session_id = request.headers.get('X-Session-ID') or form.get('session_id')
+        user_id = session.get("user_id")
+        email = session.get("user_email")
+        if not session_id:
+            session_id = str(uuid.uuid4())
+        if not user_id:
+            return jsonify({"error": "Usuário não autenticado"}), 401
+
+        # Verifica se veio arquivo
+        if 'file' not in files:
+            return jsonify({"error": "Nenhum arquivo enviado"}), 400
+        file = files['file']
+        if file.filename == '':
+            return jsonify({"error": "Nenhum arquivo selecionado"}), 400
+
+        # Define message_type (default 'human')
+        message_type = form.get('message_type', 'human')
+        if message_type not in ['human', 'ai']:
+            return jsonify({"error": "message_type inválido"}), 400
+
+        # Modo assíncrono com a fila cheia: recusa antes de gravar arquivo e linha em uploads
+        async_mode = wants_async(request.args.get("async") or form.get("async"), request.headers.get("Prefer"))
+        if async_mode:
+            image_jobs.check_capacity()
+
+        # Salva o arquivo (uma cópia por conteúdo) e registra no banco; hash e disco fora do loop
+        with phase("file"):
+            blob = await asyncio.to_thread(upload_storage.save_stream, file.stream, file.filename)
+        file_path = blob["path"]
+        upload_id = await asyncio.to_thread(save_upload, user_id, file_path, message_type, blob["content_hash"])
+
+        # Modo assíncrono: devolve o job na hora e analisa em segundo plano
+        if async_mode:
+            job_id = await asyncio.to_thread(submit_image_job, user_id, session_id, email, upload_id, file_path)
+            return jsonify({
+                "success": True,
+                "session_id": session_id,
+                "file_path": file_path,
+                "message_type": message_type,
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": f"/analyze_image/{job_id}",
+            }), 202
+
+        # Processa imagem com o agente (Gemini via ainvoke)
+        agent = await agent_for(session_id)
+        # A vaga de admissão é obtida pelo FoodAnalyser só se a imagem precisar do modelo
+        analysis = await agent.arun_image_detailed(file_path)
+        await asyncio.to_thread(record_meal, upload_id, analysis)
+
+        return jsonify({
+            "success": True,
+            "session_id": session_id,
+            "file_path": file_path,
+            "message_type": message_type,
+            "response": analysis["text"],
+            "cache_hit": analysis["cache_hit"],
+            "reused": analysis["reused"],
+        }), 200
+
+    except JobQueueFull as e:
+        return jsonify({"success": False, "error": str(e)}), 503, {"Retry-After": "5"}
+    except AdmissionRejected as e:
+        return await admission_rejected(e)
+    except (UploadTooLarge, RequestEntityTooLarge):
+        return jsonify({"success": False, "error": size_limit_message(upload_storage.max_bytes)}), 413
+    except Exception as e:
+        logger.exception("Erro no endpoint /analyze_image")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+# ---------------- Aplicação ASGI ----------------
+wsgi_app = WSGIMiddleware(flask_app, workers=int(os.getenv("ASGI_WSGI_WORKERS", 16)))
+
+
+async def application(scope, receive, send):
+    """Despacha as rotas assíncronas para o Quart e as demais para o Flask"""
+    if scope["type"] == "http" and (scope["method"], scope["path"]) not in ASYNC_ROUTES:
+        await wsgi_app(scope, receive, send)
+    else:
+        await quart_app(scope, receive, send)
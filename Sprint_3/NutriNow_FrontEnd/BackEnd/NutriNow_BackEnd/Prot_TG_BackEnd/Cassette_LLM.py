@@ -0,0 +1,280 @@
+# cassette_llm.py
+"""Gravação e reprodução de respostas reais do modelo (cassetes) para testes offline.
+
+NUTRINOW_LLM_PROVIDER=record chama o Gemini normalmente e grava cada resposta (texto,
+usage_metadata, latência e, no streaming, o instante de cada chunk) em
+NUTRINOW_CASSETTE_DIR/<modelo>.jsonl. Com NUTRINOW_LLM_PROVIDER=replay as mesmas chamadas
+são respondidas a partir dos cassetes, com a latência gravada multiplicada por
+NUTRINOW_REPLAY_SPEED (0 = sem espera).
+
+A busca é pela conversa inteira (tipo e conteúdo de cada mensagem; imagens entram pelo
+hash) e, sem correspondência exata, pela última mensagem do usuário, já que o histórico
+varia entre execuções. Sem nenhuma das duas, NUTRINOW_REPLAY_MISS decide: "fake" (padrão)
+responde com o FakeChatModel, "error" levanta CassetteMiss.
+"""
+from datetime import datetime
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+from typing import Any, AsyncIterator, Iterator, List, Optional
+import asyncio, glob, hashlib, json, os, re, threading, time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CASSETTE_DIR = os.path.join(BASE_DIR, "cassettes")
+
+
+class CassetteMiss(LookupError):
+    """Chamada sem resposta gravada (modo replay com NUTRINOW_REPLAY_MISS=error)"""
+
+
+def _content_key(content) -> Any:
+    if isinstance(content, str):
+        return content
+    parts = []
+    for item in content:
+        if isinstance(item, dict) and item.get("type") == "image_url":
+            url = item["image_url"]["url"] if isinstance(item["image_url"], dict) else item["image_url"]
+            parts.append("image:" + hashlib.sha256(url.encode()).hexdigest())
+        elif isinstance(item, dict):
+            parts.append(item.get("text", ""))
+        else:
+            parts.append(str(item))
+    return parts
+
+
+def request_keys(model: str, messages: List[BaseMessage], stop: Optional[List[str]] = None) -> tuple:
+    """(chave exata da conversa, chave só da última mensagem do usuário)"""
+    conversation = [[msg.type, _content_key(msg.content)] for msg in messages]
+    exact = json.dumps([model, stop or [], conversation], ensure_ascii=False, sort_keys=True)
+    last = next((msg for msg in reversed(messages) if isinstance(msg, HumanMessage)), None)
+    loose = json.dumps([model, _content_key(last.content) if last else ""], ensure_ascii=False)
+    return hashlib.sha256(exact.encode()).hexdigest(), hashlib.sha256(loose.encode()).hexdigest()
+
+
+def _preview(messages: List[BaseMessage]) -> str:
+    last = next((msg for msg in reversed(messages) if isinstance(msg, HumanMessage)), None)
+    if last is None:
+        return ""
+    key = _content_key(last.content)
+    return (key if isinstance(key, str) else " ".join(key))[-200:]
+
+
+class CassetteStore:
+    """Cassetes de um diretório: um JSONL por modelo, carregado inteiro na memória"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._exact = {}
+        self._loose = {}
+        self._lock = threading.Lock()
+        self._hits = {"exact": 0, "loose": 0, "miss": 0}
+        self._recorded = 0
+        for path in sorted(glob.glob(os.path.join(directory, "*.jsonl"))):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+
+    def _index(self, entry: dict):
+        # Gravações repetidas da mesma chamada: vale a mais recente
+        self._exact[entry["key"]] = entry
+        self._loose[entry["loose_key"]] = entry
+
+    def find(self, keys: tuple) -> Optional[dict]:
+        exact, loose = keys
+        with self._lock:
+            entry = self._exact.get(exact)
+            kind = "exact"
+            if entry is None:
+                entry = self._loose.get(loose)
+                kind = "loose" if entry is not None else "miss"
+            self._hits[kind] += 1
+        return entry
+
+    def record(self, model: str, keys: tuple, messages: List[BaseMessage], entry: dict):
+        entry = {
+            "key": keys[0],
+            "loose_key": keys[1],
+            "model": model,
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+            "prompt": _preview(messages),
+            **entry,
+        }
+        slug = re.sub(r"[^A-Za-z0-9.-]+", "_", model)
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, f"{slug}.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._index(entry)
+            self._recorded += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._exact), "recorded": self._recorded, "lookups": dict(self._hits)}
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_cassette_store() -> CassetteStore:
+    directory = os.getenv("NUTRINOW_CASSETTE_DIR", DEFAULT_CASSETTE_DIR)
+    with _stores_lock:
+        if directory not in _stores:
+            _stores[directory] = CassetteStore(directory)
+        return _stores[directory]
+
+
+def _message_dict(message: AIMessage) -> dict:
+    return {
+        "content": message.content,
+        "usage_metadata": dict(message.usage_metadata) if message.usage_metadata else None,
+        "response_metadata": message.response_metadata or {},
+    }
+
+
+class RecordingChatModel(BaseChatModel):
+    """Repassa as chamadas ao modelo real e grava cada resposta no cassete"""
+    model: str
+    inner: BaseChatModel
+    _store: CassetteStore = PrivateAttr()
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._store = get_cassette_store()
+
+    @property
+    def _llm_type(self) -> str:
+        return "nutrinow-record"
+
+    def _record(self, messages, stop, result: ChatResult, elapsed: float):
+        entry = _message_dict(result.generations[0].message)
+        entry["latency_s"] = round(elapsed, 4)
+        self._store.record(self.model, request_keys(self.model, messages, stop), messages, entry)
+
+    def _record_stream(self, messages, stop, chunks: list, started: float):
+        """chunks = [(instante, AIMessageChunk)]"""
+        if not chunks:
+            return
+        merged = chunks[0][1]
+        for _, chunk in chunks[1:]:
+            merged = merged + chunk
+        entry = _message_dict(merged)
+        entry["latency_s"] = round(chunks[-1][0] - started, 4)
+        entry["chunks"] = [[round(at - started, 4), chunk.content] for at, chunk in chunks]
+        self._store.record(self.model, request_keys(self.model, messages, stop), messages, entry)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        started = time.perf_counter()
+        result = self.inner._generate(messages, stop=stop, **kwargs)
+        self._record(messages, stop, result, time.perf_counter() - started)
+        return result
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        started = time.perf_counter()
+        result = await self.inner._agenerate(messages, stop=stop, **kwargs)
+        self._record(messages, stop, result, time.perf_counter() - started)
+        return result
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        started, chunks = time.perf_counter(), []
+        for chunk in self.inner._stream(messages, stop=stop, **kwargs):
+            chunks.append((time.perf_counter(), chunk.message))
+            yield chunk
+        self._record_stream(messages, stop, chunks, started)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        started, chunks = time.perf_counter(), []
+        async for chunk in self.inner._astream(messages, stop=stop, **kwargs):
+            chunks.append((time.perf_counter(), chunk.message))
+            yield chunk
+        self._record_stream(messages, stop, chunks, started)
+
+
+class ReplayChatModel(BaseChatModel):
+    """Responde com as gravações do cassete, reproduzindo a latência e o ritmo dos chunks"""
+    model: str
+    speed: float = float(os.getenv("NUTRINOW_REPLAY_SPEED", 1))
+    miss: str = os.getenv("NUTRINOW_REPLAY_MISS", "fake")
+    _store: CassetteStore = PrivateAttr()
+    _fallback: Optional[BaseChatModel] = PrivateAttr(default=None)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._store = get_cassette_store()
+        if self.miss == "fake":
+            from Fake_LLM import FakeChatModel
+            self._fallback = FakeChatModel(model=self.model)
+
+    @property
+    def _llm_type(self) -> str:
+        return "nutrinow-replay"
+
+    def _lookup(self, messages: List[BaseMessage], stop: Optional[List[str]]) -> Optional[dict]:
+        entry = self._store.find(request_keys(self.model, messages, stop))
+        if entry is None and self._fallback is None:
+            raise CassetteMiss(f"Sem gravação para a chamada ao {self.model}: {_preview(messages)[:80]!r}")
+        return entry
+
+    @staticmethod
+    def _message(entry: dict, chunk: bool = False, content=None):
+        cls = AIMessageChunk if chunk else AIMessage
+        return cls(content=entry["content"] if content is None else content,
+                   usage_metadata=entry.get("usage_metadata"),
+                   response_metadata=entry.get("response_metadata") or {})
+
+    def _schedule(self, entry: dict) -> list:
+        """[(atraso desde o chunk anterior, conteúdo, último?)] já escalado por `speed`"""
+        chunks = entry.get("chunks") or [[entry.get("latency_s", 0), entry["content"]]]
+        schedule, previous = [], 0.0
+        for i, (at, content) in enumerate(chunks):
+            schedule.append((max(at - previous, 0) * self.speed, content, i == len(chunks) - 1))
+            previous = at
+        return schedule
+
+    def _stream_chunk(self, entry: dict, content, last: bool) -> ChatGenerationChunk:
+        if last:
+            return ChatGenerationChunk(message=self._message(entry, chunk=True, content=content))
+        return ChatGenerationChunk(message=AIMessageChunk(content=content))
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        entry = self._lookup(messages, stop)
+        if entry is None:
+            return self._fallback._generate(messages, stop=stop, **kwargs)
+        time.sleep(entry.get("latency_s", 0) * self.speed)
+        return ChatResult(generations=[ChatGeneration(message=self._message(entry))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        entry = self._lookup(messages, stop)
+        if entry is None:
+            return await self._fallback._agenerate(messages, stop=stop, **kwargs)
+        await asyncio.sleep(entry.get("latency_s", 0) * self.speed)
+        return ChatResult(generations=[ChatGeneration(message=self._message(entry))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        entry = self._lookup(messages, stop)
+        if entry is None:
+            yield from self._fallback._stream(messages, stop=stop, **kwargs)
+            return
+        for delay, content, last in self._schedule(entry):
+            time.sleep(delay)
+            yield self._stream_chunk(entry, content, last)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        entry = self._lookup(messages, stop)
+        if entry is None:
+            async for chunk in self._fallback._astream(messages, stop=stop, **kwargs):
+                yield chunk
+            return
+        for delay, content, last in self._schedule(entry):
+            await asyncio.sleep(delay)
+            yield self._stream_chunk(entry, content, last)
@@ -0,0 +1,216 @@
+# chat_writer.py
+from collections import deque
+from Database import get_pool
+from typing import Callable, Optional
+import atexit, os, threading, time, logging
+
+logger = logging.getLogger(__name__)
+
+INSERT_SQL = """
+    INSERT INTO chat_history (session_id, user_id, email, message_type, content, timestamp)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+
+class ChatHistoryWriter:
+    """Gravação write-behind do chat_history.
+
+    add_message só enfileira a linha; uma thread de fundo grava em lote (executemany,
+    uma transação) a cada `interval` segundos ou quando a fila chega a `batch_size`.
+    Um único gravador por vez e lotes retirados do início da fila preservam a ordem.
+    Lotes que falham voltam para o início da fila e são repetidos com backoff, até
+    `max_retries` tentativas.
+
+    Linhas enfileiradas com `on_saved` recebem o id gerado depois do commit. Um lote com
+    alguma delas é gravado linha a linha (ainda numa só transação), porque o AUTO_INCREMENT
+    de um INSERT de várias linhas não é garantidamente contíguo.
+    """
+
+    def __init__(self, mysql_config: dict = None, interval: float = 0.2, batch_size: int = 50,
+                 max_retries: int = 10):
+        self.pool = get_pool(mysql_config)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # um gravador por vez: mantém a ordem das linhas
+        self._closed = False
+        self._attempts = 0  # tentativas consecutivas com falha do lote na frente da fila
+        self._retry_at = 0.0
+        self._flushed = 0
+        self._batches = 0
+        self._retries = 0
+        self._dropped = 0
+        self._flush_total = 0.0
+        self._thread = threading.Thread(target=self._loop, name="chat-writer", daemon=True)
+        self._thread.start()
+
+    # ----------------- API pública -----------------
+    def enqueue(self, row: tuple, on_saved: Optional[Callable[[int], None]] = None):
+        """row = (session_id, user_id, email, message_type, content, timestamp)"""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("ChatHistoryWriter já foi encerrado")
+            self._queue.append((row, on_saved))
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify()
+
+    def flush(self) -> bool:
+        """Grava agora tudo o que está na fila; False se sobrou algo por falha do MySQL"""
+        with self._flush_lock:
+            while True:
+                batch = self._take_batch()
+                if not batch:
+                    return True
+                if not self._write(batch):
+                    return False
+
+    def close(self):
+        """Para a thread de fundo e grava o que restou (chamado também no atexit)"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=10)
+        if not self.flush():
+            with self._cond:
+                lost = len(self._queue)
+            logger.error(f"{lost} mensagens do chat não puderam ser gravadas no encerramento")
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "pending": len(self._queue),
+                "flushed": self._flushed,
+                "batches": self._batches,
+                "retries": self._retries,
+                "dropped": self._dropped,
+                "avg_flush_ms": round(self._flush_total / self._batches * 1000, 2) if self._batches else 0.0,
+            }
+
+    # ----------------- Gravação -----------------
+    def _loop(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._queue) < self.batch_size:
+                    self._cond.wait(self.interval)
+                if self._closed:
+                    return
+                if not self._queue:
+                    continue
+                now = time.monotonic()
+                if now < self._retry_at:
+                    # Backoff depois de uma falha: dorme até a próxima tentativa, mesmo com a fila cheia
+                    self._cond.wait(self._retry_at - now)
+                    continue
+            self.flush()
+
+    def _take_batch(self) -> list:
+        with self._cond:
+            count = min(len(self._queue), self.batch_size)
+            return [self._queue.popleft() for _ in range(count)]
+
+    def _write(self, batch: list) -> bool:
+        """batch = [(row, on_saved)]"""
+        rows = [row for row, _ in batch]
+        callbacks = [on_saved for _, on_saved in batch]
+
+        def insert(conn):
+            cursor = conn.cursor()
+            try:
+                if any(callbacks):
+                    ids = []
+                    for row in rows:
+                        cursor.execute(INSERT_SQL, row)
+                        ids.append(cursor.lastrowid)
+                else:
+                    cursor.executemany(INSERT_SQL, rows)
+                    ids = None
+                conn.commit()
+                return ids
+            finally:
+                cursor.close()
+
+        start = time.monotonic()
+        try:
+            ids = self.pool.run(insert)
+        except Exception as e:
+            with self._cond:
+                self._attempts += 1
+                self._retries += 1
+                if self._attempts >= self.max_retries:
+                    self._dropped += len(batch)
+                    self._attempts = 0
+                    logger.error(f"Descartando {len(batch)} mensagens do chat após {self.max_retries} tentativas: {e}")
+                else:
+                    # Volta para o início da fila, na mesma ordem, e espera antes de repetir
+                    self._queue.extendleft(reversed(batch))
+                    self._retry_at = time.monotonic() + min(self.interval * 2 ** self._attempts, 5.0)
+                    logger.warning(f"Falha ao gravar {len(batch)} mensagens do chat (tentativa {self._attempts}): {e}")
+            return False
+
+        with self._cond:
+            self._attempts = 0
+            self._retry_at = 0.0
+            self._flushed += len(batch)
+            self._batches += 1
+            self._flush_total += time.monotonic() - start
+        for on_saved, message_id in zip(callbacks, ids or ()):
+            if on_saved is not None:
+                on_saved(message_id)
+        return True
+
+
+# ----------------- Instância do processo -----------------
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def write_behind_enabled() -> bool:
+    return os.getenv("CHAT_WRITE_BEHIND", "0") == "1"
+
+
+def get_chat_writer(mysql_config: dict = None) -> Optional[ChatHistoryWriter]:
+    """Gravador compartilhado por configuração MySQL, ou None se CHAT_WRITE_BEHIND != 1"""
+    if not write_behind_enabled():
+        return None
+    key = tuple(sorted((mysql_config or {}).items()))
+    writer = _writers.get(key)
+    if writer is not None:
+        return writer
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = ChatHistoryWriter(
+                mysql_config,
+                interval=float(os.getenv("CHAT_WRITE_BEHIND_INTERVAL_MS", 200)) / 1000,
+                batch_size=int(os.getenv("CHAT_WRITE_BEHIND_BATCH", 50)),
+                max_retries=int(os.getenv("CHAT_WRITE_BEHIND_MAX_RETRIES", 10)),
+            )
+            _writers[key] = writer
+        return writer
+
+
+def writer_stats() -> Optional[dict]:
+    with _writers_lock:
+        writers = list(_writers.values())
+    if not writers:
+        return None
+    totals = {}
+    for writer in writers:
+        for name, value in writer.stats().items():
+            totals[name] = totals.get(name, 0) + value
+    if len(writers) > 1:
+        totals["avg_flush_ms"] = round(totals["avg_flush_ms"] / len(writers), 2)
+    return totals
+
+
+@atexit.register
+def close_writers():
+    """Garante o flush final no encerramento do processo"""
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.close()
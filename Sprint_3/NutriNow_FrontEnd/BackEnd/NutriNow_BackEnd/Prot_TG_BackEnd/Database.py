@@ -0,0 +1,236 @@
+# database.py
+import mysql.connector
+from mysql.connector import errors
+from contextlib import contextmanager
+from typing import Optional
+from Timing import phase
+import os, threading, time, logging
+
+logger = logging.getLogger(__name__)
+
+# Erros que indicam conexão morta (servidor reiniciado, wait_timeout, rede)
+STALE_CONNECTION_ERRORS = (errors.InterfaceError, errors.OperationalError)
+
+
+class PoolTimeoutError(errors.PoolError):
+    """Nenhuma conexão livre dentro do tempo limite de checkout"""
+
+
+def mysql_config_from_env() -> dict:
+    return {
+        "host": os.getenv("MYSQL_HOST", "localhost"),
+        "port": int(os.getenv("MYSQL_PORT", 3306)),
+        "user": os.getenv("MYSQL_USER", "root"),
+        "password": os.getenv("MYSQL_PASSWORD", ""),
+        "database": os.getenv("MYSQL_DATABASE", "nutrinow2"),
+        "charset": "utf8mb4",
+        "connection_timeout": 60,
+    }
+
+
+class PooledConnection:
+    """Conexão emprestada do pool; close() devolve ao pool em vez de fechar o socket"""
+
+    def __init__(self, pool: "ConnectionPool", raw):
+        self._pool = pool
+        self._raw = raw
+        self._broken = False
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise errors.InterfaceError("Conexão já devolvida ao pool")
+        return getattr(self._raw, name)
+
+    def invalidate(self):
+        """Marca a conexão como quebrada: ela será descartada ao ser devolvida"""
+        self._broken = True
+
+    def close(self):
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool._release(raw, broken=self._broken)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and issubclass(exc_type, STALE_CONNECTION_ERRORS):
+            self.invalidate()
+        self.close()
+
+
+class ConnectionPool:
+    """Pool de conexões MySQL compartilhado pelo processo.
+
+    Valida cada conexão no checkout (ping com reconexão), bloqueia até `timeout`
+    segundos quando todas estão em uso e mantém estatísticas de uso.
+    """
+
+    def __init__(self, config: dict, size: int = 10, timeout: float = 5.0):
+        self.config = dict(config)
+        self.size = size
+        self.timeout = timeout
+        self._idle = []
+        self._created = 0
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._checkouts = 0
+        self._timeouts = 0
+        self._stale_replaced = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    # ----------------- Checkout / devolução -----------------
+    def get_connection(self, timeout: Optional[float] = None) -> PooledConnection:
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw = self._idle.pop()
+                    break
+                if self._created < self.size:
+                    self._created += 1
+                    raw = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(
+                        f"Pool MySQL esgotado ({self.size} conexões em uso) após {timeout:.1f}s"
+                    )
+                self._cond.wait(remaining)
+            self._in_use += 1
+            waited = time.monotonic() - start
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        try:
+            raw = self._validate(raw)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._created -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, raw)
+
+    def _connect(self):
+        return mysql.connector.connect(**self.config)
+
+    def _validate(self, raw):
+        if raw is None:
+            return self._connect()
+        try:
+            raw.ping(reconnect=True, attempts=2, delay=0)
+            return raw
+        except Exception as e:
+            logger.warning(f"Conexão MySQL obsoleta descartada: {e}")
+            self._close_quietly(raw)
+            with self._cond:
+                self._stale_replaced += 1
+            return self._connect()
+
+    def _release(self, raw, broken: bool = False):
+        if not broken:
+            try:
+                # Não deixa transações (nem snapshots de leitura) abertas no pool
+                if raw.in_transaction:
+                    raw.rollback()
+            except Exception:
+                broken = True
+        if broken:
+            self._close_quietly(raw)
+        with self._cond:
+            self._in_use -= 1
+            if broken:
+                self._created -= 1
+            else:
+                self._idle.append(raw)
+            self._cond.notify()
+
+    @staticmethod
+    def _close_quietly(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        conn = self.get_connection()
+        with conn:
+            yield conn
+
+    def run(self, func, retries: int = 1):
+        """Executa func(conn) repetindo em uma conexão nova se a atual estiver morta"""
+        for attempt in range(retries + 1):
+            try:
+                with phase("db"), self.connection() as conn:
+                    return func(conn)
+            except STALE_CONNECTION_ERRORS as e:
+                if attempt >= retries:
+                    raise
+                logger.warning(f"Repetindo operação MySQL após conexão perdida: {e}")
+
+    # ----------------- Manutenção / estatísticas -----------------
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+        for raw in idle:
+            self._close_quietly(raw)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self.size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "created": self._created,
+                "checkouts": self._checkouts,
+                "checkout_timeouts": self._timeouts,
+                "stale_replaced": self._stale_replaced,
+                "wait_time_total_ms": round(self._wait_total * 1000, 3),
+                "wait_time_max_ms": round(self._wait_max * 1000, 3),
+            }
+
+
+# ---------------- Pools do processo ----------------
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(config: Optional[dict] = None) -> ConnectionPool:
+    """Retorna o pool do processo para a configuração (padrão: variáveis MYSQL_*)"""
+    config = config or mysql_config_from_env()
+    key = tuple(sorted(config.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(
+                config,
+                size=int(os.getenv("MYSQL_POOL_SIZE", 10)),
+                timeout=float(os.getenv("MYSQL_POOL_TIMEOUT", 5)),
+            )
+            _pools[key] = pool
+        return pool
+
+
+def get_db_connection() -> PooledConnection:
+    return get_pool().get_connection()
+
+
+def pool_stats() -> dict:
+    with _pools_lock:
+        pools = list(_pools.values())
+    totals = {}
+    for pool in pools:
+        for name, value in pool.stats().items():
+            if name == "wait_time_max_ms":
+                totals[name] = max(totals.get(name, 0), value)
+            else:
+                totals[name] = totals.get(name, 0) + value
+    return totals
@@ -0,0 +1,128 @@
+# fake_llm.py
+"""Modelo de chat fake para testes de carga e desenvolvimento sem a API do Gemini.
+
+Selecionado com NUTRINOW_LLM_PROVIDER=fake (ver Model_Provider). Responde de forma
+determinística no formato que cada chamador espera (agente ReAct, análise de imagem,
+resumo da conversa ou texto livre) e simula a latência do modelo real:
+NUTRINOW_FAKE_LATENCY_MS até o primeiro token e NUTRINOW_FAKE_TOKEN_MS entre tokens.
+Cada resposta traz usage_metadata estimado (~4 caracteres por token, imagem conta como
+IMAGE_TOKENS), como o Gemini informa, para o /metrics contar tokens também nos testes.
+"""
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.messages.ai import UsageMetadata
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from typing import Any, AsyncIterator, Iterator, List, Optional
+import asyncio, json, os, time
+
+NUTRIENT_TABLE = """| Nutriente | Quantidade | % VD* |
+|-----------|------------|-------|
+| Calorias | 520 kcal | 26% |
+| Carboidratos | 58 g | 19% |
+| Proteínas | 32 g | 64% |
+| Gorduras Totais | 16 g | 29% |
+| Gorduras Saturadas | 5 g | 23% |
+| Fibras | 7 g | 28% |
+| Sódio | 640 mg | 27% |
+
+*VD: Valores Diários com base em uma dieta de 2000 kcal."""
+# Tokens que o Gemini cobra por imagem de até 384x384 (imagens maiores viram blocos de 258)
+IMAGE_TOKENS = 258
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1 if text else 0
+
+
+class FakeChatModel(BaseChatModel):
+    model: str = "fake"
+    latency: float = float(os.getenv("NUTRINOW_FAKE_LATENCY_MS", 800)) / 1000
+    token_interval: float = float(os.getenv("NUTRINOW_FAKE_TOKEN_MS", 20)) / 1000
+
+    @property
+    def _llm_type(self) -> str:
+        return "nutrinow-fake"
+
+    # ----------------- Conteúdo da resposta -----------------
+    @staticmethod
+    def _text_of(message: BaseMessage) -> str:
+        if isinstance(message.content, str):
+            return message.content
+        return " ".join(item.get("text", "") for item in message.content if isinstance(item, dict))
+
+    @staticmethod
+    def _has_image(messages: List[BaseMessage]) -> bool:
+        return any(
+            isinstance(msg.content, list)
+            and any(isinstance(item, dict) and item.get("type") == "image_url" for item in msg.content)
+            for msg in messages
+        )
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        if self._has_image(messages):
+            return NUTRIENT_TABLE
+
+        prompt = "\n".join(self._text_of(msg) for msg in messages)
+        if "Novo resumo:" in prompt:
+            return "Usuário quer orientação de dieta e treino; nenhuma restrição informada."
+
+        # Última linha da última mensagem do usuário (o agente embrulha a pergunta no template)
+        question = next((self._text_of(msg) for msg in reversed(messages) if isinstance(msg, HumanMessage)), "")
+        question = question.strip().splitlines()[-1] if question.strip() else ""
+        answer = (f"Sobre \"{question[:80]}\": mantenha uma alimentação equilibrada, com proteína em todas "
+                  f"as refeições, bastante vegetais e boa hidratação. Quer que eu monte um cardápio?")
+        # O agente conversacional ReAct espera a resposta final em JSON
+        if "action_input" in prompt:
+            return "```json\n" + json.dumps({"action": "Final Answer", "action_input": answer}, ensure_ascii=False) + "\n```"
+        return answer
+
+    @staticmethod
+    def _tokens(text: str) -> List[str]:
+        words = text.split(" ")
+        return [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+
+    def _usage(self, messages: List[BaseMessage], text: str) -> UsageMetadata:
+        input_tokens = sum(estimate_tokens(self._text_of(msg)) for msg in messages)
+        input_tokens += IMAGE_TOKENS * self._has_image(messages)
+        output_tokens = estimate_tokens(text)
+        return UsageMetadata(input_tokens=input_tokens, output_tokens=output_tokens,
+                             total_tokens=input_tokens + output_tokens)
+
+    def _result(self, messages: List[BaseMessage], text: str) -> ChatResult:
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, messages: List[BaseMessage]) -> Iterator[AIMessageChunk]:
+        """Um chunk por token; o último leva o usage_metadata da resposta inteira"""
+        text = self._reply(messages)
+        tokens = self._tokens(text)
+        for i, token in enumerate(tokens):
+            usage = self._usage(messages, text) if i == len(tokens) - 1 else None
+            yield AIMessageChunk(content=token, usage_metadata=usage)
+
+    # ----------------- Interface BaseChatModel -----------------
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        text = self._reply(messages)
+        time.sleep(self.latency + self.token_interval * len(self._tokens(text)))
+        return self._result(messages, text)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        text = self._reply(messages)
+        await asyncio.sleep(self.latency + self.token_interval * len(self._tokens(text)))
+        return self._result(messages, text)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for chunk in self._chunks(messages):
+            time.sleep(self.token_interval)
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for chunk in self._chunks(messages):
+            await asyncio.sleep(self.token_interval)
+            yield ChatGenerationChunk(message=chunk)
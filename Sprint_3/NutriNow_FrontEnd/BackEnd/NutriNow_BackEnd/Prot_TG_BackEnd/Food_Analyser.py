@@ -1,31 +1,73 @@
 # food_analyser.py
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.language_models.chat_models import BaseChatModel
 from langchain.tools import BaseTool
 from langchain_core.messages import SystemMessage, HumanMessage
+from Model_Provider import get_chat_model
+from Analysis_Cache import AnalysisCache, get_analysis_cache, make_cache_key
+from Rate_Limiter import TokenBucket, get_model_rate_limiter
+from Admission import AdmissionController, AdmissionRejected, get_admission_controller
+from Metrics import ANALYSIS_EMPTY, ANALYSIS_FALLBACKS
+from Timing import phase
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 from PIL import Image
+import asyncio
 import base64
 import os
+import threading
 from io import BytesIO
 from pydantic import PrivateAttr
+from typing import Callable, Optional
 import traceback
 from datetime import datetime
 
+ANALYSIS_MODEL = 'gemini-2.0-flash'
+
+# Pré-processamento das imagens enviadas ao modelo
+IMAGE_MAX_SIDE = int(os.getenv('IMAGE_MAX_SIDE', 1024))
+IMAGE_JPEG_QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', 85))
+IMAGE_JPEG_OPTIMIZE = os.getenv('IMAGE_JPEG_OPTIMIZE', '1') == '1'
+IMAGE_RESAMPLE = {
+    'lanczos': Image.Resampling.LANCZOS,
+    'bicubic': Image.Resampling.BICUBIC,
+    'bilinear': Image.Resampling.BILINEAR,
+    'box': Image.Resampling.BOX,
+}[os.getenv('IMAGE_RESAMPLE', 'lanczos').lower()]
+# JPEGs RGB até este tamanho (e dentro de IMAGE_MAX_SIDE, sem EXIF/XMP) são enviados sem recodificar
+IMAGE_PASSTHROUGH_MAX_BYTES = int(os.getenv('IMAGE_PASSTHROUGH_MAX_KB', 512)) * 1024
+# Escala fixa da assinatura perceptual, a mesma com e sem recodificação
+SIGNATURE_SIDE = 64
+# Configuração otimizada da chamada principal ao modelo
+ANALYSIS_CALL_CONFIG = {
+    'max_output_tokens': 4096,
+    'temperature': 0.7,
+}
+# Incremente ao alterar os prompts de análise: invalida o cache de resultados
+ANALYSIS_PROMPT_VERSION = '1'
+
 class FoodAnalyser(BaseTool):
     name: str = "food_analyser"
     description: str = """Analisa imagens de refeições fornecendo informações nutricionais detalhadas e 
     sugestões de uma nutricionista especializada em nutrição esportiva."""
 
-    _llm: ChatGoogleGenerativeAI = PrivateAttr()
+    _llm: BaseChatModel = PrivateAttr()
+    _cache: Optional[AnalysisCache] = PrivateAttr(default=None)
+    _limiter: Optional[TokenBucket] = PrivateAttr(default=None)
+    _admission: Optional[AdmissionController] = PrivateAttr(default=None)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         # CORREÇÃO CRÍTICA: Aumentar max_output_tokens e desabilitar thinking
-        self._llm = ChatGoogleGenerativeAI(
-            model='gemini-2.0-flash',  # Versão mais estável
+        # Cliente compartilhado entre todas as instâncias (ver Model_Provider)
+        self._llm = get_chat_model(
+            ANALYSIS_MODEL,  # Versão mais estável
             temperature=0.7,
             max_output_tokens=4096,  # Aumentado significativamente
             max_tokens=None,  # Remove limite de tokens totais
         )
+        self._cache = get_analysis_cache()
+        self._limiter = get_model_rate_limiter()
+        self._admission = get_admission_controller()
 
     # ----------------- Implementação obrigatória BaseTool -----------------
     def _run(self, image_path: str) -> str:
@@ -34,7 +76,7 @@ class FoodAnalyser(BaseTool):
 
     async def _arun(self, image_path: str) -> str:
         """Análise assíncrona do BaseTool"""
-        return self._analyze_image(image_path)
+        return (await self.aanalyze(image_path))["text"]
 
     # ----------------- Funções auxiliares -----------------
     def _get_timestamp(self) -> str:
@@ -50,8 +92,57 @@ class FoodAnalyser(BaseTool):
         return True
 
     def _process_image(self, image_path: str) -> str:
+        return base64.b64encode(self._process_image_bytes(image_path)).decode("utf-8")
+
+    def _process_image_bytes(self, image_path: str) -> bytes:
+        return self._prepare_image(image_path)[0]
+
+    @staticmethod
+    def _perceptual_signature(image: Image.Image) -> tuple:
+        """(dHash de 64 bits, cor média RGB): fotos quase iguais ficam a poucos bits de distância.
+
+        O dHash olha só a luminância; a cor média evita confundir pratos diferentes
+        fotografados no mesmo enquadramento. A imagem é reduzida antes a SIGNATURE_SIDE px,
+        para que a mesma foto dê a mesma assinatura venha ela do draft ou da recodificação.
+        """
+        image = image.copy()
+        image.thumbnail((SIGNATURE_SIDE, SIGNATURE_SIDE), Image.Resampling.BOX)
+        small = image.convert('L').resize((9, 8), Image.Resampling.BILINEAR)
+        pixels = list(small.getdata())
+        value = 0
+        for row in range(8):
+            for col in range(8):
+                left = pixels[row * 9 + col]
+                right = pixels[row * 9 + col + 1]
+                value = (value << 1) | (1 if left > right else 0)
+        color = image.resize((1, 1), Image.Resampling.BOX).getpixel((0, 0))
+        return value, color
+
+    def _prepare_image(self, image_path: str) -> tuple:
+        """(JPEG normalizado, assinatura perceptual): RGB, no máximo IMAGE_MAX_SIDE px.
+
+        O JPEG vai ao modelo e é a chave do cache; a assinatura alimenta o índice de quase duplicatas.
+        """
         self._validate_image_path(image_path)
+        max_size = (IMAGE_MAX_SIDE, IMAGE_MAX_SIDE)
         with Image.open(image_path) as image:
+            is_jpeg = image.format == 'JPEG'
+            # JPEG pequeno já em RGB: envia o arquivo original, sem decodificar e recodificar.
+            # Com segmento APP1 (EXIF/XMP: GPS, modelo da câmera) recodifica, o que descarta os metadados
+            if (is_jpeg and image.mode == 'RGB' and image.size[0] <= max_size[0] and image.size[1] <= max_size[1]
+                    and not any(marker == 'APP1' for marker, _ in image.applist)
+                    and os.path.getsize(image_path) <= IMAGE_PASSTHROUGH_MAX_BYTES):
+                image.draft('RGB', (SIGNATURE_SIDE, SIGNATURE_SIDE))
+                signature = self._perceptual_signature(image)
+                with open(image_path, 'rb') as f:
+                    return f.read(), signature
+
+            # JPEG grande: o decodificador reduz a escala (1/2, 1/4, 1/8) já na leitura,
+            # sem ficar abaixo do tamanho final (mesma proporção do thumbnail)
+            if is_jpeg:
+                ratio = min(max_size[0] / image.size[0], max_size[1] / image.size[1], 1.0)
+                image.draft('RGB', (int(image.size[0] * ratio), int(image.size[1] * ratio)))
+
             if image.mode in ('RGBA', 'LA'):
                 background = Image.new('RGB', image.size, (255, 255, 255))
                 background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
@@ -59,13 +150,12 @@ class FoodAnalyser(BaseTool):
             elif image.mode != 'RGB':
                 image = image.convert('RGB')
 
-            max_size = (1024, 1024)
             if image.size[0] > max_size[0] or image.size[1] > max_size[1]:
-                image.thumbnail(max_size, Image.Resampling.LANCZOS)
+                image.thumbnail(max_size, IMAGE_RESAMPLE)
 
             buffered = BytesIO()
-            image.save(buffered, format="JPEG", quality=85, optimize=True)
-            return base64.b64encode(buffered.getvalue()).decode("utf-8")
+            image.save(buffered, format="JPEG", quality=IMAGE_JPEG_QUALITY, optimize=IMAGE_JPEG_OPTIMIZE)
+            return buffered.getvalue(), self._perceptual_signature(image)
 
     def _create_analysis_prompt(self) -> str:
         return '''Analise esta imagem de refeição e forneça DIRETAMENTE a resposta neste formato:
@@ -131,71 +221,61 @@ IMPORTANTE: Responda DIRETAMENTE com a tabela. Não faça raciocínio interno ex
             print(f"Erro ao extrair conteúdo: {e}")
             return ""
 
-    def _analyze_image(self, image_path: str) -> str:
-        """Análise completa retornando apenas a tabela + dicas"""
-        try:
-            img_b64 = self._process_image(image_path)
-
-            system_message = SystemMessage(content=self._create_analysis_prompt())
-            human_message = HumanMessage(content=[
-                {
-                    'type': 'text', 
-                    'text': 'Você é uma nutricionista. Analise esta refeição e forneça a tabela nutricional DIRETAMENTE, sem raciocínio interno extenso:'
-                },
-                {
-                    'type': 'image_url', 
-                    'image_url': {
-                        'url': f"data:image/jpeg;base64,{img_b64}",
-                        'detail': 'high'
-                    }
+    def _wait_quota(self):
+        """Respeita a cota do Gemini (GEMINI_RPM) antes de cada chamada ao modelo"""
+        if self._limiter:
+            self._limiter.acquire()
+
+    async def _await_quota(self):
+        if self._limiter:
+            await self._limiter.aacquire()
+
+    def _analysis_messages(self, img_b64: str) -> list:
+        system_message = SystemMessage(content=self._create_analysis_prompt())
+        human_message = HumanMessage(content=[
+            {
+                'type': 'text', 
+                'text': 'Você é uma nutricionista. Analise esta refeição e forneça a tabela nutricional DIRETAMENTE, sem raciocínio interno extenso:'
+            },
+            {
+                'type': 'image_url', 
+                'image_url': {
+                    'url': f"data:image/jpeg;base64,{img_b64}",
+                    'detail': 'high'
                 }
-            ])
-
-            # Invoca o modelo com configuração otimizada
-            response = self._llm.invoke(
-                [system_message, human_message],
-                config={
-                    'max_output_tokens': 4096,
-                    'temperature': 0.7,
+            }
+        ])
+        return [system_message, human_message]
+
+    def _simple_messages(self, img_b64: str) -> list:
+        """Prompt mais direto para a segunda tentativa quando a primeira vem vazia"""
+        return [HumanMessage(content=[
+            {
+                'type': 'text',
+                'text': 'Liste os alimentos visíveis e estime calorias, proteínas, carboidratos e gorduras em formato de tabela markdown.'
+            },
+            {
+                'type': 'image_url',
+                'image_url': {
+                    'url': f"data:image/jpeg;base64,{img_b64}",
+                    'detail': 'low'  # Reduz processamento
                 }
-            )
-            
-            # Debug: mostra o que foi recebido
-            print(f"\n🔍 DEBUG - Resposta recebida:")
-            print(f"Tipo: {type(response)}")
-            print(f"Atributos: {dir(response)}")
-            if hasattr(response, 'response_metadata'):
-                print(f"Metadata: {response.response_metadata}")
-            if hasattr(response, 'usage_metadata'):
-                print(f"Usage: {response.usage_metadata}")
-            
-            # Extrai o conteúdo
-            tabela_texto = self._extract_content_from_response(response)
-            
-            # Verifica se o content está vazio (problema MAX_TOKENS em reasoning)
-            if not tabela_texto or len(tabela_texto) < 50:
-                # Tenta uma segunda chamada com prompt mais direto
-                print("Conteúdo vazio, tentando com prompt simplificado...")
-                
-                simple_message = HumanMessage(content=[
-                    {
-                        'type': 'text',
-                        'text': 'Liste os alimentos visíveis e estime calorias, proteínas, carboidratos e gorduras em formato de tabela markdown.'
-                    },
-                    {
-                        'type': 'image_url',
-                        'image_url': {
-                            'url': f"data:image/jpeg;base64,{img_b64}",
-                            'detail': 'low'  # Reduz processamento
-                        }
-                    }
-                ])
-                
-                response = self._llm.invoke([simple_message])
-                tabela_texto = self._extract_content_from_response(response)
-                
-                if not tabela_texto or len(tabela_texto) < 50:
-                    return f"""**Erro: Resposta vazia do modelo**
+            }
+        ])]
+
+    @staticmethod
+    def _is_empty(tabela_texto: str) -> bool:
+        # Content vazio: problema MAX_TOKENS em reasoning
+        return not tabela_texto or len(tabela_texto) < 50
+
+    @staticmethod
+    def _record_empty(attempt: str):
+        ANALYSIS_EMPTY.inc(model=ANALYSIS_MODEL, attempt=attempt)
+        if attempt == "primary":
+            ANALYSIS_FALLBACKS.inc(model=ANALYSIS_MODEL)
+
+    def _empty_response_error(self, response) -> str:
+        return f"""**Erro: Resposta vazia do modelo**
 
 O modelo está consumindo todos os tokens em raciocínio interno e não gerando saída.
 
@@ -210,22 +290,178 @@ O modelo está consumindo todos os tokens em raciocínio interno e não gerando
 3. Simplifique a imagem ou reduza o prompt
 
 **Resposta bruta**: {str(response)[:300]}"""
-            
-            # Formata o resultado final
-            result_text = f"""ANÁLISE NUTRICIONAL DA REFEIÇÃO
+
+    def _slot(self, endpoint: str, user_id: Optional[int], background: bool):
+        """Vaga do controle de admissão só para as chamadas ao modelo: acertos do cache,
+        quase duplicatas e o pré-processamento da imagem não ocupam vaga"""
+        return self._admission.slot(endpoint, user_id, background) if self._admission else nullcontext()
+
+    def _aslot(self, endpoint: str, user_id: Optional[int], background: bool):
+        return self._admission.aslot(endpoint, user_id, background) if self._admission else nullcontext()
+
+    def _call_model(self, img_b64: str, endpoint: str = "image", user_id: Optional[int] = None,
+                    background: bool = False) -> tuple:
+        """Chama o modelo de visão (com uma segunda tentativa simplificada se vier vazio).
+
+        Retorna (texto, ok); ok=False quando o texto é a mensagem de resposta vazia.
+        """
+        with self._slot(endpoint, user_id, background):
+            return self._invoke_model(img_b64)
+
+    def _invoke_model(self, img_b64: str) -> tuple:
+        self._wait_quota()
+        response = self._llm.invoke(self._analysis_messages(img_b64), config=ANALYSIS_CALL_CONFIG)
+        tabela_texto = self._extract_content_from_response(response)
+
+        if self._is_empty(tabela_texto):
+            self._record_empty("primary")
+            print("Conteúdo vazio, tentando com prompt simplificado...")
+            self._wait_quota()
+            response = self._llm.invoke(self._simple_messages(img_b64))
+            tabela_texto = self._extract_content_from_response(response)
+            if self._is_empty(tabela_texto):
+                self._record_empty("fallback")
+                return self._empty_response_error(response), False
+
+        return tabela_texto, True
+
+    async def _acall_model(self, img_b64: str, endpoint: str = "image", user_id: Optional[int] = None,
+                           background: bool = False) -> tuple:
+        """Versão assíncrona de _call_model (ainvoke: nenhuma thread presa esperando o Gemini)"""
+        async with self._aslot(endpoint, user_id, background):
+            return await self._ainvoke_model(img_b64)
+
+    async def _ainvoke_model(self, img_b64: str) -> tuple:
+        await self._await_quota()
+        response = await self._llm.ainvoke(self._analysis_messages(img_b64), config=ANALYSIS_CALL_CONFIG)
+        tabela_texto = self._extract_content_from_response(response)
+
+        if self._is_empty(tabela_texto):
+            self._record_empty("primary")
+            print("Conteúdo vazio, tentando com prompt simplificado...")
+            await self._await_quota()
+            response = await self._llm.ainvoke(self._simple_messages(img_b64))
+            tabela_texto = self._extract_content_from_response(response)
+            if self._is_empty(tabela_texto):
+                self._record_empty("fallback")
+                return self._empty_response_error(response), False
+
+        return tabela_texto, True
+
+    def _analyze_image(self, image_path: str, user_id: Optional[int] = None) -> str:
+        """Análise completa retornando apenas a tabela + dicas"""
+        return self.analyze(image_path, user_id=user_id)["text"]
+
+    def analyze(self, image_path: str, user_id: Optional[int] = None, endpoint: str = "image",
+                background: bool = False) -> dict:
+        """Análise completa com metadados: {"text", "ok", "cache_hit", "reused"}.
+
+        reused=True quando a análise foi reaproveitada de uma foto quase idêntica
+        (hash perceptual) enviada recentemente pelo mesmo usuário. endpoint/background
+        definem a prioridade da chamada ao modelo no controle de admissão; AdmissionRejected
+        é propagada para a rota responder 429/503.
+        """
+        try:
+            lookup = self._lookup(image_path, user_id)
+            if lookup["text"] is None:
+                tabela_texto, ok = self._call_model(lookup["img_b64"], endpoint, user_id, background)
+                if not ok:
+                    return {"text": tabela_texto, "ok": False, "cache_hit": False, "reused": False}
+                lookup["text"] = tabela_texto
+            self._store(lookup, user_id)
+            return self._format_result(image_path, lookup)
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            return self._error_result(e)
+
+    async def aanalyze(self, image_path: str, user_id: Optional[int] = None, endpoint: str = "image",
+                       background: bool = False) -> dict:
+        """Versão assíncrona de analyze().
+
+        Leitura do arquivo, Pillow e cache SQLite rodam em asyncio.to_thread; a chamada
+        ao Gemini usa ainvoke, então o loop fica livre durante a espera pelo modelo.
+        """
+        try:
+            lookup = await asyncio.to_thread(self._lookup, image_path, user_id)
+            if lookup["text"] is None:
+                tabela_texto, ok = await self._acall_model(lookup["img_b64"], endpoint, user_id, background)
+                if not ok:
+                    return {"text": tabela_texto, "ok": False, "cache_hit": False, "reused": False}
+                lookup["text"] = tabela_texto
+            await asyncio.to_thread(self._store, lookup, user_id)
+            return self._format_result(image_path, lookup)
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            return self._error_result(e)
+
+    def _lookup(self, image_path: str, user_id: Optional[int]) -> dict:
+        """Parte local da análise (arquivo, Pillow, cache): tudo antes de chamar o modelo.
+
+        lookup["text"] fica None quando é preciso chamar o modelo com lookup["img_b64"].
+        """
+        lookup = {"text": None, "raw_key": None, "raw_hit": False, "cache_key": None, "signature": None,
+                  "img_b64": None, "cache_hit": False, "reused": False}
+        if self._cache:
+            # Reenvio byte a byte idêntico: acerto sem decodificar a imagem
+            self._validate_image_path(image_path)
+            with open(image_path, 'rb') as f:
+                lookup["raw_key"] = make_cache_key(f.read(), f"raw:{ANALYSIS_MODEL}", ANALYSIS_PROMPT_VERSION)
+            lookup["text"] = self._cache.get(lookup["raw_key"], count_miss=False)
+            lookup["raw_hit"] = lookup["cache_hit"] = lookup["text"] is not None
+            if lookup["raw_hit"]:
+                return lookup
+
+        with phase("image"):
+            img_bytes, lookup["signature"] = self._prepare_image(image_path)
+        lookup["cache_key"] = make_cache_key(img_bytes, ANALYSIS_MODEL, ANALYSIS_PROMPT_VERSION)
+
+        # Mesma imagem (mesmo JPEG normalizado) já analisada: não chama o modelo
+        lookup["text"] = self._cache.get(lookup["cache_key"]) if self._cache else None
+        lookup["cache_hit"] = lookup["text"] is not None
+
+        # Mesmo prato fotografado de novo (outro ângulo/recorte): reaproveita a análise
+        if lookup["text"] is None and self._cache and user_id is not None:
+            similar_key = self._cache.find_similar(user_id, *lookup["signature"])
+            if similar_key:
+                lookup["text"] = self._cache.get(similar_key, count_miss=False)
+                lookup["reused"] = lookup["text"] is not None
+
+        if lookup["text"] is None:
+            lookup["img_b64"] = base64.b64encode(img_bytes).decode("utf-8")
+        return lookup
+
+    def _store(self, lookup: dict, user_id: Optional[int]):
+        """Grava no cache o resultado de _lookup (já com o texto do modelo, se foi chamado)"""
+        if not self._cache or lookup["raw_hit"]:
+            return
+        if not lookup["cache_hit"] and not lookup["reused"]:
+            self._cache.put(lookup["cache_key"], lookup["text"])
+            if user_id is not None:
+                self._cache.add_perceptual(user_id, *lookup["signature"], lookup["cache_key"])
+        # Só arquivos realmente analisados (ou idênticos) entram no atalho por bytes
+        if not lookup["reused"]:
+            self._cache.put(lookup["raw_key"], lookup["text"])
+
+    def _format_result(self, image_path: str, lookup: dict) -> dict:
+        aviso = "_Análise reaproveitada de uma foto semelhante enviada recentemente._\n\n" if lookup["reused"] else ""
+
+        # Formata o resultado final
+        result_text = f"""ANÁLISE NUTRICIONAL DA REFEIÇÃO
 _Imagem: {os.path.basename(image_path)}_
 
-{tabela_texto}
+{aviso}{lookup["text"]}
 
 ---
 **Dica da Nutricionista**: Para análises mais precisas, inclua informações sobre suas características (peso, altura, objetivos) e nível de atividade física!"""
 
-            return result_text
+        return {"text": result_text, "ok": True, "cache_hit": lookup["cache_hit"], "reused": lookup["reused"]}
 
-        except Exception as e:
-            error_details = traceback.format_exc()
-            print(f"Erro completo na análise:\n{error_details}")
-            return f"""Não foi possível analisar a imagem.
+    def _error_result(self, e: Exception) -> dict:
+        error_details = traceback.format_exc()
+        print(f"Erro completo na análise:\n{error_details}")
+        return {"ok": False, "cache_hit": False, "reused": False, "text": f"""Não foi possível analisar a imagem.
 
 **Erro técnico**: {str(e)}
 
@@ -236,36 +472,82 @@ _Imagem: {os.path.basename(image_path)}_
 
 **Sugestões**:
 1. Verifique a API key do Google
-2. Teste com uma imagem menor"""
+2. Teste com uma imagem menor"""}
 
     # ----------------- Interface pública -----------------
-    def analyze_food_image(self, image_path: str) -> str:
-        return self._analyze_image(image_path)
+    def analyze_food_image(self, image_path: str, user_id: Optional[int] = None) -> str:
+        return self._analyze_image(image_path, user_id=user_id)
 
     def get_supported_formats(self) -> list:
         return ['.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif']
 
 
+# ----------------- Instância compartilhada -----------------
+_shared_analyser = None
+_shared_analyser_lock = threading.Lock()
+
+
+def get_food_analyser() -> FoodAnalyser:
+    """FoodAnalyser único do processo; ele não guarda estado por sessão"""
+    global _shared_analyser
+    if _shared_analyser is None:
+        with _shared_analyser_lock:
+            if _shared_analyser is None:
+                _shared_analyser = FoodAnalyser()
+    return _shared_analyser
+
+
 # ----------------- Batch processing -----------------
 class BatchFoodAnalyser:
-    """Classe para analisar múltiplas imagens"""
-
-    def __init__(self):
-        self.analyser = FoodAnalyser()
-
-    def analyze_multiple_images(self, image_paths: list) -> list:
-        """Analisa múltiplas imagens e retorna lista de resultados"""
-        results = []
-        for i, path in enumerate(image_paths, 1):
-            print(f"Analisando imagem {i}/{len(image_paths)}: {os.path.basename(path)}")
-            result = self.analyser.analyze_food_image(path)
-            results.append({
-                'path': path,
-                'filename': os.path.basename(path),
-                'analysis': result
-            })
+    """Classe para analisar múltiplas imagens em paralelo.
+
+    Até `max_workers` análises simultâneas; as chamadas ao modelo passam pelo
+    limitador de cota do FoodAnalyser (GEMINI_RPM). Os resultados voltam na ordem
+    de entrada e a falha de uma imagem não interrompe o lote.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None,
+                 progress_callback: Optional[Callable[[int, int, dict], None]] = None):
+        self.analyser = get_food_analyser()
+        self.max_workers = max_workers or int(os.getenv('BATCH_ANALYSIS_WORKERS', 4))
+        self.progress_callback = progress_callback
+
+    def analyze_multiple_images(self, image_paths: list, user_id: Optional[int] = None,
+                                progress_callback: Optional[Callable[[int, int, dict], None]] = None) -> list:
+        """Analisa múltiplas imagens e retorna lista de resultados (mesma ordem de image_paths).
+
+        progress_callback(concluídas, total, resultado) é chamado a cada imagem finalizada.
+        """
+        callback = progress_callback or self.progress_callback
+        results = [None] * len(image_paths)
+        if not image_paths:
+            return results
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(image_paths)),
+                                thread_name_prefix="batch-analysis") as executor:
+            futures = {
+                executor.submit(self._analyze_one, path, user_id): index
+                for index, path in enumerate(image_paths)
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                results[futures[future]] = result
+                if callback:
+                    try:
+                        callback(done, len(image_paths), result)
+                    except Exception as e:
+                        print(f"Erro no callback de progresso: {e}")
         return results
 
+    def _analyze_one(self, path: str, user_id: Optional[int]) -> dict:
+        result = {'path': path, 'filename': os.path.basename(path)}
+        try:
+            analysis = self.analyser.analyze(path, user_id=user_id, endpoint="batch", background=True)
+            result.update(analysis=analysis['text'], ok=analysis['ok'], cache_hit=analysis['cache_hit'], error=None)
+        except Exception as e:
+            result.update(analysis=f"Não foi possível analisar a imagem: {e}", ok=False, cache_hit=False, error=str(e))
+        return result
+
     def create_summary_report(self, results: list) -> str:
         """Cria relatório final com todas as análises"""
         report = f"""# RELATÓRIO DE ANÁLISES NUTRICIONAIS
@@ -0,0 +1,197 @@
+# intent_router.py
+"""Classificador local na frente do agente de texto.
+
+Saudações e pedidos fora do escopo recebem as respostas fixas que o prompt de sistema
+já determina, sem chamada ao LLM. Regras por palavra-chave decidem os casos óbvios; o
+resto passa por um Naive Bayes de unigramas salvo em JSON (intent_model.json). Na
+dúvida a mensagem segue para o agente: recusar uma pergunta válida custa mais que uma
+chamada ao modelo.
+
+Treino do modelo:  python Intent_Router.py --train [intent_examples.jsonl]
+"""
+from collections import Counter
+from Response_Cache import normalize_question, REFERENCE_WORDS, MIN_WORDS
+from typing import Optional
+import argparse, json, math, os, re, threading, time, logging
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODEL_PATH = os.path.join(BASE_DIR, "intent_model.json")
+DEFAULT_EXAMPLES_PATH = os.path.join(BASE_DIR, "intent_examples.jsonl")
+
+# Respostas fixas definidas no prompt de sistema do NutritionistAgent
+GREETING_REPLY = "Olá sou seu assistente de I.A, em que posso ajudar hoje sobre treinos ou dietas?"
+OUT_OF_SCOPE_REPLY = "Desculpe, não posso ajudar com isso, pois estou aqui para ajudar com treinos e dietas."
+
+GREETING = "greeting"
+OUT_OF_SCOPE = "out_of_scope"
+NUTRITION = "nutrition"
+REPLIES = {GREETING: GREETING_REPLY, OUT_OF_SCOPE: OUT_OF_SCOPE_REPLY}
+
+# Mensagem que é só uma saudação ("oi", "olá, tudo bem?", "boa noite nutri")
+_GREETING = re.compile(
+    r"^(oi+e?|ola+|opa|hey|hi|hello|salve|bom dia|boa tarde|boa noite|e ai)"
+    r"( (tudo bem|tudo bom|td bem|beleza|blz|nutri|nutricionista))*$"
+)
+# Radicais que garantem encaminhamento ao agente
+NUTRITION_STEMS = (
+    "diet", "refei", "calori", "kcal", "protei", "carbo", "gordur", "trein", "muscula", "exercic",
+    "emagre", "hipertrof", "massa", "peso", "whey", "suplement", "creatin", "vitamin", "aliment",
+    "comid", "comer", "cafe", "almoc", "jant", "lanch", "receit", "cardap", "macro", "jejum",
+    "hidrat", "agua", "corrid", "academ", "cardio", "frut", "verdur", "legum", "ovo", "frang",
+    "arroz", "feij", "nutri", "saud", "agachament", "supino", "abdom", "glut", "fibra", "sodio",
+    "acucar", "carne", "peixe", "leite", "pao", "vegan", "vegetarian", "glicem", "colesterol",
+    "metabol", "musculo", "alongament", "caminhad", "marmita", "fitness", "cutting", "bulking",
+)
+
+
+def tokenize(normalized: str) -> list:
+    return [word for word in re.findall(r"\w+", normalized) if len(word) > 1]
+
+
+class IntentModel:
+    """Naive Bayes multinomial (suavização de Laplace) sobre palavras normalizadas"""
+
+    def __init__(self, priors: dict, word_logp: dict, unknown_logp: dict):
+        self.priors = priors
+        self.word_logp = word_logp
+        self.unknown_logp = unknown_logp
+
+    @classmethod
+    def train(cls, examples: list) -> "IntentModel":
+        """examples = [(texto, rótulo)]"""
+        counts, totals = {}, Counter()
+        for text, label in examples:
+            counts.setdefault(label, Counter()).update(tokenize(normalize_question(text)))
+            totals[label] += 1
+        vocabulary = set().union(*counts.values())
+        priors, word_logp, unknown_logp = {}, {}, {}
+        for label, words in counts.items():
+            denominator = sum(words.values()) + len(vocabulary) + 1
+            priors[label] = math.log(totals[label] / sum(totals.values()))
+            word_logp[label] = {word: math.log((count + 1) / denominator) for word, count in words.items()}
+            unknown_logp[label] = math.log(1 / denominator)
+        return cls(priors, word_logp, unknown_logp)
+
+    def probabilities(self, words: list) -> dict:
+        scores = {
+            label: prior + sum(self.word_logp[label].get(word, self.unknown_logp[label]) for word in words)
+            for label, prior in self.priors.items()
+        }
+        top = max(scores.values())
+        exp = {label: math.exp(score - top) for label, score in scores.items()}
+        total = sum(exp.values())
+        return {label: value / total for label, value in exp.items()}
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "priors": self.priors, "word_logp": self.word_logp,
+                       "unknown_logp": self.unknown_logp}, f, ensure_ascii=False, sort_keys=True)
+
+    @classmethod
+    def load(cls, path: str) -> "IntentModel":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["priors"], data["word_logp"], data["unknown_logp"])
+
+
+class IntentRouter:
+    """Decide se a mensagem recebe resposta fixa (saudação/fora do escopo) ou vai ao agente"""
+
+    def __init__(self, model: Optional[IntentModel] = None, out_of_scope_threshold: float = 0.9):
+        self.model = model
+        self.out_of_scope_threshold = out_of_scope_threshold
+        self._lock = threading.Lock()
+        self._decisions = Counter()  # (intenção, regra|modelo) -> total
+        self._classify_total = 0.0
+        self._classified = 0
+
+    def classify(self, text: str) -> tuple:
+        """(intenção, origem) com origem em "rule", "model" ou "default" """
+        start = time.perf_counter()
+        intent, source = self._classify(normalize_question(text))
+        with self._lock:
+            self._decisions[(intent, source)] += 1
+            self._classify_total += time.perf_counter() - start
+            self._classified += 1
+        return intent, source
+
+    def reply_for(self, text: str) -> Optional[str]:
+        """Resposta fixa para a mensagem, ou None se ela deve ir ao agente"""
+        return REPLIES.get(self.classify(text)[0])
+
+    def _classify(self, normalized: str) -> tuple:
+        cleaned = re.sub(r"[^\w ]", " ", normalized)
+        cleaned = re.sub(r" +", " ", cleaned).strip()
+        if _GREETING.match(cleaned):
+            return GREETING, "rule"
+        words = tokenize(cleaned)
+        if any(word.startswith(NUTRITION_STEMS) for word in words):
+            return NUTRITION, "rule"
+        # Mensagens curtas ou que continuam a conversa ("e o jantar?", "troca isso") vão ao agente
+        if len(words) < MIN_WORDS or words[0] == "e" or REFERENCE_WORDS.intersection(words):
+            return NUTRITION, "default"
+        if self.model is not None:
+            if self.model.probabilities(words).get(OUT_OF_SCOPE, 0.0) >= self.out_of_scope_threshold:
+                return OUT_OF_SCOPE, "model"
+            return NUTRITION, "model"
+        return NUTRITION, "default"
+
+    def stats(self) -> dict:
+        with self._lock:
+            decisions = {f"{intent}:{source}": count for (intent, source), count in self._decisions.items()}
+            avoided = sum(count for (intent, _), count in self._decisions.items() if intent in REPLIES)
+            return {
+                "model_loaded": self.model is not None,
+                "decisions": decisions,
+                "llm_calls_avoided": avoided,
+                "forwarded": self._classified - avoided,
+                "avg_classify_us": round(self._classify_total / self._classified * 1e6, 1) if self._classified else 0.0,
+            }
+
+
+# ----------------- Instância do processo -----------------
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_intent_router() -> Optional[IntentRouter]:
+    """Roteador compartilhado do processo, ou None se INTENT_ROUTER_ENABLED=0"""
+    global _router
+    if os.getenv("INTENT_ROUTER_ENABLED", "1") != "1":
+        return None
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                path = os.getenv("INTENT_MODEL_PATH", DEFAULT_MODEL_PATH)
+                try:
+                    model = IntentModel.load(path)
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning(f"Modelo de intenções indisponível ({path}): {e}; usando só as regras")
+                    model = None
+                _router = IntentRouter(
+                    model, out_of_scope_threshold=float(os.getenv("INTENT_OOS_THRESHOLD", 0.9))
+                )
+    return _router
+
+
+def load_examples(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [(row["text"], row["label"]) for row in rows]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Treino do modelo de intenções do /chat")
+    parser.add_argument("--train", nargs="?", const=DEFAULT_EXAMPLES_PATH, metavar="EXEMPLOS",
+                        help="JSONL com {text, label}; padrão intent_examples.jsonl")
+    parser.add_argument("--output", default=DEFAULT_MODEL_PATH)
+    args = parser.parse_args()
+
+    if args.train:
+        examples = load_examples(args.train)
+        IntentModel.train(examples).save(args.output)
+        print(f"Modelo treinado com {len(examples)} exemplos em {args.output}")
+    else:
+        parser.print_help()
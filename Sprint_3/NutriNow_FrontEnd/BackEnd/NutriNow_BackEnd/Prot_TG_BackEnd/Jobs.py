@@ -0,0 +1,245 @@
+# jobs.py
+from concurrent.futures import ThreadPoolExecutor
+from Database import get_pool
+from datetime import datetime
+from typing import Callable, Optional
+import os, socket, threading, time, traceback, uuid, logging
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    """Fila de análises cheia; o cliente deve tentar novamente mais tarde"""
+
+
+class AnalysisFailed(Exception):
+    """A análise terminou sem resultado válido; o job fica como 'error' com a mensagem"""
+
+
+class ImageJobQueue:
+    """Fila assíncrona de análises de imagem persistida na tabela analysis_jobs.
+
+    submit() grava o job como 'queued' e devolve o id na hora; um pool limitado de
+    threads executa runner(job). Antes de rodar, cada job é reivindicado com um
+    UPDATE condicional (status 'queued' -> 'running' com o id deste worker): com
+    vários processos, só quem reivindicou executa. recover() (na subida do servidor,
+    nunca no import) reenfileira os jobs 'queued' e os 'running' cuja reivindicação
+    passou de `lease_seconds`, sinal de que o worker dono morreu.
+    """
+
+    def __init__(self, runner: Callable[[dict], str], max_workers: int = 4, max_pending: int = 100,
+                 lease_seconds: float = 600, mysql_config: dict = None):
+        self.runner = runner
+        self.max_pending = max_pending
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"[:64]
+        self.pool = get_pool(mysql_config)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-job")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._skipped = 0
+        self._wait_total = 0.0
+        self._run_total = 0.0
+        self._run_max = 0.0
+
+    # ----------------- API pública -----------------
+    def check_capacity(self):
+        """Levanta JobQueueFull antes de gravar o upload, se a fila já estiver cheia"""
+        with self._lock:
+            if self._queued + self._running >= self.max_pending:
+                raise JobQueueFull(f"Fila de análises cheia ({self.max_pending} jobs pendentes)")
+
+    def submit(self, user_id: int, session_id: str, email: Optional[str], upload_id: Optional[int],
+               file_path: str) -> str:
+        with self._lock:
+            if self._queued + self._running >= self.max_pending:
+                raise JobQueueFull(f"Fila de análises cheia ({self.max_pending} jobs pendentes)")
+            self._queued += 1
+
+        job = {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "session_id": session_id,
+            "email": email,
+            "upload_id": upload_id,
+            "file_path": file_path,
+            "created_at": datetime.now(),
+        }
+        try:
+            self._insert(job)
+        except Exception:
+            with self._lock:
+                self._queued -= 1
+            raise
+        self._executor.submit(self._execute, job)
+        return job["id"]
+
+    def get(self, job_id: str, user_id: int) -> Optional[dict]:
+        def select(conn):
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                """
+                SELECT id, status, result, error, created_at, started_at, finished_at
+                FROM analysis_jobs
+                WHERE id = %s AND user_id = %s
+                """,
+                (job_id, user_id)
+            )
+            row = cursor.fetchone()
+            cursor.close()
+            return row
+
+        row = self.pool.run(select)
+        if row is None:
+            return None
+        for key in ("created_at", "started_at", "finished_at"):
+            row[key] = row[key].isoformat() if row[key] else None
+        return row
+
+    def recover(self) -> int:
+        """Reenfileira jobs pendentes: 'queued' e 'running' com a reivindicação vencida"""
+        def select(conn):
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                """
+                UPDATE analysis_jobs SET status = 'queued', worker = NULL, started_at = NULL
+                WHERE status = 'running' AND started_at < NOW() - INTERVAL %s SECOND
+                """,
+                (int(self.lease_seconds),)
+            )
+            expired = cursor.rowcount
+            conn.commit()
+            cursor.execute(
+                """
+                SELECT id, user_id, session_id, email, upload_id, file_path, created_at
+                FROM analysis_jobs
+                WHERE status = 'queued'
+                ORDER BY created_at ASC
+                """
+            )
+            rows = cursor.fetchall()
+            cursor.close()
+            return expired, rows
+
+        expired, jobs = self.pool.run(select)
+        with self._lock:
+            self._queued += len(jobs)
+        for job in jobs:
+            self._executor.submit(self._execute, job)
+        if jobs:
+            logger.info(f"{len(jobs)} jobs de análise reenfileirados ({expired} com reivindicação vencida)")
+        return len(jobs)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+    def stats(self) -> dict:
+        with self._lock:
+            finished = self._completed + self._failed
+            return {
+                "queue_depth": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "skipped_claimed_elsewhere": self._skipped,
+                "avg_wait_ms": round(self._wait_total / finished * 1000, 1) if finished else 0.0,
+                "avg_run_ms": round(self._run_total / finished * 1000, 1) if finished else 0.0,
+                "max_run_ms": round(self._run_max * 1000, 1),
+            }
+
+    # ----------------- Execução -----------------
+    def _execute(self, job: dict):
+        try:
+            claimed = self._claim(job["id"])
+        except Exception as e:
+            logger.error(f"Erro ao reivindicar o job {job['id']}: {e}")
+            claimed = False
+        if not claimed:
+            # Outro worker já pegou o job (ou ele já terminou): nada a fazer aqui
+            with self._lock:
+                self._queued -= 1
+                self._skipped += 1
+            return
+
+        started = datetime.now()
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        status, result, error = "done", None, None
+        start = time.monotonic()
+        try:
+            result = self.runner(job)
+        except Exception as e:
+            logger.error(f"Job {job['id']} falhou:\n{traceback.format_exc()}")
+            status, error = "error", str(e)
+        elapsed = time.monotonic() - start
+
+        try:
+            self._finish(job["id"], status, result, error)
+        except Exception as e:
+            logger.error(f"Erro ao gravar resultado do job {job['id']}: {e}")
+
+        with self._lock:
+            self._running -= 1
+            if status == "done":
+                self._completed += 1
+            else:
+                self._failed += 1
+            self._wait_total += max((started - job["created_at"]).total_seconds(), 0.0)
+            self._run_total += elapsed
+            self._run_max = max(self._run_max, elapsed)
+
+    def _insert(self, job: dict):
+        def insert(conn):
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                INSERT INTO analysis_jobs (id, user_id, session_id, email, upload_id, file_path, status, created_at)
+                VALUES (%s, %s, %s, %s, %s, %s, 'queued', %s)
+                """,
+                (job["id"], job["user_id"], job["session_id"], job["email"], job["upload_id"],
+                 job["file_path"], job["created_at"])
+            )
+            conn.commit()
+            cursor.close()
+
+        self.pool.run(insert)
+
+    def _claim(self, job_id: str) -> bool:
+        """'queued' -> 'running' em nome deste worker; False se outro chegou antes"""
+        def claim(conn):
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                UPDATE analysis_jobs SET status = 'running', worker = %s, started_at = NOW()
+                WHERE id = %s AND status = 'queued'
+                """,
+                (self.worker_id, job_id)
+            )
+            claimed = cursor.rowcount == 1
+            conn.commit()
+            cursor.close()
+            return claimed
+
+        return self.pool.run(claim)
+
+    def _finish(self, job_id: str, status: str, result: Optional[str], error: Optional[str]):
+        """Grava o resultado só se o job ainda é deste worker (a reivindicação pode ter vencido)"""
+        def update(conn):
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                UPDATE analysis_jobs SET status = %s, result = %s, error = %s, finished_at = NOW()
+                WHERE id = %s AND status = 'running' AND worker = %s
+                """,
+                (status, result, error, job_id, self.worker_id)
+            )
+            if cursor.rowcount == 0:
+                logger.warning(f"Job {job_id} foi reivindicado por outro worker; resultado descartado")
+            conn.commit()
+            cursor.close()
+
+        self.pool.run(update)
@@ -0,0 +1,234 @@
+# meals.py
+"""Extração estruturada da tabela nutricional e persistência em meal_analyses.
+
+A resposta em markdown do FoodAnalyser continua indo para o usuário como está;
+aqui só lemos a tabela "| Nutriente | Quantidade | % VD* |" para gravar campos
+numéricos, de forma que relatórios por usuário sejam SQL indexado. Cada gravação
+também atualiza o rollup daily_nutrition, lido pelo resumo dia/semana/mês.
+
+Reconstrução do rollup:  python Meals.py --rebuild [--user ID]
+"""
+from Database import get_pool
+from datetime import date, timedelta
+from typing import Optional
+import argparse, re, unicodedata, logging
+
+logger = logging.getLogger(__name__)
+
+# Campo -> (rótulos aceitos, já sem acento e em minúsculas; unidade em que é gravado)
+NUTRIENT_FIELDS = {
+    "kcal": (("calorias", "caloria", "energia", "valor energetico"), "kcal"),
+    "carbs_g": (("carboidratos", "carboidrato", "carboidratos totais"), "g"),
+    "protein_g": (("proteinas", "proteina"), "g"),
+    "fat_g": (("gorduras totais", "gordura total", "gorduras", "gordura", "lipidios"), "g"),
+    "saturated_fat_g": (("gorduras saturadas", "gordura saturada"), "g"),
+    "fiber_g": (("fibras", "fibra", "fibra alimentar", "fibras alimentares"), "g"),
+    "sodium_mg": (("sodio",), "mg"),
+}
+_LABELS = {label: field for field, (labels, _) in NUTRIENT_FIELDS.items() for label in labels}
+
+# "520 kcal", "12,5 g", "1.200 mg", "10-15 g", "~30 g"
+_NUMBER = r"\d{1,3}(?:\.\d{3})+(?:,\d+)?|\d+(?:[.,]\d+)?"
+_QUANTITY = re.compile(
+    rf"(?P<low>{_NUMBER})\s*(?:(?:-|–|a|até)\s*(?P<high>{_NUMBER}))?\s*(?P<unit>kcal|cal|kj|mg|g)?\b",
+    re.IGNORECASE,
+)
+
+
+def _normalize_label(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z ]", "", text.lower()).strip()
+
+
+def _to_float(number: str) -> float:
+    if re.fullmatch(r"\d{1,3}(?:\.\d{3})+(?:,\d+)?", number):
+        number = number.replace(".", "")  # separador de milhar pt-BR
+    return float(number.replace(",", "."))
+
+
+def _parse_quantity(text: str, target_unit: str) -> Optional[float]:
+    match = _QUANTITY.search(text)
+    if not match:
+        return None
+    value = _to_float(match.group("low"))
+    if match.group("high"):
+        value = (value + _to_float(match.group("high"))) / 2  # faixa: ponto médio
+    unit = (match.group("unit") or target_unit).lower()
+    if target_unit == "kcal" and unit == "kj":
+        value /= 4.184
+    elif target_unit == "mg" and unit == "g":
+        value *= 1000
+    elif target_unit == "g" and unit == "mg":
+        value /= 1000
+    return round(value, 1)
+
+
+def parse_nutrients(markdown: str) -> dict:
+    """Campos de NUTRIENT_FIELDS lidos da tabela markdown (None quando ausentes)"""
+    values = {field: None for field in NUTRIENT_FIELDS}
+    for line in markdown.splitlines():
+        cells = [cell.strip() for cell in line.strip().strip("|").split("|")]
+        if len(cells) < 2:
+            continue
+        field = _LABELS.get(_normalize_label(cells[0]))
+        if field is None or values[field] is not None:
+            continue
+        values[field] = _parse_quantity(cells[1], NUTRIENT_FIELDS[field][1])
+    return values
+
+
+def save_meal_analysis(upload_id: int, analysis: dict, mysql_config: dict = None) -> Optional[dict]:
+    """Grava (ou regrava, se o job for repetido) os nutrientes da análise do upload e
+    aplica a diferença ao daily_nutrition do dia da refeição, na mesma transação.
+
+    Usuário e horário da refeição vêm da própria linha de uploads; None se ela não existe.
+    """
+    nutrients = parse_nutrients(analysis["text"])
+    fields_parsed = sum(1 for value in nutrients.values() if value is not None)
+    columns = list(NUTRIENT_FIELDS)
+
+    def upsert(conn):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT user_id, uploaded_at FROM uploads WHERE id = %s", (upload_id,))
+            upload = cursor.fetchone()
+            if upload is None:
+                conn.rollback()
+                return False
+            user_id, meal_at = upload
+
+            # Valores anteriores (job repetido) para que o rollup receba só a diferença
+            cursor.execute(
+                f"SELECT {', '.join(columns)} FROM meal_analyses WHERE upload_id = %s FOR UPDATE",
+                (upload_id,)
+            )
+            previous = cursor.fetchone()
+
+            cursor.execute(
+                f"""
+                INSERT INTO meal_analyses
+                    (upload_id, user_id, meal_at, analyzed_at, {", ".join(columns)}, fields_parsed, reused)
+                VALUES (%s, %s, %s, NOW(), {", ".join(["%s"] * len(columns))}, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    analyzed_at = VALUES(analyzed_at),
+                    {", ".join(f"{column} = VALUES({column})" for column in columns)},
+                    fields_parsed = VALUES(fields_parsed),
+                    reused = VALUES(reused)
+                """,
+                (upload_id, user_id, meal_at)
+                + tuple(nutrients[column] for column in columns)
+                + (fields_parsed, bool(analysis.get("reused")))
+            )
+
+            old = previous or (None,) * len(columns)
+            deltas = [(nutrients[column] or 0) - float(old[i] or 0) for i, column in enumerate(columns)]
+            cursor.execute(ROLLUP_UPSERT_SQL, (user_id, meal_at.date(), 0 if previous else 1, *deltas))
+            conn.commit()
+            return True
+        finally:
+            cursor.close()
+
+    if not get_pool(mysql_config).run(upsert):
+        logger.warning(f"Upload {upload_id} não encontrado; nutrientes não gravados")
+        return None
+    if not fields_parsed:
+        logger.warning(f"Nenhum nutriente reconhecido na análise do upload {upload_id}")
+    return nutrients
+
+
+# ----------------- Rollup diário -----------------
+# daily_nutrition guarda a soma dos nutrientes por (user_id, day); a PK é o índice
+# usado pelo resumo, que lê no máximo ~37 linhas por consulta.
+ROLLUP_UPSERT_SQL = f"""
+    INSERT INTO daily_nutrition (user_id, day, meals, {", ".join(NUTRIENT_FIELDS)})
+    VALUES (%s, %s, %s, {", ".join(["%s"] * len(NUTRIENT_FIELDS))})
+    ON DUPLICATE KEY UPDATE
+        meals = meals + VALUES(meals),
+        {", ".join(f"{column} = {column} + VALUES({column})" for column in NUTRIENT_FIELDS)}
+"""
+
+
+def rebuild_daily_nutrition(user_id: int = None, mysql_config: dict = None) -> int:
+    """Recalcula o rollup a partir de meal_analyses (todos os usuários ou só um); devolve os dias gravados"""
+    where, params = ("WHERE user_id = %s", (user_id,)) if user_id is not None else ("", ())
+    sums = ", ".join(f"COALESCE(SUM({column}), 0)" for column in NUTRIENT_FIELDS)
+
+    def rebuild(conn):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"DELETE FROM daily_nutrition {where}", params)
+            cursor.execute(
+                f"""
+                INSERT INTO daily_nutrition (user_id, day, meals, {", ".join(NUTRIENT_FIELDS)})
+                SELECT user_id, DATE(meal_at), COUNT(*), {sums}
+                FROM meal_analyses {where}
+                GROUP BY user_id, DATE(meal_at)
+                """,
+                params
+            )
+            days = cursor.rowcount
+            conn.commit()
+            return days
+        finally:
+            cursor.close()
+
+    return get_pool(mysql_config).run(rebuild)
+
+
+def _period_totals(rows: list, start: date, end: date) -> dict:
+    totals = {"start": start.isoformat(), "end": end.isoformat(), "meals": 0}
+    totals.update({column: 0.0 for column in NUTRIENT_FIELDS})
+    for row in rows:
+        if start <= row["day"] <= end:
+            totals["meals"] += row["meals"]
+            for column in NUTRIENT_FIELDS:
+                totals[column] += float(row[column])
+    for column in NUTRIENT_FIELDS:
+        totals[column] = round(totals[column], 1)
+    return totals
+
+
+def nutrition_summary(user_id: int, day: date = None, mysql_config: dict = None) -> dict:
+    """Totais do dia, da semana (segunda a `day`) e do mês (dia 1 a `day`) em uma leitura por faixa da PK"""
+    day = day or date.today()
+    week_start = day - timedelta(days=day.weekday())
+    month_start = day.replace(day=1)
+
+    def fetch(conn):
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(
+                f"""
+                SELECT day, meals, {", ".join(NUTRIENT_FIELDS)}
+                FROM daily_nutrition
+                WHERE user_id = %s AND day BETWEEN %s AND %s
+                """,
+                (user_id, min(week_start, month_start), day)
+            )
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    rows = get_pool(mysql_config).run(fetch)
+    return {
+        "date": day.isoformat(),
+        "day": _period_totals(rows, day, day),
+        "week": _period_totals(rows, week_start, day),
+        "month": _period_totals(rows, month_start, day),
+    }
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Manutenção do rollup daily_nutrition")
+    parser.add_argument("--rebuild", action="store_true", help="recalcula daily_nutrition a partir de meal_analyses")
+    parser.add_argument("--user", type=int, help="limita a reconstrução a um usuário")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        print(f"{rebuild_daily_nutrition(args.user)} dias gravados em daily_nutrition")
+    else:
+        parser.print_help()
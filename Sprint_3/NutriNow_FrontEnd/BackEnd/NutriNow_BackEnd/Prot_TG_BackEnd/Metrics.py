@@ -0,0 +1,211 @@
+# metrics.py
+"""Métricas no formato texto do Prometheus, sem dependências externas.
+
+Contadores e histogramas ficam em memória, com um lock curto por métrica: o custo
+por observação é um bisect e duas somas, barato o suficiente para ficar sempre
+ligado. render() gera o texto servido em GET /metrics.
+"""
+from bisect import bisect_left
+from langchain_core.callbacks import BaseCallbackHandler
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+import threading, time
+import Timing
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labels, key)} {value:g}" for key, value in values]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = (), buckets: Tuple = HTTP_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, list] = {}  # chave -> [contagens por bucket..., +Inf, soma]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = [(key, list(values)) for key, values in self._series.items()]
+        lines = self.header()
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values[:-1]):
+                cumulative += count
+                le = 'le="+Inf"' if bound == "+Inf" else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {values[-1]:g}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Métricas do processo mais coletores que leem estado na hora do scrape"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], list]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def register_collector(self, collector: Callable[[], list]):
+        """collector() -> [(nome, tipo, ajuda, [(labels: dict, valor)])]"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics, collectors = list(self._metrics), list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in collectors:
+            for name, kind, help_text, samples in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    names = tuple(labels)
+                    lines.append(f"{name}{_format_labels(names, tuple(labels[n] for n in names))} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ----------------- Métricas do backend -----------------
+HTTP_REQUESTS = Counter("nutrinow_http_requests_total", "Requisições HTTP por rota, método e status",
+                        ("route", "method", "status"))
+HTTP_LATENCY = Histogram("nutrinow_http_request_duration_seconds",
+                         "Latência das rotas até o início da resposta", ("route", "method"), HTTP_BUCKETS)
+LLM_LATENCY = Histogram("nutrinow_llm_request_duration_seconds", "Latência das chamadas ao LLM por modelo",
+                        ("model",), LLM_BUCKETS)
+LLM_REQUESTS = Counter("nutrinow_llm_requests_total", "Chamadas ao LLM por modelo e resultado",
+                       ("model", "outcome"))
+LLM_TOKENS = Counter("nutrinow_llm_tokens_total", "Tokens informados em usage_metadata, por modelo e tipo",
+                     ("model", "kind"))
+ANALYSIS_FALLBACKS = Counter("nutrinow_analysis_fallback_retries_total",
+                             "Segundas tentativas com prompt simplificado na análise de imagem", ("model",))
+ANALYSIS_EMPTY = Counter("nutrinow_analysis_empty_responses_total",
+                         "Respostas vazias do modelo na análise de imagem", ("model", "attempt"))
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+def observe_request(route: str, method: str, status: int, seconds: float):
+    """Chamado pelos hooks after_request do Flask (App.py) e do Quart (Asgi.py)"""
+    HTTP_REQUESTS.inc(route=route, method=method, status=status)
+    HTTP_LATENCY.observe(seconds, route=route, method=method)
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Callback do LangChain que mede latência e tokens de cada chamada a um modelo.
+
+    Um por cliente de modelo (Model_Provider). run_inline evita que as execuções
+    assíncronas despachem o callback para um executor.
+    """
+    run_inline = True
+
+    def __init__(self, model: str):
+        self.model = model
+        self._started: Dict[UUID, float] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        self._observe(run_id)
+        LLM_REQUESTS.inc(model=self.model, outcome="ok")
+        usage = self._usage(response)
+        if usage:
+            LLM_TOKENS.inc(usage.get("input_tokens", 0), model=self.model, kind="input")
+            LLM_TOKENS.inc(usage.get("output_tokens", 0), model=self.model, kind="output")
+            reasoning = (usage.get("output_token_details") or {}).get("reasoning", 0)
+            if reasoning:
+                LLM_TOKENS.inc(reasoning, model=self.model, kind="reasoning")
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs):
+        self._observe(run_id)
+        LLM_REQUESTS.inc(model=self.model, outcome="error")
+
+    def _observe(self, run_id: UUID):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            LLM_LATENCY.observe(elapsed, model=self.model)
+            Timing.add("llm", elapsed)
+
+    @staticmethod
+    def _usage(response) -> Optional[dict]:
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    return usage
+        return None
@@ -0,0 +1,61 @@
+# model_provider.py
+"""Clientes de modelo de chat do processo, escolhidos por NUTRINOW_LLM_PROVIDER:
+
+    google  (padrão) Gemini via langchain_google_genai; exige GOOGLE_API_KEY
+    fake    respostas locais determinísticas com latência simulada (Fake_LLM)
+    record  Gemini real, gravando cada resposta em cassetes (Cassette_LLM)
+    replay  respostas dos cassetes, sem rede nem chave da API
+"""
+from langchain_core.language_models.chat_models import BaseChatModel
+from Metrics import LLMMetricsCallback
+import os, threading
+
+PROVIDERS = ("google", "fake", "record", "replay")
+
+# Clientes de modelo compartilhados pelo processo, indexados por (modelo, parâmetros)
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_chat_model(model: str, **params) -> BaseChatModel:
+    """Retorna o cliente compartilhado para o modelo/parâmetros, criando-o uma única vez"""
+    key = (model, tuple(sorted(params.items())))
+    llm = _models.get(key)
+    if llm is not None:
+        return llm
+    with _models_lock:
+        llm = _models.get(key)
+        if llm is None:
+            llm = _create_model(model, **params)
+            _models[key] = llm
+        return llm
+
+
+def provider_name() -> str:
+    provider = os.getenv("NUTRINOW_LLM_PROVIDER", "google")
+    if provider not in PROVIDERS:
+        raise ValueError(f"NUTRINOW_LLM_PROVIDER inválido: {provider!r} (use {', '.join(PROVIDERS)})")
+    return provider
+
+
+def _google_model(model: str, **params) -> BaseChatModel:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    if not os.getenv("GOOGLE_API_KEY"):
+        raise EnvironmentError("GOOGLE_API_KEY não definida no .env")
+    return ChatGoogleGenerativeAI(model=model, **params)
+
+
+def _create_model(model: str, **params) -> BaseChatModel:
+    # Latência e tokens de toda chamada vão para o /metrics
+    callbacks = [LLMMetricsCallback(model)]
+    provider = provider_name()
+    if provider == "fake":
+        from Fake_LLM import FakeChatModel
+        return FakeChatModel(model=model, callbacks=callbacks)
+    if provider == "replay":
+        from Cassette_LLM import ReplayChatModel
+        return ReplayChatModel(model=model, callbacks=callbacks)
+    if provider == "record":
+        from Cassette_LLM import RecordingChatModel
+        return RecordingChatModel(model=model, inner=_google_model(model, **params), callbacks=callbacks)
+    return _google_model(model, callbacks=callbacks, **params)
@@ -1,70 +1,55 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.agents import initialize_agent, AgentType
 from langchain.memory import ConversationBufferMemory
-from langchain.schema import BaseMessage, HumanMessage, AIMessage
+from langchain.schema import BaseMessage, HumanMessage, AIMessage, SystemMessage
 from dotenv import load_dotenv
-from Food_Analyser import FoodAnalyser
-import os, warnings, traceback
-import mysql.connector
+from Food_Analyser import get_food_analyser
+from Model_Provider import get_chat_model
+from Database import get_pool
+from Chat_Writer import get_chat_writer
+from Response_Cache import get_response_cache
+from Intent_Router import get_intent_router
+from Admission import AdmissionRejected, get_admission_controller
+from contextlib import nullcontext
+import asyncio, os, threading, warnings, traceback
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
 
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
+# GOOGLE_API_KEY só é exigida ao criar um cliente do Gemini (ver Model_Provider)
 load_dotenv()
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-    raise EnvironmentError("GOOGLE_API_KEY não definida no .env")
-os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
+
+
+class ChatStreamError(Exception):
+    """O modelo falhou durante o streaming; a resposta parcial não vai para o histórico"""
 
 
 class MySQLChatHistory:
-    def __init__(self, session_id: str, user_id: Optional[int], email: Optional[str], mysql_config: dict):
+    def __init__(self, session_id: str, user_id: Optional[int], email: Optional[str], mysql_config: dict = None):
         self.session_id = session_id
         self.user_id = user_id
         self.email = email
         self.mysql_config = mysql_config
-        self.connection = None
-        self._ensure_connection()
-        self._create_tables()
-
-    def _ensure_connection(self):
-        try:
-            if self.connection is None or not self.connection.is_connected():
-                self.connection = mysql.connector.connect(**self.mysql_config)
-        except Exception as e:
-            print(f"Erro ao conectar MySQL: {e}")
-            raise
+        # Conexões vêm do pool do processo; nenhuma fica presa ao histórico.
+        # As tabelas são criadas pelo Schema.py na inicialização, nunca aqui.
+        self.pool = get_pool(mysql_config)
+        # CHAT_WRITE_BEHIND=1: add_message só enfileira; o Chat_Writer grava em lote
+        self.writer = get_chat_writer(mysql_config)
 
-    def _create_tables(self):
-        try:
-            cursor = self.connection.cursor()
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS chat_history (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    session_id VARCHAR(255) NOT NULL,
-                    user_id INT NULL,
-                    email VARCHAR(255) NULL,
-                    message_type ENUM('human', 'ai') NOT NULL,
-                    content TEXT NOT NULL,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    INDEX idx_session_id (session_id),
-                    INDEX idx_user_id (user_id),
-                    INDEX idx_email (email),
-                    INDEX idx_timestamp (timestamp)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
-            """)
-            self.connection.commit()
-            cursor.close()
-        except Exception as e:
-            print(f"Erro ao criar tabelas: {e}")
-            raise
+    def add_message(self, message: BaseMessage, on_saved: Optional[Callable[[int], None]] = None):
+        """Grava a mensagem; on_saved(id) é chamado com o id do chat_history quando ela é gravada
+        (na hora ou, com write-behind, no lote) e nunca se a gravação falhar"""
+        message_type = "human" if isinstance(message, HumanMessage) else "ai"
+        if self.writer:
+            self.writer.enqueue(
+                (self.session_id, self.user_id, self.email, message_type, message.content, datetime.now()),
+                on_saved,
+            )
+            return
 
-    def add_message(self, message: BaseMessage):
-        self._ensure_connection()
-        try:
-            cursor = self.connection.cursor()
-            message_type = "human" if isinstance(message, HumanMessage) else "ai"
+        def insert(conn):
+            cursor = conn.cursor()
             cursor.execute(
                 """
                 INSERT INTO chat_history (session_id, user_id, email, message_type, content, timestamp)
@@ -79,17 +64,24 @@ class MySQLChatHistory:
                     datetime.now(),
                 )
             )
-            self.connection.commit()
+            message_id = cursor.lastrowid
+            conn.commit()
             cursor.close()
+            return message_id
+
+        try:
+            message_id = self.pool.run(insert)
         except Exception as e:
             print(f"Erro ao adicionar mensagem: {e}")
-            self.connection = None
-            self._ensure_connection()
+            return
+        if on_saved is not None:
+            on_saved(message_id)
 
     def get_messages(self, by_user: bool = False) -> List[BaseMessage]:
-        self._ensure_connection()
-        try:
-            cursor = self.connection.cursor()
+        self.flush()
+
+        def select(conn):
+            cursor = conn.cursor()
             if by_user and self.user_id:
                 cursor.execute(
                     """
@@ -112,36 +104,187 @@ class MySQLChatHistory:
                 )
             results = cursor.fetchall()
             cursor.close()
+            return results
 
-            messages = []
-            for message_type, content, _ in results:
-                if message_type == "human":
-                    messages.append(HumanMessage(content=content))
-                else:
-                    messages.append(AIMessage(content=content))
-            return messages
+        try:
+            results = self.pool.run(select)
         except Exception as e:
             print(f"Erro ao recuperar mensagens: {e}")
-            self.connection = None
-            self._ensure_connection()
             return []
 
-    def clear(self):
-        self._ensure_connection()
+        messages = []
+        for message_type, content, _ in results:
+            if message_type == "human":
+                messages.append(HumanMessage(content=content))
+            else:
+                messages.append(AIMessage(content=content))
+        return messages
+
+    def get_history_page(self, by_user: bool = False, before_id: Optional[int] = None,
+                         after_id: Optional[int] = None, limit: int = 50) -> dict:
+        """Página do histórico por cursor (keyset), sempre da mais recente para a mais antiga.
+
+        before_id pagina para trás (mensagens mais antigas); after_id busca as mais novas
+        que o cursor. Cada página é uma varredura limitada em (user_id, id) ou (session_id, id).
+        """
+        self.flush()
+        if by_user and self.user_id:
+            where, params = "user_id = %s", [self.user_id]
+        else:
+            where, params = "session_id = %s", [self.session_id]
+        if after_id is not None:
+            where += " AND id > %s"
+            params.append(after_id)
+            order = "ASC"
+        else:
+            if before_id is not None:
+                where += " AND id < %s"
+                params.append(before_id)
+            order = "DESC"
+        params.append(limit + 1)
+
+        def select(conn):
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                f"""
+                SELECT id, message_type, content, timestamp
+                FROM chat_history
+                WHERE {where}
+                ORDER BY id {order}
+                LIMIT %s
+                """,
+                tuple(params)
+            )
+            results = cursor.fetchall()
+            cursor.close()
+            return results
+
+        rows = self.pool.run(select)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if order == "ASC":
+            rows.reverse()
+
+        next_cursor = None
+        if has_more and rows:
+            if after_id is not None:
+                next_cursor = {"after_id": rows[0]["id"]}
+            else:
+                next_cursor = {"before_id": rows[-1]["id"]}
+
+        return {
+            "messages": [
+                {
+                    "id": row["id"],
+                    "type": row["message_type"],
+                    "content": row["content"],
+                    "timestamp": row["timestamp"].isoformat() if row["timestamp"] else None,
+                }
+                for row in rows
+            ],
+            "next_cursor": next_cursor,
+            "has_more": has_more,
+        }
+
+    def get_messages_after(self, after_id: Optional[int]) -> List[tuple]:
+        """Mensagens da sessão com id > after_id (as ainda fora do resumo), em ordem cronológica: [(id, mensagem)]"""
+        self.flush()
+
+        def select(conn):
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT id, message_type, content
+                FROM chat_history
+                WHERE session_id = %s AND id > %s
+                ORDER BY id
+                """,
+                (self.session_id, after_id or 0)
+            )
+            results = cursor.fetchall()
+            cursor.close()
+            return results
+
         try:
-            cursor = self.connection.cursor()
+            results = self.pool.run(select)
+        except Exception as e:
+            print(f"Erro ao recuperar mensagens recentes: {e}")
+            return []
+
+        return [
+            (message_id, HumanMessage(content=content) if message_type == "human" else AIMessage(content=content))
+            for message_id, message_type, content in results
+        ]
+
+    def get_summary(self) -> tuple:
+        """(resumo, id da última mensagem coberta por ele)"""
+        def select(conn):
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT summary, last_message_id FROM chat_summary WHERE session_id = %s", (self.session_id,)
+            )
+            row = cursor.fetchone()
+            cursor.close()
+            return (row[0], row[1]) if row else ("", None)
+
+        try:
+            return self.pool.run(select)
+        except Exception as e:
+            print(f"Erro ao recuperar resumo: {e}")
+            return "", None
+
+    def save_summary(self, summary: str, last_message_id: int):
+        def upsert(conn):
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                INSERT INTO chat_summary (session_id, user_id, summary, last_message_id, updated_at)
+                VALUES (%s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE summary = VALUES(summary), last_message_id = VALUES(last_message_id),
+                                        updated_at = VALUES(updated_at)
+                """,
+                (self.session_id, self.user_id, summary, last_message_id, datetime.now())
+            )
+            conn.commit()
+            cursor.close()
+
+        try:
+            self.pool.run(upsert)
+        except Exception as e:
+            print(f"Erro ao salvar resumo: {e}")
+
+    def clear(self):
+        # Pendentes gravados antes do DELETE, senão reapareceriam depois da limpeza
+        self.flush()
+
+        def delete(conn):
+            cursor = conn.cursor()
             if self.user_id:
                 cursor.execute("DELETE FROM chat_history WHERE user_id = %s", (self.user_id,))
+                cursor.execute("DELETE FROM chat_summary WHERE user_id = %s", (self.user_id,))
             else:
                 cursor.execute("DELETE FROM chat_history WHERE session_id = %s", (self.session_id,))
-            self.connection.commit()
+                cursor.execute("DELETE FROM chat_summary WHERE session_id = %s", (self.session_id,))
+            conn.commit()
             cursor.close()
+
+        try:
+            self.pool.run(delete)
         except Exception as e:
             print(f"Erro ao limpar histórico: {e}")
 
-    def __del__(self):
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
+    def flush(self):
+        """Grava as mensagens pendentes do write-behind antes de uma leitura ou limpeza"""
+        if self.writer:
+            self.writer.flush()
+
+    def close(self):
+        """Chamado quando o agente é despejado do cache.
+
+        As conexões são emprestadas do pool a cada operação e já foram devolvidas;
+        só as mensagens pendentes do write-behind precisam ser gravadas.
+        """
+        self.flush()
 
 
 class CustomConversationBufferMemory(ConversationBufferMemory):
@@ -161,13 +304,219 @@ class CustomConversationBufferMemory(ConversationBufferMemory):
         super().clear()
         self.chat_history_backend.clear()
 
+    # Versões assíncronas usadas por ainvoke: a base do LangChain só mexeria no buffer
+    # em memória (sem gravar no MySQL), então delegam às versões síncronas acima.
+    async def aload_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        return self.load_memory_variables(inputs)
+
+    async def asave_context(self, inputs: dict, outputs: dict):
+        # Gravação no MySQL (e resumo, no modo "summary") fora do loop de eventos
+        await asyncio.to_thread(self.save_context, inputs, outputs)
+
+    async def aclear(self):
+        await asyncio.to_thread(self.clear)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa local (~4 caracteres por token), sem chamar a API"""
+    return len(text) // 4 + 4
+
+
+# ----------------- Resumos fora da requisição -----------------
+_summary_executor = None
+_summary_executor_lock = threading.Lock()
+
+
+def get_summary_executor() -> ThreadPoolExecutor:
+    """Threads compartilhadas que atualizam os resumos do chat (NUTRINOW_SUMMARY_WORKERS)"""
+    global _summary_executor
+    if _summary_executor is None:
+        with _summary_executor_lock:
+            if _summary_executor is None:
+                _summary_executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("NUTRINOW_SUMMARY_WORKERS", 2)),
+                    thread_name_prefix="chat-summary",
+                )
+    return _summary_executor
+
+
+class _StoredId:
+    """Id de uma mensagem no chat_history, preenchido quando a gravação termina (on_saved)"""
+    __slots__ = ("value",)
+
+    def __init__(self, value: Optional[int] = None):
+        self.value = value
+
+    def set(self, value: int):
+        self.value = value
+
+
+class SummaryWindowMemory(CustomConversationBufferMemory):
+    """Memória com orçamento de tokens: últimos N turnos literais + resumo incremental.
+
+    Turnos que saem da janela são dobrados no resumo (tabela chat_summary) junto com o id
+    da última mensagem coberta, tirado dos ids que a própria gravação devolve. Ao criar o
+    agente são lidos o resumo e as mensagens posteriores a esse id: a janela fica com as
+    mais recentes e as anteriores a ela entram no resumo antes de qualquer turno novo.
+    O resumo é feito no executor de resumos, depois da resposta; as mensagens só saem da
+    memória quando o novo resumo está pronto.
+    """
+
+    def __init__(self, chat_history: MySQLChatHistory, llm, max_token_limit: int = 2000,
+                 window_turns: int = 6, **kwargs):
+        ConversationBufferMemory.__init__(self, **kwargs)
+        object.__setattr__(self, "chat_history_backend", chat_history)
+        object.__setattr__(self, "summary_llm", llm)
+        object.__setattr__(self, "max_token_limit", max_token_limit)
+        object.__setattr__(self, "window_turns", window_turns)
+        summary, last_message_id = chat_history.get_summary()
+        loaded = chat_history.get_messages_after(last_message_id)
+        window = window_turns * 2
+        object.__setattr__(self, "summary", summary)
+        # Id da última mensagem já coberta pelo resumo
+        object.__setattr__(self, "summarized_id", last_message_id)
+        # Mensagens ainda fora do resumo que não cabem na janela: primeiras a serem resumidas
+        object.__setattr__(self, "_overflow", loaded[:-window] if len(loaded) > window else [])
+        object.__setattr__(self, "_message_ids", [_StoredId(message_id) for message_id, _ in loaded[-window:]])
+        object.__setattr__(self, "_fold_lock", threading.Lock())
+        object.__setattr__(self, "_fold_future", None)
+        object.__setattr__(self, "_generation", 0)
+        self.chat_memory.messages = [message for _, message in loaded[-window:]]
+        with self._fold_lock:
+            self._schedule_fold()
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        messages = list(self.chat_memory.messages)
+        if self.summary:
+            messages.insert(0, SystemMessage(content=f"Resumo da conversa até aqui: {self.summary}"))
+        return {self.memory_key: messages}
+
+    def prompt_tokens(self) -> int:
+        return estimate_tokens(self.summary) + sum(
+            estimate_tokens(str(msg.content)) for msg in self.chat_memory.messages
+        )
+
+    def save_context(self, inputs: dict, outputs: dict):
+        with self._fold_lock:
+            ConversationBufferMemory.save_context(self, inputs, outputs)
+            saved = [(message, _StoredId()) for message in self.chat_memory.messages[-2:]]
+            self._message_ids.extend(stored for _, stored in saved)
+        for message, stored in saved:
+            self.chat_history_backend.add_message(message, on_saved=stored.set)
+        with self._fold_lock:
+            self._schedule_fold()
+
+    def clear(self):
+        with self._fold_lock:
+            super().clear()
+            object.__setattr__(self, "summary", "")
+            object.__setattr__(self, "_overflow", [])
+            object.__setattr__(self, "_message_ids", [])
+            object.__setattr__(self, "_generation", self._generation + 1)
+
+    def wait_for_summary(self, timeout: Optional[float] = None):
+        """Espera o resumo em andamento (benchmarks e encerramento do agente)"""
+        future = self._fold_future
+        if future is not None:
+            future.result(timeout)
+
+    def _schedule_fold(self):
+        """Chamar com _fold_lock: um resumo por vez por memória"""
+        if self._fold_future is None and (self._overflow or self._messages_to_fold()):
+            object.__setattr__(self, "_fold_future", get_summary_executor().submit(self._fold_old_turns))
+
+    def _messages_to_fold(self) -> int:
+        """Quantas mensagens do início da janela precisam ir para o resumo"""
+        messages = self.chat_memory.messages
+        tokens = self.prompt_tokens()
+        count = 0
+        # Mantém sempre o último turno, mesmo que sozinho estoure o orçamento
+        while len(messages) - count > 2 and (
+            len(messages) - count > self.window_turns * 2 or tokens > self.max_token_limit
+        ):
+            tokens -= sum(estimate_tokens(str(msg.content)) for msg in messages[count:count + 2])
+            count += 2
+        return count
+
+    def _next_fold(self) -> Optional[tuple]:
+        """(origem, quantidade, mensagens, ids) do próximo resumo, ou None; chamar com _fold_lock"""
+        if self._overflow:
+            # Em blocos do tamanho da janela: uma sessão longa não vira um prompt gigante
+            chunk = self._overflow[:max(self.window_turns * 2, 2)]
+            return "overflow", len(chunk), [message for _, message in chunk], [message_id for message_id, _ in chunk]
+        count = self._messages_to_fold()
+        if not count:
+            return None
+        return "window", count, list(self.chat_memory.messages[:count]), self._message_ids[:count]
+
+    def _fold_old_turns(self):
+        """Roda no executor de resumos até as mensagens pendentes caberem no orçamento"""
+        while True:
+            with self._fold_lock:
+                fold = self._next_fold()
+                if fold is None:
+                    object.__setattr__(self, "_fold_future", None)
+                    return
+                source, count, folded, ids = fold
+                generation = self._generation
+
+            try:
+                summary = self._summarize(folded)
+            except Exception:
+                print(f"Erro ao resumir conversa: {traceback.format_exc()}")
+                with self._fold_lock:
+                    object.__setattr__(self, "_fold_future", None)
+                return
+            if source == "window":
+                # Grava o write-behind pendente para que os ids das mensagens resumidas existam
+                self.chat_history_backend.flush()
+                ids = [stored.value for stored in ids]
+            # Mensagens cuja gravação falhou não têm id e não voltam numa recarga: basta o maior id gravado
+            known = [message_id for message_id in ids if message_id is not None]
+
+            with self._fold_lock:
+                if generation != self._generation:
+                    # clear() durante o resumo: o resultado não vale mais
+                    object.__setattr__(self, "_fold_future", None)
+                    return
+                if source == "overflow":
+                    del self._overflow[:count]
+                else:
+                    del self.chat_memory.messages[:count]
+                    del self._message_ids[:count]
+                object.__setattr__(self, "summary", summary)
+                if known:
+                    object.__setattr__(self, "summarized_id", max(known + [self.summarized_id or 0]))
+                summarized_id = self.summarized_id
+            self.chat_history_backend.save_summary(summary, summarized_id)
+
+    def _summarize(self, messages: List[BaseMessage]) -> str:
+        transcript = "\n".join(
+            f"{'Usuário' if isinstance(msg, HumanMessage) else 'Nutricionista'}: {msg.content}"
+            for msg in messages
+        )
+        prompt = f"""Atualize o resumo de uma conversa entre um usuário e uma nutricionista virtual.
+Mantenha objetivos, dados pessoais (peso, altura, restrições) e recomendações já feitas. Seja conciso.
+
+Resumo atual:
+{self.summary or "(vazio)"}
+
+Novas mensagens:
+{transcript}
+
+Novo resumo:"""
+        response = self.summary_llm.invoke([HumanMessage(content=prompt)])
+        return str(response.content).strip()
+
 
 class NutritionistAgent:
-    def __init__(self, session_id: str, mysql_config: dict = None, user_id: Optional[int] = None, email: Optional[str] = None):
+    def __init__(self, session_id: str, mysql_config: dict = None, user_id: Optional[int] = None,
+                 email: Optional[str] = None, memory_mode: Optional[str] = None):
         self.session_id = session_id
         self.user_id = user_id
         self.email = email
-        self.llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.7)
+        # Cliente e analisador são compartilhados; o estado da sessão fica em memory/chat_history
+        self.llm = get_chat_model("gemini-2.5-flash", temperature=0.7)
 
         system_prompt = """
         Você é uma nutricionista virtual especializada em nutrição esportiva.
@@ -177,19 +526,9 @@ class NutritionistAgent:
         - Comunicação clara, objetiva e motivadora.
         - Se o usuário pedir algo fora do escopo, responda "Desculpe, não posso ajudar com isso, pois estou aqui para ajudar com treinos e dietas."
         """
+        self.system_prompt = system_prompt
 
-        if mysql_config is None:
-            mysql_config = {
-                "host": os.getenv("MYSQL_HOST", "localhost"),
-                "port": int(os.getenv("MYSQL_PORT", 3306)),
-                "user": os.getenv("MYSQL_USER", "root"),
-                "password": os.getenv("MYSQL_PASSWORD", ""),
-                "database": os.getenv("MYSQL_DATABASE", "nutrinow2"),
-                "charset": "utf8mb4",
-                "autocommit": True,
-                "connection_timeout": 60,
-            }
-
+        # mysql_config=None usa o pool padrão do processo (variáveis MYSQL_*)
         self.chat_history = MySQLChatHistory(
             session_id=session_id,
             mysql_config=mysql_config,
@@ -197,11 +536,23 @@ class NutritionistAgent:
             email=email,
         )
 
-        self.memory = CustomConversationBufferMemory(
-            chat_history=self.chat_history,
-            memory_key="chat_history",
-            return_messages=True,
-        )
+        # "buffer" carrega todo o histórico; "summary" usa janela + resumo com orçamento de tokens
+        memory_mode = memory_mode or os.getenv("NUTRINOW_MEMORY_MODE", "buffer")
+        if memory_mode == "summary":
+            self.memory = SummaryWindowMemory(
+                chat_history=self.chat_history,
+                llm=get_chat_model("gemini-2.0-flash", temperature=0),
+                max_token_limit=int(os.getenv("NUTRINOW_MEMORY_TOKEN_LIMIT", 2000)),
+                window_turns=int(os.getenv("NUTRINOW_MEMORY_WINDOW_TURNS", 6)),
+                memory_key="chat_history",
+                return_messages=True,
+            )
+        else:
+            self.memory = CustomConversationBufferMemory(
+                chat_history=self.chat_history,
+                memory_key="chat_history",
+                return_messages=True,
+            )
 
         self.agent = initialize_agent(
             llm=self.llm,
@@ -209,29 +560,185 @@ class NutritionistAgent:
             agent=AgentType.CHAT_CONVERSATIONAL_REACT_DESCRIPTION,
             verbose=False,
             memory=self.memory,
-            agent_kwargs={"system_message": system_prompt},
+            agent_kwargs={"system_message": self.system_prompt},
         )
 
-        self.analyser = FoodAnalyser()
+        self.analyser = get_food_analyser()
+        self.response_cache = get_response_cache()
+        self.router = get_intent_router()
+        self.admission = get_admission_controller()
 
     def run_text(self, input_text: str) -> str:
+        reply = self._canned_reply(input_text)
+        if reply is not None:
+            self.memory.save_context({"input": input_text}, {"output": reply})
+            return reply
+        key, answer = self._cached_answer(input_text)
+        if answer is not None:
+            self.memory.save_context({"input": input_text}, {"output": answer})
+            return answer
+        with self._llm_slot():
+            try:
+                response = self.agent.invoke({"input": input_text})
+                answer = response.get("output") if isinstance(response, dict) else response
+            except Exception:
+                print(f"Erro chat: {traceback.format_exc()}")
+                return "Desculpe, não foi possível processar sua solicitação."
+        self._store_answer(key, answer)
+        return answer
+
+    def stream_text(self, input_text: str) -> Iterator[str]:
+        """Gera a resposta em pedaços conforme chegam do modelo.
+
+        Sem ferramentas o agente ReAct equivale a uma chamada direta ao modelo, então o
+        streaming monta o prompt (sistema + memória + pergunta) e usa llm.stream. O texto
+        completo é salvo via memory.save_context ao final; se o modelo falhar no meio,
+        levanta ChatStreamError e nada é salvo.
+        """
+        reply = self._canned_reply(input_text)
+        if reply is not None:
+            yield reply
+            self.memory.save_context({"input": input_text}, {"output": reply})
+            return
+        parts = []
         try:
-            response = self.agent.invoke({"input": input_text})
-            return response.get("output") if isinstance(response, dict) else response
-        except Exception:
-            print(f"Erro chat: {traceback.format_exc()}")
-            return "Desculpe, não foi possível processar sua solicitação."
+            for chunk in self.llm.stream(self._stream_messages(input_text)):
+                text = self._chunk_text(chunk)
+                if text:
+                    parts.append(text)
+                    yield text
+        except Exception as e:
+            print(f"Erro chat (stream): {traceback.format_exc()}")
+            raise ChatStreamError("Desculpe, não foi possível processar sua solicitação.") from e
+
+        self.memory.save_context({"input": input_text}, {"output": "".join(parts)})
+
+    async def arun_text(self, input_text: str) -> str:
+        """Versão assíncrona de run_text: o agente usa ainvoke e o histórico é gravado fora do loop"""
+        reply = self._canned_reply(input_text)
+        if reply is not None:
+            await self.memory.asave_context({"input": input_text}, {"output": reply})
+            return reply
+        key, answer = self._cached_answer(input_text)
+        if answer is not None:
+            await self.memory.asave_context({"input": input_text}, {"output": answer})
+            return answer
+        async with self._llm_aslot():
+            try:
+                response = await self.agent.ainvoke({"input": input_text})
+                answer = response.get("output") if isinstance(response, dict) else response
+            except Exception:
+                print(f"Erro chat: {traceback.format_exc()}")
+                return "Desculpe, não foi possível processar sua solicitação."
+        self._store_answer(key, answer)
+        return answer
+
+    def _canned_reply(self, input_text: str) -> Optional[str]:
+        """Saudação ou pedido fora do escopo: resposta fixa do prompt, sem chamar o LLM"""
+        return self.router.reply_for(input_text) if self.router else None
+
+    def _llm_slot(self):
+        """Vaga do controle de admissão só para a chamada real ao modelo: respostas fixas e
+        acertos do cache não ocupam vaga nem podem ser recusadas com 429/503"""
+        return self.admission.slot("chat", self.user_id) if self.admission else nullcontext()
+
+    def _llm_aslot(self):
+        return self.admission.aslot("chat", self.user_id) if self.admission else nullcontext()
+
+    def stream_ticket(self, input_text: str):
+        """Vaga para stream_text/astream_text, obtida pela rota antes de abrir a resposta (para
+        ainda poder responder 429/503) e devolvida ao fechá-la; None se não houver chamada ao modelo"""
+        if self.admission is None or self._canned_reply(input_text) is not None:
+            return None
+        return self.admission.acquire("chat", self.user_id)
+
+    async def astream_ticket(self, input_text: str):
+        if self.admission is None or self._canned_reply(input_text) is not None:
+            return None
+        return await self.admission.aacquire("chat", self.user_id)
+
+    def _cached_answer(self, input_text: str) -> Tuple[Optional[str], Optional[str]]:
+        """(chave, resposta do cache) da pergunta; chave None se ela depende da conversa ou o
+        cache está desligado. Só consulta: numa falta a resposta vem do caminho normal do
+        agente, com o histórico da sessão, e _store_answer a guarda."""
+        if self.response_cache is None:
+            return None, None
+        key = self.response_cache.key_for(input_text)
+        return key, (self.response_cache.get(key) if key is not None else None)
+
+    def _store_answer(self, key: Optional[str], answer: Optional[str]):
+        if key is not None and isinstance(answer, str):
+            self.response_cache.put(key, answer)
+
+    async def astream_text(self, input_text: str) -> AsyncIterator[str]:
+        """Versão assíncrona de stream_text (llm.astream; histórico gravado fora do loop)"""
+        reply = self._canned_reply(input_text)
+        if reply is not None:
+            yield reply
+            await self.memory.asave_context({"input": input_text}, {"output": reply})
+            return
+        parts = []
+        try:
+            async for chunk in self.llm.astream(self._stream_messages(input_text)):
+                text = self._chunk_text(chunk)
+                if text:
+                    parts.append(text)
+                    yield text
+        except Exception as e:
+            print(f"Erro chat (stream): {traceback.format_exc()}")
+            raise ChatStreamError("Desculpe, não foi possível processar sua solicitação.") from e
+
+        await self.memory.asave_context({"input": input_text}, {"output": "".join(parts)})
+
+    def _stream_messages(self, input_text: str) -> List[BaseMessage]:
+        messages = [SystemMessage(content=self.system_prompt)]
+        messages.extend(self.memory.load_memory_variables({"input": input_text})[self.memory.memory_key])
+        messages.append(HumanMessage(content=input_text))
+        return messages
+
+    @staticmethod
+    def _chunk_text(chunk) -> str:
+        return chunk.content if isinstance(chunk.content, str) else "".join(
+            item.get("text", "") if isinstance(item, dict) else str(item) for item in chunk.content
+        )
 
     def run_image(self, image_path: str) -> str:
+        return self.run_image_detailed(image_path)["text"]
+
+    def run_image_detailed(self, image_path: str, endpoint: str = "image", background: bool = False) -> dict:
+        """Como run_image, mas devolve também se houve acerto de cache ou reaproveitamento.
+
+        endpoint/background: prioridade da chamada ao modelo no controle de admissão ("batch" nos jobs)
+        """
         try:
-            result = self.analyser._run(image_path)
+            result = self.analyser.analyze(image_path, user_id=self.user_id, endpoint=endpoint,
+                                           background=background)
             self.memory.save_context(
-                {"input": f"Análise de imagem: {image_path}"}, {"output": result}
+                {"input": f"Análise de imagem: {image_path}"}, {"output": result["text"]}
+            )
+            return result
+        except AdmissionRejected:
+            raise
+        except Exception:
+            print(f"Erro imagem: {traceback.format_exc()}")
+            return {"text": "Não foi possível analisar a imagem.", "ok": False, "cache_hit": False, "reused": False}
+
+    async def arun_image(self, image_path: str) -> str:
+        return (await self.arun_image_detailed(image_path))["text"]
+
+    async def arun_image_detailed(self, image_path: str) -> dict:
+        """Versão assíncrona de run_image_detailed (Pillow e MySQL em threads, Gemini via ainvoke)"""
+        try:
+            result = await self.analyser.aanalyze(image_path, user_id=self.user_id)
+            await self.memory.asave_context(
+                {"input": f"Análise de imagem: {image_path}"}, {"output": result["text"]}
             )
             return result
+        except AdmissionRejected:
+            raise
         except Exception:
             print(f"Erro imagem: {traceback.format_exc()}")
-            return "Não foi possível analisar a imagem."
+            return {"text": "Não foi possível analisar a imagem.", "ok": False, "cache_hit": False, "reused": False}
 
     def get_conversation_history(self, by_user: bool = False) -> List[dict]:
         messages = self.chat_history.get_messages(by_user=by_user)
@@ -248,3 +755,11 @@ class NutritionistAgent:
 
     def clear_history(self):
         self.memory.clear()
+
+    def approx_size(self) -> int:
+        """Estimativa grosseira de memória do agente (mensagens em memória + overhead fixo)"""
+        messages = self.memory.chat_memory.messages
+        return 16 * 1024 + sum(len(str(msg.content)) * 2 + 200 for msg in messages)
+
+    def close(self):
+        self.chat_history.close()
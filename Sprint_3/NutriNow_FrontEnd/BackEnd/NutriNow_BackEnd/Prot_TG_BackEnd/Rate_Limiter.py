@@ -0,0 +1,110 @@
+# rate_limiter.py
+from typing import Optional
+import asyncio, os, threading, time
+
+
+class TokenBucket:
+    """Limitador token bucket thread-safe.
+
+    `rate` fichas por segundo, acumulando até `capacity` (rajada). acquire() bloqueia
+    até haver ficha ou até o timeout, sem segurar o lock enquanto espera.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate deve ser positivo")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._acquired = 0
+        self._waited = 0
+        self._wait_total = 0.0
+
+    def _refill(self, now: float):
+        """Repõe as fichas do tempo decorrido; chamar com o lock adquirido"""
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _try_acquire(self, tokens: float, start: float, waited: bool) -> float:
+        """Consome as fichas se houver (retorna 0) ou retorna quanto esperar.
+
+        `waited` indica que o chamador já dormiu ao menos uma vez; só esses entram
+        nas estatísticas de espera.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                self._acquired += 1
+                if waited:
+                    self._waited += 1
+                    self._wait_total += now - start
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1, timeout: Optional[float] = None) -> bool:
+        """Consome `tokens` fichas; False se o timeout expirar antes"""
+        start, waited = time.monotonic(), False
+        while True:
+            delay = self._try_acquire(tokens, start, waited)
+            if not delay:
+                return True
+            delay = self._bounded_delay(delay, start, timeout)
+            if delay is None:
+                return False
+            time.sleep(delay)
+            waited = True
+
+    async def aacquire(self, tokens: float = 1, timeout: Optional[float] = None) -> bool:
+        """Versão assíncrona de acquire(): espera com asyncio.sleep, sem bloquear o loop"""
+        start, waited = time.monotonic(), False
+        while True:
+            delay = self._try_acquire(tokens, start, waited)
+            if not delay:
+                return True
+            delay = self._bounded_delay(delay, start, timeout)
+            if delay is None:
+                return False
+            await asyncio.sleep(delay)
+            waited = True
+
+    @staticmethod
+    def _bounded_delay(delay: float, start: float, timeout: Optional[float]) -> Optional[float]:
+        if timeout is None:
+            return delay
+        remaining = start + timeout - time.monotonic()
+        return min(delay, remaining) if remaining > 0 else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "rate_per_s": self.rate,
+                "capacity": self.capacity,
+                "available": round(self._tokens, 2),
+                "acquired": self._acquired,
+                "waited": self._waited,
+                "wait_time_total_ms": round(self._wait_total * 1000, 1),
+            }
+
+
+# ----------------- Limitador do processo -----------------
+_model_limiter = None
+_model_limiter_lock = threading.Lock()
+
+
+def get_model_rate_limiter() -> Optional[TokenBucket]:
+    """Limitador das chamadas ao Gemini (GEMINI_RPM por minuto, rajada GEMINI_BURST), ou None se GEMINI_RPM=0"""
+    global _model_limiter
+    rpm = float(os.getenv("GEMINI_RPM", 0))
+    if rpm <= 0:
+        return None
+    if _model_limiter is None:
+        with _model_limiter_lock:
+            if _model_limiter is None:
+                burst = os.getenv("GEMINI_BURST")
+                _model_limiter = TokenBucket(rpm / 60.0, float(burst) if burst else None)
+    return _model_limiter
@@ -0,0 +1,132 @@
+# response_cache.py
+from collections import OrderedDict
+from typing import Optional
+import os, re, threading, time, unicodedata
+
+# Palavras que remetem à conversa (referências, continuações, respostas curtas)
+REFERENCE_WORDS = {
+    "isso", "isto", "disso", "disto", "nisso", "aquilo", "daquilo",
+    "esse", "essa", "esses", "essas", "desse", "dessa", "desses", "dessas", "nesse", "nessa",
+    "este", "esta", "estes", "estas", "deste", "desta", "aquele", "aquela", "daquele", "daquela",
+    "ele", "ela", "eles", "elas", "dele", "dela", "deles", "delas",
+    "anterior", "acima", "antes", "mesmo", "mesma", "tambem", "outro", "outra", "outros", "outras",
+    "mais", "menos", "continue", "continua", "continuar", "novamente", "troque", "troca", "substitua",
+    "entao", "agora", "tb", "tbm",
+    "sim", "nao", "ok", "obrigado", "obrigada", "valeu",
+}
+# Palavras em primeira pessoa: a resposta tende a depender do próprio usuário
+PERSONAL_WORDS = {"eu", "me", "mim", "meu", "minha", "meus", "minhas", "comigo"}
+CONTEXT_WORDS = REFERENCE_WORDS | PERSONAL_WORDS
+MIN_WORDS = 3
+
+
+def normalize_question(text: str) -> str:
+    """Minúsculas (casefold), sem acentos, espaços colapsados e sem pontuação nas pontas"""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return re.sub(r"\s+", " ", text).strip(" ?!.,;:")
+
+
+def is_context_free(normalized: str) -> bool:
+    words = re.findall(r"\w+", normalized)
+    if len(words) < MIN_WORDS or words[0] == "e":  # "e para o jantar?" continua a conversa
+        return False
+    return not CONTEXT_WORDS.intersection(words)
+
+
+class ResponseCache:
+    """Cache em memória de respostas do /chat para perguntas genéricas.
+
+    A chave é a pergunta normalizada; perguntas curtas ou que remetem à conversa
+    (CONTEXT_WORDS) não passam pelo cache. Despeja por TTL desde a gravação e por
+    uso menos recente (LRU) acima de `max_entries`; cada entrada conta seus acertos.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # chave -> [resposta, criada_em, acertos]
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._bypassed = 0
+        self._evictions = {"lru": 0, "ttl": 0}
+
+    def key_for(self, question: str) -> Optional[str]:
+        """Chave da pergunta, ou None se ela depende do contexto da conversa"""
+        normalized = normalize_question(question)
+        if is_context_free(normalized):
+            return normalized
+        with self._lock:
+            self._bypassed += 1
+        return None
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] >= self.ttl:
+                del self._entries[key]
+                self._evictions["ttl"] += 1
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            entry[2] += 1
+            self._hits += 1
+            return entry[0]
+
+    def put(self, key: str, answer: str):
+        if not answer.strip():
+            return
+        with self._lock:
+            self._entries[key] = [answer, time.monotonic(), 0]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions["lru"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def top(self, limit: int = 10) -> list:
+        """Entradas com mais acertos: [{"question", "hits", "age_s"}]"""
+        now = time.monotonic()
+        with self._lock:
+            entries = [(key, entry[2], now - entry[1]) for key, entry in self._entries.items()]
+        entries.sort(key=lambda item: item[1], reverse=True)
+        return [{"question": key, "hits": hits, "age_s": round(age)} for key, hits, age in entries[:limit]]
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "bypassed": self._bypassed,
+                "evictions": dict(self._evictions),
+            }
+        stats["top"] = self.top(5)
+        return stats
+
+
+# ----------------- Instância do processo -----------------
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Cache compartilhado do processo, ou None se RESPONSE_CACHE_ENABLED != 1 (opt-in)"""
+    global _cache
+    if os.getenv("RESPONSE_CACHE_ENABLED", "0") != "1":
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(
+                    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 1000)),
+                    ttl=float(os.getenv("RESPONSE_CACHE_TTL", 24 * 3600)),
+                )
+    return _cache
@@ -0,0 +1,302 @@
+# schema.py
+"""Bootstrap/migração versionada do esquema MySQL.
+
+Executado uma vez na inicialização do App.py (ou via `python Schema.py` /
+`flask init-db`). O caminho das requisições não executa DDL.
+"""
+from Database import get_pool
+import argparse, logging
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_LOCK = "nutrinow_schema_migration"
+
+
+# ----------------- Passos auxiliares -----------------
+def add_index(table: str, name: str, columns: str):
+    """Passo de migração que cria o índice apenas se ele ainda não existir"""
+    def step(cursor):
+        cursor.execute(
+            """
+            SELECT COUNT(*) FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+            """,
+            (table, name)
+        )
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f"ALTER TABLE {table} ADD INDEX {name} ({columns})")
+    return step
+
+
+def add_column(table: str, name: str, definition: str):
+    """Passo de migração que adiciona a coluna apenas se ela ainda não existir"""
+    def step(cursor):
+        cursor.execute(
+            """
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+            """,
+            (table, name)
+        )
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+    return step
+
+
+# ----------------- Migrações -----------------
+# Cada entrada: (versão, descrição, [SQL ou função(cursor)]). Nunca altere uma
+# migração já publicada; adicione uma nova versão no fim da lista.
+MIGRATIONS = [
+    (1, "Esquema base (nutrinow2.sql)", [
+        """
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            nome VARCHAR(100) NOT NULL,
+            sobrenome VARCHAR(100) NOT NULL,
+            data_nascimento DATE NOT NULL,
+            genero ENUM('Masculino','Feminino','Não-Binário', 'Prefiro não informar') NOT NULL,
+            email VARCHAR(255) NOT NULL UNIQUE,
+            senha VARCHAR(255) NOT NULL,
+            criado_em DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS redefinicao_senha (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            usuario_id INT NOT NULL,
+            token VARCHAR(255) NOT NULL,
+            data_expiracao DATETIME NOT NULL,
+            criado_em DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS chat_history (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            session_id VARCHAR(255) NOT NULL,
+            user_id INT NULL,
+            email VARCHAR(255) NULL,
+            message_type ENUM('human','ai') NOT NULL,
+            content TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_session_id (session_id),
+            INDEX idx_user_id (user_id),
+            INDEX idx_email (email),
+            FOREIGN KEY (user_id) REFERENCES usuarios(id) ON DELETE SET NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS uploads (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            file_path VARCHAR(255) NOT NULL,
+            uploaded_at DATETIME NOT NULL,
+            message_type ENUM('human','ai') NOT NULL DEFAULT 'human',
+            FOREIGN KEY (user_id) REFERENCES usuarios(id) ON DELETE CASCADE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS perfil (
+            usuario_id INT PRIMARY KEY,
+            meta VARCHAR(255) DEFAULT 'Não definida',
+            altura_peso VARCHAR(50) DEFAULT '-- / --',
+            FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS dieta_treino (
+            id BIGINT PRIMARY KEY AUTO_INCREMENT,
+            user_id INT NOT NULL,
+            tipo ENUM('treino', 'dieta') NOT NULL,
+            title VARCHAR(255) NOT NULL,
+            description TEXT NOT NULL,
+            time VARCHAR(50),
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES usuarios(id) ON DELETE CASCADE
+        )
+        """,
+    ]),
+    (2, "Índice de timestamp do chat_history (antes criado pelo Nutri.py)", [
+        add_index("chat_history", "idx_timestamp", "timestamp"),
+    ]),
+    (3, "Resumo incremental da conversa (memória por janela + resumo)", [
+        """
+        CREATE TABLE IF NOT EXISTS chat_summary (
+            session_id VARCHAR(255) PRIMARY KEY,
+            user_id INT NULL,
+            summary TEXT NOT NULL,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_summary_user_id (user_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """,
+    ]),
+    (4, "Índices compostos para paginação por cursor do chat_history", [
+        add_index("chat_history", "idx_user_id_id", "user_id, id"),
+        add_index("chat_history", "idx_session_id_id", "session_id, id"),
+    ]),
+    (5, "Fila persistente de análises de imagem assíncronas", [
+        """
+        CREATE TABLE IF NOT EXISTS analysis_jobs (
+            id CHAR(36) PRIMARY KEY,
+            user_id INT NOT NULL,
+            session_id VARCHAR(255) NOT NULL,
+            email VARCHAR(255) NULL,
+            upload_id INT NULL,
+            file_path VARCHAR(255) NOT NULL,
+            status ENUM('queued','running','done','error') NOT NULL DEFAULT 'queued',
+            result MEDIUMTEXT NULL,
+            error TEXT NULL,
+            created_at DATETIME NOT NULL,
+            started_at DATETIME NULL,
+            finished_at DATETIME NULL,
+            INDEX idx_jobs_status (status, created_at),
+            INDEX idx_jobs_user (user_id, created_at),
+            FOREIGN KEY (user_id) REFERENCES usuarios(id) ON DELETE CASCADE,
+            FOREIGN KEY (upload_id) REFERENCES uploads(id) ON DELETE SET NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """,
+    ]),
+    (6, "Nutrientes estruturados de cada análise de imagem (Meals.py)", [
+        """
+        CREATE TABLE IF NOT EXISTS meal_analyses (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            upload_id INT NOT NULL,
+            user_id INT NOT NULL,
+            meal_at DATETIME NOT NULL,
+            analyzed_at DATETIME NOT NULL,
+            kcal DECIMAL(8,1) NULL,
+            carbs_g DECIMAL(7,1) NULL,
+            protein_g DECIMAL(7,1) NULL,
+            fat_g DECIMAL(7,1) NULL,
+            saturated_fat_g DECIMAL(7,1) NULL,
+            fiber_g DECIMAL(7,1) NULL,
+            sodium_mg DECIMAL(8,1) NULL,
+            fields_parsed TINYINT NOT NULL DEFAULT 0,
+            reused TINYINT(1) NOT NULL DEFAULT 0,
+            UNIQUE KEY uq_meal_upload (upload_id),
+            INDEX idx_meal_user_time (user_id, meal_at),
+            FOREIGN KEY (upload_id) REFERENCES uploads(id) ON DELETE CASCADE,
+            FOREIGN KEY (user_id) REFERENCES usuarios(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """,
+    ]),
+    (7, "Rollup diário de nutrientes por usuário (Meals.py)", [
+        """
+        CREATE TABLE IF NOT EXISTS daily_nutrition (
+            user_id INT NOT NULL,
+            day DATE NOT NULL,
+            meals INT NOT NULL DEFAULT 0,
+            kcal DECIMAL(10,1) NOT NULL DEFAULT 0,
+            carbs_g DECIMAL(9,1) NOT NULL DEFAULT 0,
+            protein_g DECIMAL(9,1) NOT NULL DEFAULT 0,
+            fat_g DECIMAL(9,1) NOT NULL DEFAULT 0,
+            saturated_fat_g DECIMAL(9,1) NOT NULL DEFAULT 0,
+            fiber_g DECIMAL(9,1) NOT NULL DEFAULT 0,
+            sodium_mg DECIMAL(10,1) NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day),
+            FOREIGN KEY (user_id) REFERENCES usuarios(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """,
+        # Análises gravadas antes desta versão
+        """
+        INSERT INTO daily_nutrition (user_id, day, meals, kcal, carbs_g, protein_g, fat_g,
+                                     saturated_fat_g, fiber_g, sodium_mg)
+        SELECT user_id, DATE(meal_at), COUNT(*), COALESCE(SUM(kcal), 0), COALESCE(SUM(carbs_g), 0),
+               COALESCE(SUM(protein_g), 0), COALESCE(SUM(fat_g), 0), COALESCE(SUM(saturated_fat_g), 0),
+               COALESCE(SUM(fiber_g), 0), COALESCE(SUM(sodium_mg), 0)
+        FROM meal_analyses
+        GROUP BY user_id, DATE(meal_at)
+        ON DUPLICATE KEY UPDATE meals = daily_nutrition.meals
+        """,
+    ]),
+    (8, "Hash de conteúdo dos uploads (Upload_Storage)", [
+        add_column("uploads", "content_hash", "CHAR(64) NULL AFTER file_path"),
+        add_index("uploads", "idx_uploads_content_hash", "content_hash"),
+    ]),
+    (9, "Reivindicação de jobs de análise por worker (Jobs.py)", [
+        add_column("analysis_jobs", "worker", "VARCHAR(64) NULL AFTER status"),
+    ]),
+    (10, "Última mensagem coberta pelo resumo do chat (SummaryWindowMemory)", [
+        add_column("chat_summary", "last_message_id", "INT NULL AFTER summary"),
+    ]),
+]
+
+
+# ----------------- Execução -----------------
+def _ensure_version_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+
+def current_version(cursor) -> int:
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+    return cursor.fetchone()[0]
+
+
+def bootstrap_schema(mysql_config: dict = None) -> int:
+    """Aplica as migrações pendentes e retorna a versão final do esquema"""
+    def migrate(conn):
+        cursor = conn.cursor()
+        # Várias instâncias podem subir juntas: só uma migra por vez
+        cursor.execute("SELECT GET_LOCK(%s, 60)", (SCHEMA_LOCK,))
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("Não foi possível obter o lock de migração do esquema")
+        try:
+            _ensure_version_table(cursor)
+            version = current_version(cursor)
+            for number, description, steps in MIGRATIONS:
+                if number <= version:
+                    continue
+                logger.info(f"Aplicando migração {number}: {description}")
+                for step in steps:
+                    if callable(step):
+                        step(cursor)
+                    else:
+                        cursor.execute(step)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                    (number, description)
+                )
+                conn.commit()
+                version = number
+            return version
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (SCHEMA_LOCK,))
+            cursor.fetchone()
+            cursor.close()
+
+    return get_pool(mysql_config).run(migrate)
+
+
+def schema_status(mysql_config: dict = None) -> dict:
+    def status(conn):
+        cursor = conn.cursor()
+        _ensure_version_table(cursor)
+        version = current_version(cursor)
+        cursor.close()
+        return version
+
+    version = get_pool(mysql_config).run(status)
+    latest = MIGRATIONS[-1][0]
+    return {"current": version, "latest": latest, "pending": [m[0] for m in MIGRATIONS if m[0] > version]}
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Bootstrap/migração do esquema NutriNow")
+    parser.add_argument("--status", action="store_true", help="apenas mostra a versão atual e as pendentes")
+    args = parser.parse_args()
+
+    if args.status:
+        print(schema_status())
+    else:
+        print(f"Esquema na versão {bootstrap_schema()}")
@@ -0,0 +1,120 @@
+# timing.py
+"""Tempo por fase de cada requisição (db, file, image, llm, queue).
+
+O acumulador da requisição vive em um ContextVar: `with phase("db")` soma no pedido
+corrente de qualquer ponto do código (inclusive em asyncio.to_thread, que copia o
+contexto) e não faz nada fora de uma requisição, como nos workers da fila de jobs.
+Ao final a rota recebe o cabeçalho Server-Timing e uma linha JSON é registrada no
+logger "nutrinow.timing". Com TIMING_PROFILE_SAMPLE > 0, essa fração das requisições
+roda sob cProfile e o perfil é salvo quando o total passa de TIMING_PROFILE_THRESHOLD_MS.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+import cProfile, json, os, random, re, tempfile, threading, time, logging
+
+logger = logging.getLogger("nutrinow.timing")
+
+LOG_ENABLED = os.getenv("TIMING_LOG_ENABLED", "1") == "1"
+PROFILE_SAMPLE = float(os.getenv("TIMING_PROFILE_SAMPLE", 0))
+PROFILE_THRESHOLD = float(os.getenv("TIMING_PROFILE_THRESHOLD_MS", 2000)) / 1000
+PROFILE_DIR = os.getenv("TIMING_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "nutrinow_profiles"))
+
+# cProfile mede uma thread por vez: no máximo um perfil ativo por processo
+_profile_lock = threading.Lock()
+
+
+class RequestTiming:
+    __slots__ = ("started", "phases", "counts", "profiler")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.counts = {}
+        self.profiler = None
+
+    def add(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def server_timing(self, total: float) -> str:
+        entries = [f'{name};dur={seconds * 1000:.1f};desc="{self.counts[name]}x"'
+                   for name, seconds in self.phases.items()]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current: ContextVar[Optional[RequestTiming]] = ContextVar("nutrinow_request_timing", default=None)
+
+
+@contextmanager
+def phase(name: str):
+    """Soma a duração do bloco na fase `name` da requisição corrente"""
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - start)
+
+
+def add(name: str, seconds: float):
+    """Como phase(), para durações já medidas (ex.: callbacks do LLM)"""
+    timing = _current.get()
+    if timing is not None:
+        timing.add(name, seconds)
+
+
+def start_request(profile: bool = True):
+    """Abre o acumulador da requisição; devolve o token para finish_request"""
+    timing = RequestTiming()
+    if profile and PROFILE_SAMPLE > 0 and random.random() < PROFILE_SAMPLE and _profile_lock.acquire(blocking=False):
+        timing.profiler = cProfile.Profile()
+        timing.profiler.enable()
+    return _current.set(timing)
+
+
+def finish_request(token, route: str, method: str, status: int) -> Optional[str]:
+    """Fecha o acumulador: registra a linha de log, salva o perfil lento e devolve o Server-Timing"""
+    timing = _current.get()
+    try:
+        _current.reset(token)
+    except ValueError:  # token de outro contexto (hook rodou fora da requisição)
+        _current.set(None)
+    if timing is None:
+        return None
+    total = time.perf_counter() - timing.started
+
+    if timing.profiler is not None:
+        timing.profiler.disable()
+        try:
+            if total >= PROFILE_THRESHOLD:
+                _dump_profile(timing.profiler, route, method, total)
+        finally:
+            _profile_lock.release()
+
+    if LOG_ENABLED:
+        logger.info(json.dumps({
+            "route": route,
+            "method": method,
+            "status": status,
+            "total_ms": round(total * 1000, 1),
+            "phases_ms": {name: round(seconds * 1000, 1) for name, seconds in timing.phases.items()},
+            "phase_counts": timing.counts,
+        }))
+    return timing.server_timing(total)
+
+
+def _dump_profile(profiler: cProfile.Profile, route: str, method: str, total: float):
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        path = os.path.join(PROFILE_DIR, f"{datetime.now():%Y%m%d_%H%M%S_%f}_{method}_{slug}_{total * 1000:.0f}ms.prof")
+        profiler.dump_stats(path)
+        logger.warning(f"Requisição lenta {method} {route} ({total * 1000:.0f} ms): perfil salvo em {path}")
+    except OSError as e:
+        logger.error(f"Falha ao salvar perfil da requisição: {e}")
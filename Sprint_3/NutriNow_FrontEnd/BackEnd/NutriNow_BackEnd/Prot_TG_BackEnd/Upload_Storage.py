@@ -0,0 +1,160 @@
+# upload_storage.py
+"""Armazenamento dos uploads endereçado por conteúdo.
+
+Cada arquivo é copiado em blocos de UPLOAD_CHUNK_BYTES enquanto o SHA-256 é calculado
+e fica uma única vez em UPLOAD_ROOT/ab/cd/<sha256><ext> (dois níveis de shard pelos
+primeiros bytes do hash). Até UPLOAD_SPOOL_BYTES o conteúdo fica em memória: uma foto
+repetida que cabe nesse limite não escreve nada em disco. Acima disso vai para um
+arquivo temporário em UPLOAD_ROOT/tmp, renomeado atomicamente para o destino final.
+O tamanho máximo (UPLOAD_MAX_BYTES) é verificado a cada bloco, sem ler o resto.
+"""
+from typing import BinaryIO, Optional
+import hashlib, os, tempfile, threading, logging
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_UPLOAD_ROOT = os.path.join(BASE_DIR, "uploads")
+# Folga do multipart (cabeçalhos e demais campos) no limite do corpo da requisição
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+# Assinaturas dos formatos aceitos pelo FoodAnalyser: o mesmo conteúdo ganha sempre a mesma extensão
+_SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+    (b"BM", ".bmp"),
+)
+
+
+def size_limit_message(max_bytes: int) -> str:
+    return f"Arquivo maior que o limite de {max_bytes / (1024 * 1024):.1f} MB"
+
+
+class UploadTooLarge(Exception):
+    """Upload acima de UPLOAD_MAX_BYTES; a rota responde 413"""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(size_limit_message(max_bytes))
+        self.max_bytes = max_bytes
+
+
+def sniff_extension(head: bytes, filename: str = "") -> str:
+    """Extensão pelo conteúdo; sem assinatura conhecida, a do nome do arquivo"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    for signature, ext in _SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    return os.path.splitext(filename or "")[1].lower()
+
+
+class UploadStorage:
+    def __init__(self, root: str = DEFAULT_UPLOAD_ROOT, max_bytes: int = 10 * 1024 * 1024,
+                 chunk_size: int = 64 * 1024, spool_bytes: int = 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.spool_bytes = spool_bytes
+        self._tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self._tmp_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._stored = 0
+        self._deduplicated = 0
+        self._rejected = 0
+        self._bytes_written = 0
+        self._bytes_deduplicated = 0
+
+    def path_for(self, content_hash: str, ext: str = "") -> str:
+        return os.path.join(self.root, content_hash[:2], content_hash[2:4], content_hash + ext)
+
+    def save_stream(self, stream: BinaryIO, filename: str = "") -> dict:
+        """Copia `stream` para o armazenamento; {"content_hash", "path", "size", "created"}"""
+        digest = hashlib.sha256()
+        buffer, head, size, temp, temp_path = [], b"", 0, None, None
+        try:
+            while True:
+                chunk = stream.read(self.chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > self.max_bytes:
+                    with self._lock:
+                        self._rejected += 1
+                    raise UploadTooLarge(self.max_bytes)
+                digest.update(chunk)
+                head = head or chunk[:16]
+                if temp is None:
+                    buffer.append(chunk)
+                    if size > self.spool_bytes:
+                        temp, temp_path = self._open_temp()
+                        temp.writelines(buffer)
+                        buffer = []
+                else:
+                    temp.write(chunk)
+
+            content_hash = digest.hexdigest()
+            path = self.path_for(content_hash, sniff_extension(head, filename))
+            if os.path.exists(path):
+                with self._lock:
+                    self._deduplicated += 1
+                    self._bytes_deduplicated += size
+                return {"content_hash": content_hash, "path": path, "size": size, "created": False}
+
+            if temp is None:
+                temp, temp_path = self._open_temp()
+                temp.writelines(buffer)
+            temp.close()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Dois uploads simultâneos do mesmo conteúdo: o segundo rename só troca bytes idênticos
+            os.replace(temp_path, path)
+            temp_path = None
+            with self._lock:
+                self._stored += 1
+                self._bytes_written += size
+            return {"content_hash": content_hash, "path": path, "size": size, "created": True}
+        finally:
+            if temp is not None and not temp.closed:
+                temp.close()
+            if temp_path is not None:
+                try:
+                    os.unlink(temp_path)
+                except OSError as e:
+                    logger.warning(f"Falha ao remover temporário de upload {temp_path}: {e}")
+
+    def _open_temp(self) -> tuple:
+        fd, path = tempfile.mkstemp(dir=self._tmp_dir, suffix=".part")
+        return os.fdopen(fd, "wb"), path
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "root": self.root,
+                "max_bytes": self.max_bytes,
+                "stored": self._stored,
+                "deduplicated": self._deduplicated,
+                "rejected_too_large": self._rejected,
+                "bytes_written": self._bytes_written,
+                "bytes_deduplicated": self._bytes_deduplicated,
+            }
+
+
+# ----------------- Instância do processo -----------------
+_storage: Optional[UploadStorage] = None
+_storage_lock = threading.Lock()
+
+
+def get_upload_storage() -> UploadStorage:
+    """Armazenamento compartilhado do processo (App.py e Asgi.py)"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = UploadStorage(
+                    root=os.getenv("UPLOAD_ROOT", DEFAULT_UPLOAD_ROOT),
+                    max_bytes=int(os.getenv("UPLOAD_MAX_BYTES", 10 * 1024 * 1024)),
+                    chunk_size=int(os.getenv("UPLOAD_CHUNK_BYTES", 64 * 1024)),
+                    spool_bytes=int(os.getenv("UPLOAD_SPOOL_BYTES", 1024 * 1024)),
+                )
+    return _storage
@@ -0,0 +1,93 @@
+# _fakes.py
+"""Dublês locais usados pelos benchmarks (sem MySQL e sem a API do Gemini)."""
+import os, sys, time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def install():
+    """Coloca Prot_TG_BackEnd/ no sys.path e usa o LLM fake (NUTRINOW_LLM_PROVIDER=fake).
+
+    Roda no import deste módulo; quem importa _fakes só por esse efeito chama install()
+    explicitamente antes de importar os módulos do backend. Pode ser chamada mais de uma vez.
+    """
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault("NUTRINOW_LLM_PROVIDER", "fake")
+
+
+install()
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+
+class InMemoryHistory:
+    """Mesma interface do MySQLChatHistory usada pelas memórias, sem banco"""
+
+    def __init__(self, messages=None, summary: str = "", last_message_id=None, **kwargs):
+        # (id, mensagem) com ids como os do AUTO_INCREMENT
+        self.rows = [(i + 1, message) for i, message in enumerate(messages or [])]
+        self.summary = summary
+        self.last_message_id = last_message_id
+        self.fail_writes = 0  # próximas gravações que falham, como um INSERT perdido
+        self._next_id = len(self.rows)
+
+    @property
+    def messages(self):
+        return [message for _, message in self.rows]
+
+    def get_messages(self, by_user=False):
+        return self.messages
+
+    def get_messages_after(self, after_id):
+        return [(message_id, message) for message_id, message in self.rows if message_id > (after_id or 0)]
+
+    def get_summary(self):
+        return self.summary, self.last_message_id
+
+    def save_summary(self, summary, last_message_id):
+        self.summary = summary
+        self.last_message_id = last_message_id
+
+    def add_message(self, message, on_saved=None):
+        # O AUTO_INCREMENT avança mesmo quando o INSERT falha
+        self._next_id += 1
+        if self.fail_writes:
+            self.fail_writes -= 1
+            return
+        self.rows.append((self._next_id, message))
+        if on_saved is not None:
+            on_saved(self._next_id)
+
+    def clear(self):
+        self.rows = []
+        self.summary, self.last_message_id = "", None
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class TokenLatencyFakeModel(FakeListChatModel):
+    """FakeListChatModel que leva `sleep` segundos por caractere tanto no stream quanto no invoke"""
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs):
+        response = self.responses[self.i]
+        if self.sleep is not None:
+            time.sleep(self.sleep * max(len(response) - 1, 0))
+        return super()._call(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+def make_agent(llm, session_id: str = "bench", monkeypatch=None):
+    """NutritionistAgent com histórico em memória e o modelo fake no lugar do Gemini.
+
+    Nos testes passe o `monkeypatch` do pytest: as trocas no módulo Nutri são desfeitas ao
+    fim de cada teste. Sem ele (scripts de benchmark, um processo por execução) ficam valendo.
+    """
+    import Nutri
+    patch = monkeypatch.setattr if monkeypatch is not None else setattr
+    patch(Nutri, "MySQLChatHistory", InMemoryHistory)
+    patch(Nutri, "get_chat_model", lambda *args, **kwargs: llm)
+    return Nutri.NutritionistAgent(session_id=session_id, memory_mode="buffer")
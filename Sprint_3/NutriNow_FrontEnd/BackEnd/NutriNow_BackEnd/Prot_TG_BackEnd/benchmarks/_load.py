@@ -0,0 +1,107 @@
+# _load.py
+"""Peças compartilhadas pelos testes de carga: sobe o backend em um subprocesso,
+gera o cookie de sessão e calcula percentis.
+"""
+import os, secrets, socket, subprocess, sys, time, urllib.error, urllib.request
+
+from flask import Flask
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Comandos de cada modo de execução (porta vem de {port})
+SERVERS = {
+    # Como o App.py roda hoje: servidor do Werkzeug, uma thread por requisição
+    "sync": [sys.executable, "-c",
+             "from App import app; app.run(host='127.0.0.1', port={port}, threaded=True)"],
+    # Asgi.py: views assíncronas para /chat e /analyze_image, Flask para o resto
+    "async": [sys.executable, "-m", "hypercorn", "Asgi:application", "--bind", "127.0.0.1:{port}",
+              "--workers", "0", "--backlog", "2048"],  # no próprio processo, para medir threads/RSS
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def session_cookie(secret_key: str, user_id: int = 1, email: str = "carga@nutrinow.local") -> str:
+    """Cookie "session" assinado como o /login faria (dispensa usuário no banco)"""
+    app = Flask("load")
+    app.secret_key = secret_key
+    serializer = app.session_interface.get_signing_serializer(app)
+    return serializer.dumps({"user_id": user_id, "user_name": "Carga", "user_email": email})
+
+
+class Server:
+    """Backend em subprocesso com o LLM fake; use com `with`"""
+
+    def __init__(self, mode: str, env: dict = None, log_path: str = os.devnull):
+        self.mode = mode
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.secret_key = secrets.token_hex(16)
+        self.env = dict(os.environ)
+        self.env.update({
+            "NUTRINOW_LLM_PROVIDER": "fake",
+            "NUTRINOW_AUTO_MIGRATE": "0",
+            "FLASK_SECRET_KEY": self.secret_key,
+            "PYTHONUNBUFFERED": "1",
+        })
+        self.env.update(env or {})
+        self.log_path = log_path
+        self.process = None
+
+    def __enter__(self):
+        command = [part.format(port=self.port) for part in SERVERS[self.mode]]
+        self._log = open(self.log_path, "w")
+        self.process = subprocess.Popen(command, cwd=BACKEND_DIR, env=self.env, stdout=self._log, stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Servidor {self.mode} terminou na inicialização (log em {self.log_path})")
+            try:
+                with urllib.request.urlopen(f"{self.base_url}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return self
+            except (urllib.error.URLError, OSError):
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"Servidor {self.mode} não respondeu em 60 s")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self._log.close()
+
+    def threads(self) -> int:
+        """Threads do processo do servidor (Linux; 0 onde /proc não existe)"""
+        try:
+            with open(f"/proc/{self.process.pid}/status") as f:
+                for line in f:
+                    if line.startswith("Threads:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return 0
+
+    def rss_mb(self) -> float:
+        try:
+            with open(f"/proc/{self.process.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        return 0.0
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
@@ -0,0 +1,103 @@
+# bench_asgi_vs_wsgi.py
+"""Teste de carga do /chat: modo síncrono (App.py no Werkzeug) contra o modo ASGI (Asgi.py no Hypercorn).
+
+Uso (a partir de Prot_TG_BackEnd/):
+    pip install -r benchmarks/requirements.txt   # aiohttp, cliente da carga
+    python benchmarks/bench_asgi_vs_wsgi.py [--users 500] [--duration 30] [--latency-ms 800] [--token-ms 10]
+
+Cada usuário virtual tem sua própria sessão (X-Session-ID) e envia mensagens em sequência
+durante `duration` segundos. O LLM é o fake do Fake_LLM (NUTRINOW_LLM_PROVIDER=fake).
+Sem MySQL acessível o histórico não é gravado (os erros vão para o log do servidor), o que
+vale igualmente para os dois modos.
+"""
+import argparse, asyncio, os, tempfile, time
+
+import aiohttp
+from _load import Server, percentile, session_cookie
+
+
+async def run_load(server: Server, users: int, duration: float) -> dict:
+    cookie = session_cookie(server.secret_key)
+    latencies, errors = [], 0
+    peak_threads = 0
+    connector = aiohttp.TCPConnector(limit=users)
+    timeout = aiohttp.ClientTimeout(total=120)
+
+    async with aiohttp.ClientSession(base_url=server.base_url, connector=connector, timeout=timeout,
+                                     cookies={"session": cookie}) as client:
+        deadline = time.monotonic() + duration
+
+        async def user(index: int):
+            nonlocal errors
+            turn = 0
+            while time.monotonic() < deadline:
+                turn += 1
+                start = time.perf_counter()
+                try:
+                    async with client.post(
+                        "/chat", json={"message": f"Sugira um lanche proteico ({turn})"},
+                        headers={"X-Session-ID": f"load-{index}"},
+                    ) as response:
+                        await response.read()
+                        ok = response.status == 200
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        async def sample_threads():
+            nonlocal peak_threads
+            while time.monotonic() < deadline:
+                peak_threads = max(peak_threads, server.threads())
+                await asyncio.sleep(0.5)
+
+        start = time.monotonic()
+        await asyncio.gather(sample_threads(), *(user(i) for i in range(users)))
+        elapsed = time.monotonic() - start
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "peak_threads": peak_threads,
+        "rss_mb": server.rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--latency-ms", type=float, default=800)
+    parser.add_argument("--token-ms", type=float, default=10)
+    parser.add_argument("--modes", default="sync,async")
+    args = parser.parse_args()
+
+    env = {
+        "NUTRINOW_FAKE_LATENCY_MS": str(args.latency_ms),
+        "NUTRINOW_FAKE_TOKEN_MS": str(args.token_ms),
+        # Um agente por usuário virtual, sem despejos durante o teste
+        "AGENT_CACHE_MAX_ENTRIES": str(args.users * 2),
+        "ANALYSIS_CACHE_ENABLED": "0",
+        # Todos os usuários virtuais usam o mesmo user_id: sem limite por usuário/admissão
+        "ADMISSION_ENABLED": "0",
+    }
+    print(f"/chat, {args.users} usuários, {args.duration:.0f} s, LLM fake {args.latency_ms:.0f} ms + "
+          f"{args.token_ms:.0f} ms/token")
+    print(f"{'modo':>6} | {'reqs':>6} | {'erros':>5} | {'req/s':>7} | {'p50 (ms)':>8} | {'p99 (ms)':>8} | "
+          f"{'threads':>7} | {'RSS (MB)':>8}")
+    for mode in args.modes.split(","):
+        log_path = os.path.join(tempfile.gettempdir(), f"nutrinow_load_{mode}.log")
+        with Server(mode, env=env, log_path=log_path) as server:
+            result = asyncio.run(run_load(server, args.users, args.duration))
+        print(f"{mode:>6} | {result['requests']:>6} | {result['errors']:>5} | {result['rps']:>7.1f} | "
+              f"{result['p50_ms']:>8.0f} | {result['p99_ms']:>8.0f} | {result['peak_threads']:>7} | "
+              f"{result['rss_mb']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
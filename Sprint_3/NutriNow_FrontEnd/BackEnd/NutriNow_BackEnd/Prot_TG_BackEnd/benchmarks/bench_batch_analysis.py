@@ -0,0 +1,65 @@
+# bench_batch_analysis.py
+"""Vazão do BatchFoodAnalyser em diferentes níveis de concorrência, com um modelo fake.
+
+Uso (a partir de Prot_TG_BackEnd/):  python benchmarks/bench_batch_analysis.py [--images 40] [--latency 0.2] [--rpm 0]
+Cada chamada ao modelo leva `latency` segundos; com --rpm > 0 o token bucket limita as chamadas.
+Não usa MySQL, a API do Gemini nem o cache de análises.
+"""
+import argparse, contextlib, io, os, tempfile, time
+
+import _fakes
+_fakes.install()
+os.environ["ANALYSIS_CACHE_ENABLED"] = "0"
+
+from PIL import Image
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from Food_Analyser import BatchFoodAnalyser, get_food_analyser
+from Rate_Limiter import TokenBucket
+
+RESPONSE = "| Nutriente | Quantidade | % VD* |\n|---|---|---|\n| Calorias | 520 kcal | 26% |\n| Proteínas | 32 g | 64% |"
+LEVELS = [1, 2, 4, 8, 16]
+
+
+class LatencyFakeModel(FakeListChatModel):
+    """Responde sempre a mesma tabela depois de `latency` segundos"""
+    latency: float = 0.2
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return RESPONSE
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--rpm", type=float, default=0)
+    args = parser.parse_args()
+
+    analyser = get_food_analyser()
+    analyser._llm = LatencyFakeModel(responses=[RESPONSE], latency=args.latency)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(args.images):
+            path = os.path.join(tmp, f"prato_{i}.jpg")
+            Image.new("RGB", (640, 480), ((i * 37) % 256, (i * 91) % 256, 120)).save(path)
+            paths.append(path)
+
+        print(f"{args.images} imagens, {args.latency * 1000:.0f} ms por chamada, rpm={args.rpm or 'sem limite'}")
+        print(f"{'workers':>7} | {'tempo (s)':>9} | {'imagens/s':>9} | falhas")
+        for workers in LEVELS:
+            analyser._limiter = TokenBucket(args.rpm / 60.0) if args.rpm > 0 else None
+            batch = BatchFoodAnalyser(max_workers=workers)
+            # O _call_model ainda imprime diagnóstico a cada chamada; fica fora da saída do benchmark
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                results = batch.analyze_multiple_images(paths)
+                elapsed = time.perf_counter() - start
+            assert [r["path"] for r in results] == paths
+            failures = sum(1 for r in results if not r["ok"])
+            print(f"{workers:>7} | {elapsed:>9.2f} | {len(paths) / elapsed:>9.1f} | {failures}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# bench_chat_stream.py
+"""Tempo até o primeiro byte: /chat bloqueante (run_text) x streaming (stream_text).
+
+Uso (a partir de Prot_TG_BackEnd/):  python benchmarks/bench_chat_stream.py
+O modelo fake emite um caractere a cada 2 ms, como um stream de tokens do Gemini.
+"""
+import json, time
+
+from _fakes import TokenLatencyFakeModel, make_agent
+
+ANSWER = "Para hipertrofia, distribua 1,6 a 2,2 g de proteína por kg ao longo do dia. " * 4
+ROUNDS = 5
+
+
+def blocking_ttfb() -> float:
+    final = json.dumps({"action": "Final Answer", "action_input": ANSWER}, ensure_ascii=False)
+    agent = make_agent(TokenLatencyFakeModel(responses=[final], sleep=0.002))
+    start = time.perf_counter()
+    output = agent.run_text("Quanto de proteína devo comer?")
+    assert output == ANSWER, output
+    return time.perf_counter() - start
+
+
+def stream_ttfb() -> tuple:
+    agent = make_agent(TokenLatencyFakeModel(responses=[ANSWER], sleep=0.002))
+    start = time.perf_counter()
+    first = None
+    parts = []
+    for token in agent.stream_text("Quanto de proteína devo comer?"):
+        if first is None:
+            first = time.perf_counter() - start
+        parts.append(token)
+    total = time.perf_counter() - start
+    assert "".join(parts) == ANSWER
+    # A resposta completa foi persistida na memória ao final do stream
+    assert agent.memory.chat_memory.messages[-1].content == ANSWER
+    return first, total
+
+
+if __name__ == "__main__":
+    blocking = [blocking_ttfb() for _ in range(ROUNDS)]
+    streamed = [stream_ttfb() for _ in range(ROUNDS)]
+    print(f"bloqueante  TTFB médio: {sum(blocking) / ROUNDS * 1000:8.1f} ms")
+    print(f"streaming   TTFB médio: {sum(s[0] for s in streamed) / ROUNDS * 1000:8.1f} ms"
+          f"  (total {sum(s[1] for s in streamed) / ROUNDS * 1000:.1f} ms)")
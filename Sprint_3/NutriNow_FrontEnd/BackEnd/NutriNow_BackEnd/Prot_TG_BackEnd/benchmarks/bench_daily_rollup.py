@@ -0,0 +1,155 @@
+# bench_daily_rollup.py
+"""Resumo dia/semana/mês: agregação na hora sobre meal_analyses contra leitura do rollup daily_nutrition.
+
+Uso (a partir de Prot_TG_BackEnd/):
+    python benchmarks/bench_daily_rollup.py [--meals 1000000] [--users 2000] [--queries 2000]
+
+Sem MySQL no ambiente de benchmark, as duas tabelas são recriadas em SQLite (arquivo temporário)
+com os mesmos índices do Schema.py: (user_id, meal_at) em meal_analyses e PK (user_id, day) no
+rollup. As consultas são as mesmas de Meals.py, traduzidas para o dialeto do SQLite.
+"""
+import argparse, os, random, sqlite3, statistics, tempfile, time
+from datetime import date, datetime, timedelta
+
+import _fakes
+_fakes.install()
+from Meals import NUTRIENT_FIELDS
+
+COLUMNS = list(NUTRIENT_FIELDS)
+END = date(2026, 10, 15)
+DAYS = 365
+
+ON_THE_FLY_SQL = f"""
+    SELECT substr(meal_at, 1, 10) AS day, COUNT(*), {", ".join(f"COALESCE(SUM({c}), 0)" for c in COLUMNS)}
+    FROM meal_analyses
+    WHERE user_id = ? AND meal_at >= ? AND meal_at < ?
+    GROUP BY day
+"""
+ROLLUP_SQL = f"""
+    SELECT day, meals, {", ".join(COLUMNS)}
+    FROM daily_nutrition
+    WHERE user_id = ? AND day BETWEEN ? AND ?
+"""
+MEAL_INSERT_SQL = f"""
+    INSERT INTO meal_analyses (user_id, meal_at, {", ".join(COLUMNS)})
+    VALUES (?, ?, {", ".join("?" * len(COLUMNS))})
+"""
+ROLLUP_UPSERT_SQL = f"""
+    INSERT INTO daily_nutrition (user_id, day, meals, {", ".join(COLUMNS)})
+    VALUES (?, ?, 1, {", ".join("?" * len(COLUMNS))})
+    ON CONFLICT (user_id, day) DO UPDATE SET
+        meals = meals + 1,
+        {", ".join(f"{c} = {c} + excluded.{c}" for c in COLUMNS)}
+"""
+
+
+def create_tables(db):
+    db.executescript(f"""
+        CREATE TABLE meal_analyses (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            meal_at TEXT NOT NULL,
+            {", ".join(f"{c} REAL" for c in COLUMNS)}
+        );
+        CREATE INDEX idx_meal_user_time ON meal_analyses (user_id, meal_at);
+        CREATE TABLE daily_nutrition (
+            user_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            meals INTEGER NOT NULL DEFAULT 0,
+            {", ".join(f"{c} REAL NOT NULL DEFAULT 0" for c in COLUMNS)},
+            PRIMARY KEY (user_id, day)
+        ) WITHOUT ROWID;
+    """)
+
+
+def random_meal(rng: random.Random, users: int) -> tuple:
+    moment = datetime.combine(END - timedelta(days=rng.randrange(DAYS)), datetime.min.time())
+    moment += timedelta(minutes=rng.randrange(6 * 60, 23 * 60))
+    return (rng.randrange(1, users + 1), moment.strftime("%Y-%m-%d %H:%M:%S"),
+            rng.uniform(150, 900), rng.uniform(10, 90), rng.uniform(5, 50), rng.uniform(3, 40),
+            rng.uniform(1, 15), rng.uniform(0, 12), rng.uniform(50, 1500))
+
+
+def populate(db, meals: int, users: int):
+    rng = random.Random(42)
+    chunk = 50_000
+    for offset in range(0, meals, chunk):
+        db.executemany(MEAL_INSERT_SQL, [random_meal(rng, users) for _ in range(min(chunk, meals - offset))])
+    # Mesmo SQL do `python Meals.py --rebuild`
+    db.execute(f"""
+        INSERT INTO daily_nutrition (user_id, day, meals, {", ".join(COLUMNS)})
+        SELECT user_id, substr(meal_at, 1, 10), COUNT(*), {", ".join(f"COALESCE(SUM({c}), 0)" for c in COLUMNS)}
+        FROM meal_analyses GROUP BY user_id, substr(meal_at, 1, 10)
+    """)
+    db.commit()
+
+
+def summary_window(day: date) -> tuple:
+    """Mesma janela de Meals.nutrition_summary: do início da semana ou do mês, o que vier antes"""
+    start = min(day - timedelta(days=day.weekday()), day.replace(day=1))
+    return start, day
+
+
+def time_queries(db, sql: str, params: list) -> list:
+    timings = []
+    for user_id, start, end in params:
+        t0 = time.perf_counter()
+        db.execute(sql, (user_id, start, end)).fetchall()
+        timings.append(time.perf_counter() - t0)
+    return timings
+
+
+def time_writes(db, rows: list, with_rollup: bool) -> float:
+    t0 = time.perf_counter()
+    for row in rows:
+        db.execute(MEAL_INSERT_SQL, row)
+        if with_rollup:
+            db.execute(ROLLUP_UPSERT_SQL, (row[0], row[1][:10], *row[2:]))
+        db.commit()
+    return (time.perf_counter() - t0) / len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--meals", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--writes", type=int, default=2000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "rollup.db")
+    db = sqlite3.connect(path)
+    create_tables(db)
+    t0 = time.perf_counter()
+    populate(db, args.meals, args.users)
+    rollup_rows = db.execute("SELECT COUNT(*) FROM daily_nutrition").fetchone()[0]
+    print(f"{args.meals} refeições, {args.users} usuários, {DAYS} dias -> {rollup_rows} linhas no rollup "
+          f"(carga + rebuild em {time.perf_counter() - t0:.1f} s)")
+
+    rng = random.Random(7)
+    params = []
+    for _ in range(args.queries):
+        start, end = summary_window(END - timedelta(days=rng.randrange(DAYS)))
+        params.append((rng.randrange(1, args.users + 1), start, end))
+    on_the_fly = time_queries(db, ON_THE_FLY_SQL, [
+        (u, s.isoformat(), (e + timedelta(days=1)).isoformat()) for u, s, e in params
+    ])
+    rollup = time_queries(db, ROLLUP_SQL, [(u, s.isoformat(), e.isoformat()) for u, s, e in params])
+
+    print(f"\n{'consulta do resumo':>20} | {'média (µs)':>10} | {'p99 (µs)':>9}")
+    for label, timings in (("agregação na hora", on_the_fly), ("rollup diário", rollup)):
+        p99 = sorted(timings)[int(len(timings) * 0.99) - 1]
+        print(f"{label:>20} | {statistics.mean(timings) * 1e6:>10.1f} | {p99 * 1e6:>9.1f}")
+
+    # Custo do lado da escrita: um INSERT por análise contra INSERT + upsert no rollup
+    rows = [random_meal(rng, args.users) for _ in range(args.writes * 2)]
+    plain = time_writes(db, rows[:args.writes], with_rollup=False)
+    incremental = time_writes(db, rows[args.writes:], with_rollup=True)
+    print(f"\ngravação por análise: {plain * 1e6:.1f} µs sem rollup, {incremental * 1e6:.1f} µs com upsert no rollup")
+
+    db.close()
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
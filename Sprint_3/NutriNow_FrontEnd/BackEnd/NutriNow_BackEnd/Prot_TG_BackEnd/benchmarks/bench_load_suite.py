@@ -0,0 +1,449 @@
+# bench_load_suite.py
+"""Suíte de carga da API: usuários virtuais com um mix realista de rotas contra o MySQL local
+e o LLM fake (latência configurável) ou os cassetes gravados do Gemini (--provider replay).
+Gera um JSON por execução para comparar commits.
+
+Uso (a partir de Prot_TG_BackEnd/):
+    pip install -r benchmarks/requirements.txt   # aiohttp, cliente da carga
+    # MySQL descartável (ou um servidor local; as variáveis MYSQL_* do ambiente valem para os dois lados)
+    docker run -d --name nutrinow-carga -p 3306:3306 -e MYSQL_ROOT_PASSWORD=carga -e MYSQL_DATABASE=nutrinow_carga mysql:8
+    MYSQL_PASSWORD=carga MYSQL_DATABASE=nutrinow_carga \\
+        python benchmarks/bench_load_suite.py [--mode sync|async] [--mix padrao] [--users 50] [--duration 60] \\
+            [--latency-ms 800] [--token-ms 10] [--output carga.json]
+    # Diferenças entre duas execuções (ex.: antes/depois de um commit)
+    python benchmarks/bench_load_suite.py --compare base.json carga.json
+
+Cada usuário virtual é um usuário próprio no banco (criado via /cadastro na primeira execução):
+faz /login e depois escolhe as ações pelo peso do mix, com pausa exponencial entre elas
+(--think-ms). A entrada dos usuários é escalonada em --ramp segundos e só as requisições
+iniciadas depois de --warmup segundos entram no relatório. Com a mesma --seed, a sequência
+de ações de cada usuário se repete entre execuções. Durante o teste /health é lido a cada
+segundo (pool de conexões do backend), junto com Threads_connected do MySQL e o RSS do processo.
+"""
+import argparse, asyncio, json, os, platform, random, subprocess, sys, tempfile, time
+from collections import Counter
+from datetime import datetime
+from io import BytesIO
+
+import aiohttp
+import mysql.connector
+from PIL import Image, ImageDraw
+from _load import BACKEND_DIR, Server, percentile, session_cookie
+
+sys.path.insert(0, BACKEND_DIR)
+from Database import mysql_config_from_env  # noqa: E402
+
+# Ação -> (método, rota); o relatório agrupa por "MÉTODO /rota"
+ACTIONS = {
+    "login": ("POST", "/login"),
+    "chat": ("POST", "/chat"),
+    "chat_history": ("GET", "/chat_history"),
+    "analyze_image": ("POST", "/analyze_image"),
+    "perfil_get": ("GET", "/perfil"),
+    "perfil_post": ("POST", "/perfil"),
+    "dieta_get": ("GET", "/dieta-treino"),
+    "dieta_post": ("POST", "/dieta-treino"),
+}
+
+# Pesos relativos de cada ação depois do login
+MIXES = {
+    # Uso típico do app: conversa, consulta do histórico e das abas, uma foto de vez em quando
+    "padrao": {"chat": 35, "chat_history": 20, "dieta_get": 15, "perfil_get": 12, "analyze_image": 8,
+               "dieta_post": 5, "perfil_post": 3, "login": 2},
+    "chat": {"chat": 70, "chat_history": 20, "perfil_get": 5, "dieta_get": 5},
+    "imagem": {"analyze_image": 50, "chat": 20, "chat_history": 15, "dieta_get": 15},
+    # Só rotas de banco: isola o pool de conexões do LLM
+    "crud": {"dieta_get": 35, "perfil_get": 30, "dieta_post": 15, "perfil_post": 10, "chat_history": 10},
+}
+
+CHAT_MESSAGES = [
+    "Oi, tudo bem?",
+    "Monte um café da manhã com 30 g de proteína",
+    "Quantas calorias tem uma tapioca com queijo?",
+    "Sugira um lanche pré-treino rápido",
+    "Qual a diferença entre whey concentrado e isolado?",
+    "Me passe um treino de pernas para iniciantes",
+    "E para o jantar?",
+    "Troque o frango por peixe",
+    "Quanto de água devo beber por dia?",
+    "Qual o melhor horário para tomar creatina?",
+]
+DIETA_TITLES = ["Café da manhã", "Almoço", "Lanche da tarde", "Jantar", "Treino A", "Treino B", "Cardio"]
+PASSWORD = "Carga@2024"
+
+
+def make_images(rng: random.Random, count: int = 3) -> list:
+    """Fotos JPEG 640x480 sintéticas; repetidas entre pedidos do mesmo usuário, como no app"""
+    images = []
+    for _ in range(count):
+        image = Image.new("RGB", (640, 480), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(image)
+        for _ in range(6):
+            x, y = rng.randrange(560), rng.randrange(400)
+            draw.ellipse((x, y, x + 80, y + 80), fill=tuple(rng.randrange(256) for _ in range(3)))
+        buffer = BytesIO()
+        image.save(buffer, "JPEG", quality=85)
+        images.append(buffer.getvalue())
+    return images
+
+
+class RouteStats:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = 0  # falhas de conexão/timeout (sem status HTTP)
+
+    def record(self, status, seconds: float):
+        if status is None:
+            self.errors += 1
+            return
+        self.statuses[status] += 1
+        if status < 400:
+            self.latencies.append(seconds)
+
+    def report(self, elapsed: float) -> dict:
+        total = sum(self.statuses.values()) + self.errors
+        ok = len(self.latencies)
+        return {
+            "requests": total,
+            "ok": ok,
+            "errors": total - ok,
+            "status_counts": {str(status): count for status, count in sorted(self.statuses.items())},
+            "rps": round(ok / elapsed, 2),
+            "p50_ms": round(percentile(self.latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(self.latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(self.latencies, 99) * 1000, 1),
+            "max_ms": round(max(self.latencies, default=0) * 1000, 1),
+        }
+
+
+class VirtualUser:
+    def __init__(self, index: int, run_id: str, seed: int, client: aiohttp.ClientSession, suite: "LoadSuite"):
+        self.index = index
+        self.rng = random.Random(seed * 100003 + index)
+        self.client = client
+        self.suite = suite
+        self.email = f"carga{index}.{run_id}@nutrinow.local"
+        self.session_id = f"carga-{run_id}-{index}"
+        self.images = make_images(self.rng)
+        self.actions, self.weights = zip(*suite.mix.items())
+
+    async def request(self, action: str, **kwargs):
+        method, route = ACTIONS[action]
+        start = time.perf_counter()
+        status = None
+        try:
+            async with self.client.request(method, route, **kwargs) as response:
+                await response.read()
+                status = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            pass
+        if start >= self.suite.measure_from:
+            self.suite.stats.setdefault(f"{method} {route}", RouteStats()).record(status, time.perf_counter() - start)
+        return status
+
+    async def sign_up(self) -> bool:
+        """Cria o usuário (409 = já existe de uma execução anterior com o mesmo run_id)"""
+        async with self.client.post("/cadastro", json={
+            "nome": "Carga", "sobrenome": str(self.index), "data_nascimento": "1995-05-20",
+            "genero": "Prefiro não informar", "email": self.email, "senha": PASSWORD,
+        }) as response:
+            await response.read()
+            return response.status in (201, 409)
+
+    async def login(self):
+        return await self.request("login", json={"email": self.email, "senha": PASSWORD})
+
+    async def run(self, deadline: float):
+        if self.suite.signed_cookies:
+            self.client.cookie_jar.update_cookies({"session": session_cookie(
+                self.suite.server.secret_key, user_id=self.index + 1, email=self.email)})
+        elif await self.login() != 200:
+            self.suite.failed_logins += 1
+            return
+        while time.monotonic() < deadline:
+            action = self.rng.choices(self.actions, self.weights)[0]
+            await getattr(self, f"do_{action}")()
+            await asyncio.sleep(self.rng.expovariate(1000 / self.suite.think_ms) if self.suite.think_ms else 0)
+
+    # ----------------- Ações -----------------
+    async def do_login(self):
+        if not self.suite.signed_cookies:
+            await self.login()
+
+    async def do_chat(self):
+        await self.request("chat", json={"message": self.rng.choice(CHAT_MESSAGES)},
+                           headers={"X-Session-ID": self.session_id})
+
+    async def do_chat_history(self):
+        await self.request("chat_history", params={"session_id": self.session_id, "limit": 50})
+
+    async def do_analyze_image(self):
+        form = aiohttp.FormData()
+        form.add_field("file", self.rng.choice(self.images), filename="refeicao.jpg", content_type="image/jpeg")
+        form.add_field("session_id", self.session_id)
+        await self.request("analyze_image", data=form, headers={"X-Session-ID": self.session_id})
+
+    async def do_perfil_get(self):
+        await self.request("perfil_get")
+
+    async def do_perfil_post(self):
+        await self.request("perfil_post", json={
+            "meta": self.rng.choice(["Emagrecer", "Ganhar massa", "Manter o peso"]),
+            "alturaPeso": f"1,{self.rng.randint(55, 90)} m / {self.rng.randint(50, 110)} kg",
+        })
+
+    async def do_dieta_get(self):
+        await self.request("dieta_get", params={"tipo": self.rng.choice(["dietas", "treinos"])})
+
+    async def do_dieta_post(self):
+        title = self.rng.choice(DIETA_TITLES)
+        await self.request("dieta_post", json={
+            "title": title, "description": f"{title} gerado pela suíte de carga",
+            "time": f"{self.rng.randint(6, 21):02d}:00", "tipo": "treinos" if title.startswith(("Treino", "Cardio")) else "dietas",
+        })
+
+
+class LoadSuite:
+    def __init__(self, server: Server, args):
+        self.server = server
+        self.mix = MIXES[args.mix]
+        self.users = args.users
+        self.duration = args.duration
+        self.warmup = args.warmup
+        self.ramp = args.ramp
+        self.think_ms = args.think_ms
+        self.seed = args.seed
+        self.run_id = args.run_id
+        self.signed_cookies = args.signed_cookies
+        self.stats = {}
+        self.failed_logins = 0
+        self.measure_from = float("inf")
+        self.samples = {"db_in_use": [], "db_created": [], "mysql_threads": [], "rss_mb": [], "threads": [],
+                        "llm_in_flight": []}
+        self.last_health = {}
+
+    async def run(self) -> dict:
+        connector = aiohttp.TCPConnector(limit=0)
+        timeout = aiohttp.ClientTimeout(total=120)
+        # Um cliente (e um cookie jar) por usuário; unsafe=True aceita cookies de 127.0.0.1
+        clients = [aiohttp.ClientSession(base_url=self.server.base_url, connector=connector, connector_owner=False,
+                                         timeout=timeout, cookie_jar=aiohttp.CookieJar(unsafe=True))
+                   for _ in range(self.users)]
+        try:
+            users = [VirtualUser(i, self.run_id, self.seed, client, self) for i, client in enumerate(clients)]
+            if not self.signed_cookies:
+                created = await asyncio.gather(*(user.sign_up() for user in users))
+                if not all(created):
+                    raise RuntimeError("Falha ao criar os usuários de carga via /cadastro (MySQL acessível?)")
+
+            start = time.monotonic()
+            self.measure_from = time.perf_counter() + self.warmup
+            deadline = start + self.warmup + self.duration
+
+            async def ramped(user: VirtualUser):
+                await asyncio.sleep(self.ramp * user.index / self.users)
+                await user.run(deadline)
+
+            monitor = asyncio.create_task(self.monitor(deadline))
+            await asyncio.gather(*(ramped(user) for user in users))
+            await monitor
+            elapsed = max(time.monotonic() - start - self.warmup, 1e-9)
+        finally:
+            for client in clients:
+                await client.close()
+            await connector.close()
+        return self.report(elapsed)
+
+    async def monitor(self, deadline: float):
+        loop = asyncio.get_running_loop()
+        async with aiohttp.ClientSession(base_url=self.server.base_url) as client:
+            while time.monotonic() < deadline:
+                try:
+                    async with client.get("/health") as response:
+                        self.last_health = await response.json()
+                    pool = self.last_health.get("db_pool") or {}
+                    self.samples["db_in_use"].append(pool.get("in_use", 0))
+                    self.samples["db_created"].append(pool.get("created", 0))
+                    admission = self.last_health.get("admission") or {}
+                    self.samples["llm_in_flight"].append(admission.get("in_flight", 0))
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                    pass
+                threads = await loop.run_in_executor(None, mysql_threads_connected)
+                if threads is not None:
+                    self.samples["mysql_threads"].append(threads)
+                self.samples["rss_mb"].append(self.server.rss_mb())
+                self.samples["threads"].append(self.server.threads())
+                await asyncio.sleep(1)
+
+    def report(self, elapsed: float) -> dict:
+        routes = {route: stats.report(elapsed) for route, stats in sorted(self.stats.items())}
+        latencies = [value for stats in self.stats.values() for value in stats.latencies]
+        requests = sum(route["requests"] for route in routes.values())
+        ok = len(latencies)
+        pool = self.last_health.get("db_pool") or {}
+        samples = self.samples
+        return {
+            "routes": routes,
+            "totals": {
+                "requests": requests,
+                "ok": ok,
+                "errors": requests - ok,
+                "rps": round(ok / elapsed, 2),
+                "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+                "failed_logins": self.failed_logins,
+                "measured_s": round(elapsed, 1),
+            },
+            "db": {
+                "pool_size": pool.get("size"),
+                "pool_in_use_max": max(samples["db_in_use"], default=None),
+                "pool_in_use_avg": _avg(samples["db_in_use"]),
+                "pool_created": pool.get("created"),
+                "pool_checkouts": pool.get("checkouts"),
+                "pool_checkout_timeouts": pool.get("checkout_timeouts"),
+                "pool_wait_ms_max": pool.get("wait_time_max_ms"),
+                "mysql_threads_connected_max": max(samples["mysql_threads"], default=None),
+            },
+            "process": {
+                "rss_mb_start": round(samples["rss_mb"][0], 1) if samples["rss_mb"] else None,
+                "rss_mb_max": round(max(samples["rss_mb"], default=0), 1),
+                "rss_mb_end": round(self.server.rss_mb(), 1),
+                "threads_max": max(samples["threads"], default=0),
+            },
+            "llm": {
+                "in_flight_max": max(samples["llm_in_flight"], default=None),
+                "admission": self.last_health.get("admission"),
+            },
+        }
+
+
+def _avg(values: list):
+    return round(sum(values) / len(values), 2) if values else None
+
+
+def mysql_threads_connected():
+    """Conexões abertas no servidor MySQL (todas as origens), ou None se inacessível"""
+    try:
+        conn = mysql.connector.connect(**dict(mysql_config_from_env(), connection_timeout=2))
+    except mysql.connector.Error:
+        return None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SHOW GLOBAL STATUS LIKE 'Threads_connected'")
+        row = cursor.fetchone()
+        return int(row[1]) - 1 if row else None  # sem a própria conexão de amostragem
+    finally:
+        conn.close()
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecido"
+
+
+# ----------------- Relatórios -----------------
+def print_report(result: dict):
+    print(f"{'rota':<22} | {'reqs':>6} | {'erros':>5} | {'req/s':>7} | {'p50 (ms)':>8} | {'p95 (ms)':>8} | {'p99 (ms)':>8}")
+    for route, row in list(result["routes"].items()) + [("total", result["totals"])]:
+        print(f"{route:<22} | {row['requests']:>6} | {row['errors']:>5} | {row['rps']:>7.1f} | "
+              f"{row['p50_ms']:>8.0f} | {row['p95_ms']:>8.0f} | {row['p99_ms']:>8.0f}")
+    db, process = result["db"], result["process"]
+    print(f"pool MySQL: {db['pool_in_use_max']} em uso no pico de {db['pool_size']} "
+          f"({db['pool_checkout_timeouts']} timeouts); Threads_connected máx: {db['mysql_threads_connected_max']}")
+    print(f"processo: RSS {process['rss_mb_start']} -> {process['rss_mb_end']} MB "
+          f"(pico {process['rss_mb_max']}), {process['threads_max']} threads no pico")
+
+
+def compare(base_path: str, new_path: str):
+    """Variação por rota entre duas execuções (positivo = mais lento / mais vazão)"""
+    with open(base_path, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"{base['meta']['commit']} -> {new['meta']['commit']}")
+    if base["meta"]["config"] != new["meta"]["config"]:
+        print("aviso: as execuções usaram configurações diferentes")
+    print(f"{'rota':<22} | {'req/s':>8} | {'p50':>8} | {'p95':>8} | {'p99':>8} | {'erros':>11}")
+
+    def delta(old, value):
+        return f"{(value - old) / old * 100:+7.1f}%" if old else f"{'-':>8}"
+
+    rows = [(route, base["routes"].get(route), row) for route, row in new["routes"].items()]
+    for route, old, row in rows + [("total", base["totals"], new["totals"])]:
+        if old is None:
+            print(f"{route:<22} | (nova rota)")
+            continue
+        print(f"{route:<22} | {delta(old['rps'], row['rps'])} | {delta(old['p50_ms'], row['p50_ms'])} | "
+              f"{delta(old['p95_ms'], row['p95_ms'])} | {delta(old['p99_ms'], row['p99_ms'])} | "
+              f"{old['errors']:>5}->{row['errors']:<5}")
+    for section, key in (("db", "pool_in_use_max"), ("db", "mysql_threads_connected_max"), ("process", "rss_mb_max")):
+        print(f"{section}.{key}: {base[section][key]} -> {new[section][key]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suíte de carga da API NutriNow")
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="padrao")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=60, help="segundos medidos, depois do aquecimento")
+    parser.add_argument("--warmup", type=float, default=10)
+    parser.add_argument("--ramp", type=float, default=10, help="segundos para todos os usuários entrarem")
+    parser.add_argument("--think-ms", type=float, default=1000, help="pausa média entre ações de um usuário")
+    parser.add_argument("--latency-ms", type=float, default=800, help="latência do LLM fake até o 1º token")
+    parser.add_argument("--token-ms", type=float, default=10)
+    parser.add_argument("--provider", choices=["fake", "replay"], default="fake",
+                        help="replay: respostas gravadas em cassetes (ver Cassette_LLM)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--run-id", default="suite", help="sufixo dos e-mails; mesmo id reaproveita os usuários")
+    parser.add_argument("--signed-cookies", action="store_true",
+                        help="pula /cadastro e /login e assina o cookie de sessão (sem usuários no banco)")
+    parser.add_argument("--output", help="arquivo JSON do resultado")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NOVO"), help="compara dois resultados e sai")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    config = {key: getattr(args, key) for key in
+              ("mode", "mix", "users", "duration", "warmup", "ramp", "think_ms", "latency_ms", "token_ms", "provider",
+               "seed", "signed_cookies")}
+    env = {
+        "NUTRINOW_LLM_PROVIDER": args.provider,
+        "NUTRINOW_FAKE_LATENCY_MS": str(args.latency_ms),
+        "NUTRINOW_FAKE_TOKEN_MS": str(args.token_ms),
+        "NUTRINOW_AUTO_MIGRATE": "1",
+        "AGENT_CACHE_MAX_ENTRIES": str(args.users * 2),
+        "TIMING_LOG_ENABLED": "0",
+    }
+    log_path = os.path.join(tempfile.gettempdir(), f"nutrinow_suite_{args.mode}.log")
+    print(f"mix {args.mix}, {args.users} usuários, modo {args.mode}, {args.duration:.0f} s medidos, "
+          f"LLM {args.provider} ({args.latency_ms:.0f} ms + {args.token_ms:.0f} ms/token no fake; log em {log_path})")
+
+    with Server(args.mode, env=env, log_path=log_path) as server:
+        result = asyncio.run(LoadSuite(server, args).run())
+    result = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "host": platform.node(),
+            "mix_weights": MIXES[args.mix],
+            "config": config,
+        },
+        **result,
+    }
+    print_report(result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"resultado salvo em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# bench_memory.py
+"""Compara a memória "buffer" com a "summary" (janela + resumo) conforme o histórico cresce.
+
+Uso (a partir de Prot_TG_BackEnd/):  python benchmarks/bench_memory.py
+Não usa MySQL nem a API do Gemini: o histórico fica em memória e o resumo vem de um modelo fake.
+"""
+import gc, time
+
+from _fakes import InMemoryHistory
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain.schema import HumanMessage, AIMessage
+from Nutri import CustomConversationBufferMemory, SummaryWindowMemory, estimate_tokens
+
+TURN_TEXT = "Quero montar uma dieta para hipertrofia com cerca de 2800 kcal e 160 g de proteína por dia. "
+SIZES = [10, 100, 1000, 5000]
+ROUNDS = 20
+
+
+def build_history(size: int) -> InMemoryHistory:
+    messages = [
+        HumanMessage(content=TURN_TEXT) if i % 2 == 0 else AIMessage(content=TURN_TEXT * 3)
+        for i in range(size)
+    ]
+    summary = "Usuário busca hipertrofia, 80 kg, treina 5x por semana." if size else ""
+    return InMemoryHistory(messages, summary)
+
+
+def measure(mode: str, size: int) -> dict:
+    llm = FakeListChatModel(responses=["Resumo: usuário busca hipertrofia com 2800 kcal e 160 g de proteína."])
+    build_times, turn_times, tokens = [], [], []
+    histories = [build_history(size) for _ in range(ROUNDS)]
+    for history in histories:
+        gc.collect()
+        gc.disable()
+        start = time.perf_counter()
+        if mode == "summary":
+            memory = SummaryWindowMemory(chat_history=history, llm=llm, max_token_limit=2000, window_turns=6,
+                                         memory_key="chat_history", return_messages=True)
+        else:
+            memory = CustomConversationBufferMemory(chat_history=history, memory_key="chat_history",
+                                                    return_messages=True)
+        build_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        prompt = memory.load_memory_variables({})["chat_history"]
+        memory.save_context({"input": TURN_TEXT}, {"output": TURN_TEXT * 3})
+        turn_times.append(time.perf_counter() - start)
+        gc.enable()
+        if mode == "summary":
+            # O resumo roda fora da requisição; não entra no tempo do turno
+            memory.wait_for_summary()
+        tokens.append(sum(estimate_tokens(str(msg.content)) for msg in prompt))
+
+    return {
+        "build_ms": sum(build_times) / ROUNDS * 1000,
+        "turn_ms": sum(turn_times) / ROUNDS * 1000,
+        "prompt_tokens": sum(tokens) // ROUNDS,
+    }
+
+
+if __name__ == "__main__":
+    print(f"{'modo':<8} {'mensagens':>9} {'tokens prompt':>14} {'build ms':>9} {'turno ms':>9}")
+    for mode in ("buffer", "summary"):
+        for size in SIZES:
+            r = measure(mode, size)
+            print(f"{mode:<8} {size:>9} {r['prompt_tokens']:>14} {r['build_ms']:>9.3f} {r['turn_ms']:>9.3f}")
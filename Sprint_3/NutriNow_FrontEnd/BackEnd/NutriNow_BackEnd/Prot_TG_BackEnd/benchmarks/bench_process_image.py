@@ -0,0 +1,74 @@
+# bench_process_image.py
+"""Compara o pré-processamento antigo de imagens (decodificação completa + LANCZOS) com o atual
+(draft do JPEG + passthrough de JPEGs pequenos) em fotos de vários tamanhos.
+
+Uso (a partir de Prot_TG_BackEnd/):  python benchmarks/bench_process_image.py
+Gera JPEGs sintéticos em um diretório temporário; não chama a API do Gemini.
+"""
+import os, statistics, tempfile, time
+from io import BytesIO
+
+import _fakes
+_fakes.install()
+from PIL import Image, ImageDraw
+from Food_Analyser import FoodAnalyser
+
+# (rótulo, largura, altura)
+SIZES = [("0.3 MP", 640, 480), ("2 MP", 1600, 1200), ("12 MP", 4000, 3000), ("24 MP", 6000, 4000)]
+ROUNDS = 10
+
+
+def legacy_prepare(image_path: str) -> tuple:
+    """Caminho anterior: decodificação completa, LANCZOS e recodificação sempre"""
+    with Image.open(image_path) as image:
+        if image.mode in ('RGBA', 'LA'):
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        max_size = (1024, 1024)
+        if image.size[0] > max_size[0] or image.size[1] > max_size[1]:
+            image.thumbnail(max_size, Image.Resampling.LANCZOS)
+        buffered = BytesIO()
+        image.save(buffered, format="JPEG", quality=85, optimize=True)
+        return buffered.getvalue(), FoodAnalyser._perceptual_signature(image)
+
+
+def make_photo(path: str, width: int, height: int):
+    """Foto sintética com gradiente e formas, para o JPEG não ficar trivialmente compressível"""
+    image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    for i in range(40):
+        x, y = (i * 7919) % width, (i * 104729) % height
+        r = max(width, height) // 20
+        draw.ellipse((x, y, x + r, y + r), fill=((i * 53) % 256, (i * 97) % 256, (i * 193) % 256))
+    image.save(path, format="JPEG", quality=90)
+
+
+def measure(func, path: str) -> float:
+    times = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        func(path)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    analyser = FoodAnalyser.__new__(FoodAnalyser)
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'tamanho':>8} | {'arquivo':>9} | {'antigo (ms)':>11} | {'atual (ms)':>10} | {'ganho':>6} | saída antiga/atual")
+        for label, width, height in SIZES:
+            path = os.path.join(tmp, f"{width}x{height}.jpg")
+            make_photo(path, width, height)
+            legacy = measure(legacy_prepare, path)
+            current = measure(analyser._prepare_image, path)
+            legacy_out = len(legacy_prepare(path)[0]) // 1024
+            current_out = len(analyser._prepare_image(path)[0]) // 1024
+            print(f"{label:>8} | {os.path.getsize(path) // 1024:>6} KB | {legacy:>11.1f} | {current:>10.1f} | "
+                  f"{legacy / current:>5.1f}x | {legacy_out} KB / {current_out} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# test_agent_cache.py
+"""Cache de agentes: total de bytes mantido incrementalmente, sem varrer todas as sessões.
+
+Uso (a partir de Prot_TG_BackEnd/, com benchmarks/requirements.txt instalado):  python -m pytest benchmarks/test_agent_cache.py
+"""
+import _fakes
+_fakes.install()
+from Agent_Cache import AgentCache
+
+
+class SizedAgent:
+    """Agente dublê com tamanho ajustável que conta as chamadas a approx_size"""
+    size_calls = 0
+
+    def __init__(self, size: int):
+        self.size = size
+        self.closed = False
+
+    def approx_size(self) -> int:
+        SizedAgent.size_calls += 1
+        return self.size
+
+    def close(self):
+        self.closed = True
+
+
+def test_access_measures_only_the_touched_agent():
+    cache = AgentCache(max_entries=100, idle_ttl=0, max_bytes=10_000)
+    for i in range(50):
+        cache.get_or_create(f"s{i}", lambda: SizedAgent(100))
+
+    SizedAgent.size_calls = 0
+    for _ in range(10):
+        cache.get_or_create("s0", lambda: SizedAgent(100))
+    assert SizedAgent.size_calls == 10
+    assert cache.stats()["approx_bytes"] == 50 * 100
+
+
+def test_growth_of_touched_agent_triggers_memory_eviction():
+    cache = AgentCache(max_entries=10, idle_ttl=0, max_bytes=1_000)
+    agents = {key: cache.get_or_create(key, lambda: SizedAgent(300)) for key in ("a", "b", "c")}
+    assert cache.stats()["approx_bytes"] == 900
+
+    agents["c"].size = 800  # a conversa de "c" cresceu
+    cache.get_or_create("c", lambda: SizedAgent(300))
+
+    stats = cache.stats()
+    assert agents["a"].closed and agents["b"].closed and not agents["c"].closed
+    assert stats["entries"] == 1 and stats["approx_bytes"] == 800
+    assert stats["evictions"]["memory"] == 2
+
+
+def test_pop_and_clear_keep_total_consistent():
+    cache = AgentCache(max_entries=10, idle_ttl=0)
+    cache.get_or_create("a", lambda: SizedAgent(200))
+    cache.get_or_create("b", lambda: SizedAgent(300))
+    cache.pop("a")
+    assert cache.stats()["approx_bytes"] == 300
+    cache.clear()
+    assert cache.stats()["approx_bytes"] == 0
@@ -0,0 +1,88 @@
+# test_asgi_stream.py
+"""Streaming do modo ASGI: a vaga de admissão volta mesmo quando o stream é abandonado.
+
+Uso (a partir de Prot_TG_BackEnd/, com benchmarks/requirements.txt instalado):  python -m pytest benchmarks/test_asgi_stream.py
+"""
+import asyncio, gc, json
+
+import pytest
+
+from _fakes import TokenLatencyFakeModel, make_agent
+
+QUESTION = "Quanto de proteína devo comer para ganhar massa?"
+ANSWER = "Para hipertrofia, distribua 1,6 a 2,2 g de proteína por kg ao longo do dia."
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    # 20 ms por caractere: o stream ainda está aberto quando o cliente desiste
+    agent = make_agent(TokenLatencyFakeModel(responses=[ANSWER], sleep=0.02), session_id="asgi",
+                       monkeypatch=monkeypatch)
+    assert agent.admission is not None
+    return agent
+
+
+@pytest.fixture
+def asgi(agent, monkeypatch):
+    import Asgi
+    monkeypatch.setattr(Asgi, "get_agent", lambda **kwargs: agent)
+    return Asgi
+
+
+async def wait_released(admission, timeout: float = 2.0) -> int:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while admission.stats()["in_flight"] and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.01)
+    return admission.stats()["in_flight"]
+
+
+def test_client_disconnect_mid_stream_releases_ticket(asgi, agent):
+    async def scenario():
+        client = asgi.quart_app.test_client()
+        async with client.session_transaction() as session:
+            session["user_id"] = 1
+        async with client.request("/chat/stream", method="POST",
+                                  headers={"Content-Type": "application/json"}) as connection:
+            await connection.send(json.dumps({"message": QUESTION}).encode())
+            await connection.send_complete()
+            first = await connection.receive()
+            assert b"event: start" in first
+            assert agent.admission.stats()["in_flight"] == 1
+            await connection.disconnect()
+        return await wait_released(agent.admission)
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_response_never_sent_releases_ticket(asgi, agent):
+    async def scenario():
+        async with asgi.quart_app.test_request_context("/chat/stream", method="POST"):
+            response = await asgi.stream_chat_response(agent, "asgi", QUESTION)
+        assert agent.admission.stats()["in_flight"] == 1
+        # A view respondeu mas o corpo nunca foi iterado (ex.: cliente caiu antes do envio)
+        del response
+        gc.collect()
+        return agent.admission.stats()["in_flight"]
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_model_error_mid_stream_ends_with_unsuccessful_done(monkeypatch):
+    import Asgi
+    llm = TokenLatencyFakeModel(responses=[ANSWER], sleep=0, error_on_chunk_number=5)
+    agent = make_agent(llm, session_id="asgi", monkeypatch=monkeypatch)
+    monkeypatch.setattr(Asgi, "get_agent", lambda **kwargs: agent)
+
+    async def scenario():
+        client = Asgi.quart_app.test_client()
+        async with client.session_transaction() as session:
+            session["user_id"] = 1
+        response = await client.post("/chat/stream", json={"message": QUESTION})
+        return (await response.get_data()).decode()
+
+    blocks = asyncio.run(scenario()).strip().split("\n\n")
+    assert blocks[0].startswith("event: start") and blocks[-1].startswith("event: done")
+    done = json.loads(blocks[-1].split("data: ", 1)[1])
+    assert done["success"] is False and done["error"]
+    assert agent.chat_history.messages == []
+    assert agent.admission.stats()["in_flight"] == 0
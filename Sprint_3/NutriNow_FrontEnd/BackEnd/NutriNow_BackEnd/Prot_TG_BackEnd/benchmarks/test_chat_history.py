@@ -0,0 +1,46 @@
+# test_chat_history.py
+"""/chat_history: cursores de paginação inválidos são recusados com 400.
+
+Uso (a partir de Prot_TG_BackEnd/, com benchmarks/requirements.txt instalado):  python -m pytest benchmarks/test_chat_history.py
+"""
+import pytest
+
+import _fakes
+_fakes.install()
+
+
+class PagedHistory:
+    """Dublê do MySQLChatHistory que guarda os cursores recebidos"""
+    calls = []
+
+    def __init__(self, **kwargs):
+        pass
+
+    def get_history_page(self, by_user, before_id, after_id, limit):
+        PagedHistory.calls.append((before_id, after_id, limit))
+        return {"messages": [], "next_cursor": None, "has_more": False}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import App
+    PagedHistory.calls = []
+    monkeypatch.setattr(App, "MySQLChatHistory", PagedHistory)
+    App.app.config["TESTING"] = True
+    with App.app.test_client() as client:
+        with client.session_transaction() as session:
+            session["user_id"] = 1
+        yield client
+
+
+@pytest.mark.parametrize("query", ["before_id=abc", "before_id=-5", "after_id=1.5", "after_id=", "before_id=%20"])
+def test_invalid_cursor_is_rejected(client, query):
+    response = client.get(f"/chat_history?session_id=s&{query}")
+    assert response.status_code == 400
+    assert PagedHistory.calls == []
+
+
+def test_valid_cursors_reach_the_history(client):
+    assert client.get("/chat_history?session_id=s&before_id=42&limit=10").status_code == 200
+    assert client.get("/chat_history?session_id=s&after_id=0").status_code == 200
+    assert PagedHistory.calls == [(42, None, 10), (None, 0, 50)]
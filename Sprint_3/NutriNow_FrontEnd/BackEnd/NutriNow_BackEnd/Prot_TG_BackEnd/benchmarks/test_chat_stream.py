@@ -0,0 +1,126 @@
+# test_chat_stream.py
+"""Streaming do chat: ordem dos eventos SSE e gravação da resposta completa.
+
+Uso (a partir de Prot_TG_BackEnd/, com benchmarks/requirements.txt instalado):  python -m pytest benchmarks/test_chat_stream.py
+Sem MySQL e sem a API do Gemini: agente com histórico em memória e o modelo fake.
+"""
+import json
+
+import pytest
+
+from _fakes import TokenLatencyFakeModel, make_agent
+from Nutri import ChatStreamError
+
+ANSWER = "Para hipertrofia, distribua 1,6 a 2,2 g de proteína por kg ao longo do dia."
+QUESTION = "Quanto de proteína devo comer para ganhar massa?"
+
+
+def read_sse(response) -> list:
+    """[(evento, dados)] na ordem em que foram enviados; fecha a resposta como o servidor WSGI"""
+    body = response.get_data(as_text=True)
+    response.close()
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    return make_agent(TokenLatencyFakeModel(responses=[ANSWER], sleep=0), session_id="test-stream",
+                      monkeypatch=monkeypatch)
+
+
+@pytest.fixture
+def failing_agent(monkeypatch):
+    # O modelo cai depois do 5º pedaço da resposta
+    llm = TokenLatencyFakeModel(responses=[ANSWER], sleep=0, error_on_chunk_number=5)
+    return make_agent(llm, session_id="test-stream", monkeypatch=monkeypatch)
+
+
+def app_client(agent, monkeypatch):
+    import App
+    monkeypatch.setattr(App, "get_agent", lambda **kwargs: agent)
+    App.app.config["TESTING"] = True
+    with App.app.test_client() as client:
+        with client.session_transaction() as session:
+            session["user_id"] = 1
+            session["user_email"] = "teste@nutrinow.com"
+        yield client
+
+
+@pytest.fixture
+def client(agent, monkeypatch):
+    yield from app_client(agent, monkeypatch)
+
+
+@pytest.fixture
+def failing_client(failing_agent, monkeypatch):
+    yield from app_client(failing_agent, monkeypatch)
+
+
+def test_stream_text_yields_pieces_and_saves_reply_once(agent):
+    parts = list(agent.stream_text(QUESTION))
+
+    assert len(parts) > 1
+    assert "".join(parts) == ANSWER
+    saved = agent.chat_history.messages
+    assert [(msg.type, msg.content) for msg in saved] == [("human", QUESTION), ("ai", ANSWER)]
+
+
+def test_chat_stream_route_sends_start_tokens_done(client, agent):
+    response = client.post("/chat/stream", json={"message": QUESTION}, headers={"X-Session-ID": "test-stream"})
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    events = read_sse(response)
+    names = [name for name, _ in events]
+    assert names[0] == "start" and names[-1] == "done"
+    assert set(names[1:-1]) == {"token"} and len(names) > 3
+    assert events[0][1] == {"session_id": "test-stream"}
+    assert events[-1][1] == {"success": True, "session_id": "test-stream"}
+    assert "".join(data["token"] for name, data in events if name == "token") == ANSWER
+    # A resposta completa vai para o histórico uma única vez, ao fim do stream
+    ai_messages = [msg.content for msg in agent.chat_history.messages if msg.type == "ai"]
+    assert ai_messages == [ANSWER]
+    # A vaga de admissão do stream é devolvida ao fechar a resposta
+    if agent.admission is not None:
+        assert agent.admission.stats()["in_flight"] == 0
+
+
+def test_chat_accept_event_stream_uses_same_events(client):
+    response = client.post("/chat", json={"message": QUESTION}, headers={"Accept": "text/event-stream"})
+
+    names = [name for name, _ in read_sse(response)]
+    assert names[0] == "start" and names[-1] == "done" and set(names[1:-1]) == {"token"}
+
+
+def test_canned_reply_streams_without_admission_slot(client, agent):
+    assert agent.stream_ticket("oi") is None
+    response = client.post("/chat/stream", json={"message": "oi"})
+
+    events = read_sse(response)
+    assert [name for name, _ in events] == ["start", "token", "done"]
+    assert events[1][1]["token"].startswith("Olá sou seu assistente")
+
+
+def test_stream_text_raises_on_model_error_without_saving(failing_agent):
+    parts = []
+    with pytest.raises(ChatStreamError):
+        for token in failing_agent.stream_text(QUESTION):
+            parts.append(token)
+
+    assert parts and "".join(parts) != ANSWER
+    assert failing_agent.chat_history.messages == []
+
+
+def test_model_error_mid_stream_ends_with_unsuccessful_done(failing_client, failing_agent):
+    response = failing_client.post("/chat/stream", json={"message": QUESTION}, headers={"X-Session-ID": "test-stream"})
+
+    events = read_sse(response)
+    names = [name for name, _ in events]
+    assert names[0] == "start" and "token" in names and names[-1] == "done"
+    done = events[-1][1]
+    assert done["success"] is False and done["error"]
+    assert failing_agent.chat_history.messages == []
@@ -0,0 +1,95 @@
+# test_chat_writer.py
+"""Write-behind do chat_history: backoff sem consumir CPU enquanto o MySQL está fora.
+
+Uso (a partir de Prot_TG_BackEnd/, com benchmarks/requirements.txt instalado):  python -m pytest benchmarks/test_chat_writer.py
+"""
+import time
+from datetime import datetime
+
+import _fakes
+_fakes.install()
+from Chat_Writer import ChatHistoryWriter
+
+
+class FailingPool:
+    """Pool cujo MySQL está sempre fora do ar"""
+
+    def __init__(self):
+        self.attempts = 0
+
+    def run(self, func, retries=1):
+        self.attempts += 1
+        raise ConnectionError("MySQL indisponível")
+
+
+def test_backoff_does_not_spin_with_full_queue():
+    writer = ChatHistoryWriter(interval=0.05, batch_size=2, max_retries=1000)
+    pool = writer.pool = FailingPool()
+    try:
+        # Fila acima de batch_size: o loop não espera `interval`, só o backoff
+        for i in range(5):
+            writer.enqueue(("s", 1, None, "human", f"mensagem {i}", datetime.now()))
+        cpu_start, wall_start = time.process_time(), time.monotonic()
+        time.sleep(1.5)
+        cpu = time.process_time() - cpu_start
+        wall = time.monotonic() - wall_start
+        pending = writer.stats()["pending"]
+    finally:
+        writer.close()
+
+    assert pool.attempts >= 2
+    assert cpu < wall * 0.2, f"{cpu:.2f}s de CPU em {wall:.2f}s durante o backoff"
+    assert pending == 5
+
+
+class RecordingPool:
+    """Pool com um cursor que gera ids como o AUTO_INCREMENT"""
+
+    def __init__(self):
+        self.next_id = 100
+        self.calls = []
+        pool = self
+
+        class Cursor:
+            lastrowid = None
+
+            def execute(self, sql, row):
+                pool.next_id += 1
+                self.lastrowid = pool.next_id
+                pool.calls.append("execute")
+
+            def executemany(self, sql, rows):
+                pool.calls.append("executemany")
+
+            def close(self):
+                pass
+
+        class Conn:
+            def cursor(self):
+                return Cursor()
+
+            def commit(self):
+                pass
+
+        self.conn = Conn()
+
+    def run(self, func, retries=1):
+        return func(self.conn)
+
+
+def test_on_saved_receives_the_id_of_each_row():
+    writer = ChatHistoryWriter(interval=10, batch_size=50)
+    pool = writer.pool = RecordingPool()
+    saved = []
+    try:
+        writer.enqueue(("s", 1, None, "human", "pergunta", datetime.now()), saved.append)
+        writer.enqueue(("s", 1, None, "ai", "resposta", datetime.now()), saved.append)
+        assert writer.flush()
+        # Sem on_saved o lote continua num único executemany
+        writer.enqueue(("s", 1, None, "human", "outra", datetime.now()))
+        assert writer.flush()
+    finally:
+        writer.close()
+
+    assert saved == [101, 102]
+    assert pool.calls == ["execute", "execute", "executemany"]
@@ -0,0 +1,53 @@
+# test_image_admission.py
+"""Controle de admissão na análise de imagens: só a chamada ao modelo ocupa vaga.
+
+Uso (a partir de Prot_TG_BackEnd/, com benchmarks/requirements.txt instalado):  python -m pytest benchmarks/test_image_admission.py
+"""
+import pytest
+from PIL import Image
+
+import _fakes
+_fakes.install()
+from Admission import AdmissionController, AdmissionRejected
+from Analysis_Cache import AnalysisCache
+from Food_Analyser import FoodAnalyser
+
+
+def write_photo(path, color) -> str:
+    Image.new("RGB", (320, 240), color).save(path, "JPEG")
+    return str(path)
+
+
+@pytest.fixture
+def analyser(tmp_path):
+    analyser = FoodAnalyser()
+    analyser._cache = AnalysisCache(path=str(tmp_path / "analises.db"))
+    analyser._limiter = None
+    analyser._admission = AdmissionController(max_concurrent=1, max_queue=4, queue_timeout=0.1)
+    return analyser
+
+
+def test_cache_hit_does_not_take_admission_ticket(analyser, tmp_path):
+    photo = write_photo(tmp_path / "prato.jpg", (200, 120, 40))
+    first = analyser.analyze(photo, user_id=1)
+    assert first["ok"] and not first["cache_hit"]
+    assert analyser._admission.stats()["in_flight"] == 0
+
+    # Com a única vaga ocupada, o acerto de cache responde sem entrar na fila
+    held = analyser._admission.acquire("chat", user_id=2)
+    try:
+        again = analyser.analyze(photo, user_id=1)
+        assert again["ok"] and again["cache_hit"]
+        assert analyser._admission.stats()["in_flight"] == 1
+    finally:
+        held.release()
+
+
+def test_model_call_is_rejected_when_slots_are_taken(analyser, tmp_path):
+    photo = write_photo(tmp_path / "outro.jpg", (30, 160, 90))
+    held = analyser._admission.acquire("chat", user_id=2)
+    try:
+        with pytest.raises(AdmissionRejected):
+            analyser.analyze(photo, user_id=1)
+    finally:
+        held.release()
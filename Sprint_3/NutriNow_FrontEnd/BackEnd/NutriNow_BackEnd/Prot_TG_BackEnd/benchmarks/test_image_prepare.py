@@ -0,0 +1,67 @@
+# test_image_prepare.py
+"""Pré-processamento das fotos: passthrough sem metadados e assinatura na mesma escala.
+
+Uso (a partir de Prot_TG_BackEnd/, com benchmarks/requirements.txt instalado):  python -m pytest benchmarks/test_image_prepare.py
+"""
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+import _fakes
+_fakes.install()
+from Food_Analyser import FoodAnalyser
+
+
+def plate(size=(800, 600)) -> Image.Image:
+    """Foto sintética com estrutura suficiente para o dHash (gradiente + círculos)"""
+    image = Image.merge("RGB", [Image.linear_gradient("L").resize(size),
+                                Image.radial_gradient("L").resize(size),
+                                Image.linear_gradient("L").rotate(90).resize(size)])
+    return image
+
+
+def exif_with_gps() -> bytes:
+    exif = Image.Exif()
+    exif[0x010F] = "CameraCo"  # Make
+    exif[0x8825] = {2: (23.0, 33.0, 0.0)}  # GPSInfo: latitude
+    return exif.tobytes()
+
+
+def write_jpeg(path, exif: bytes = b"") -> str:
+    plate().save(path, "JPEG", quality=85, exif=exif)
+    return str(path)
+
+
+@pytest.fixture
+def analyser():
+    return FoodAnalyser()
+
+
+def test_jpeg_without_metadata_is_sent_as_is(analyser, tmp_path):
+    photo = write_jpeg(tmp_path / "limpo.jpg")
+    data, _ = analyser._prepare_image(photo)
+    with open(photo, "rb") as f:
+        assert data == f.read()
+
+
+def test_exif_is_stripped_before_sending(analyser, tmp_path):
+    photo = write_jpeg(tmp_path / "gps.jpg", exif=exif_with_gps())
+    with Image.open(photo) as original:
+        assert original.info.get("exif")
+
+    data, _ = analyser._prepare_image(photo)
+    with Image.open(BytesIO(data)) as sent:
+        assert not sent.info.get("exif")
+        assert not any(marker == "APP1" for marker, _ in sent.applist)
+
+
+def test_signature_matches_with_and_without_reencoding(analyser, tmp_path, monkeypatch):
+    import Food_Analyser
+    photo = write_jpeg(tmp_path / "limpo.jpg")
+    passthrough = analyser._prepare_image(photo)[1]
+    monkeypatch.setattr(Food_Analyser, "IMAGE_PASSTHROUGH_MAX_BYTES", 0)
+    reencoded = analyser._prepare_image(photo)[1]
+
+    assert bin(passthrough[0] ^ reencoded[0]).count("1") <= 2
+    assert all(abs(a - b) <= 2 for a, b in zip(passthrough[1], reencoded[1]))
@@ -0,0 +1,56 @@
+# test_job_recovery.py
+"""Recuperação da fila de análises: uma vez por processo, na subida, em qualquer entrada.
+
+Uso (a partir de Prot_TG_BackEnd/, com benchmarks/requirements.txt instalado):  python -m pytest benchmarks/test_job_recovery.py
+"""
+import asyncio, threading
+
+import pytest
+
+import _fakes
+_fakes.install()
+
+
+class RecoverSpy:
+    """Substitui ImageJobQueue.recover: conta as chamadas e a thread em que rodaram"""
+    def __init__(self):
+        self.threads = []
+        self.called = threading.Event()
+
+    def __call__(self) -> int:
+        self.threads.append(threading.current_thread().name)
+        self.called.set()
+        return 0
+
+
+@pytest.fixture
+def recover(monkeypatch):
+    import App
+    spy = RecoverSpy()
+    monkeypatch.setattr(App.image_jobs, "recover", spy)
+    monkeypatch.setattr(App, "_recovered_pid", None)
+    return spy
+
+
+def test_flask_recovers_once_on_first_request(recover):
+    import App
+    assert recover.threads == []  # importar não recupera
+    with App.app.test_client() as client:
+        for _ in range(3):
+            client.post("/logout")
+
+    assert recover.called.wait(2)
+    assert recover.threads == ["recover-image-jobs"]
+
+
+def test_asgi_startup_recovers_and_flask_hook_does_not_repeat(recover):
+    import Asgi
+
+    async def scenario():
+        async with Asgi.quart_app.test_app():
+            client = Asgi.quart_app.test_client()
+            await client.post("/logout")
+
+    asyncio.run(scenario())
+    assert recover.called.wait(2)
+    assert len(recover.threads) == 1
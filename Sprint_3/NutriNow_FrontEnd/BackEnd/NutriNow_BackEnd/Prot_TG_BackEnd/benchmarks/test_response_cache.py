@@ -0,0 +1,68 @@
+# test_response_cache.py
+"""Cache de respostas do /chat: a falta segue o caminho normal do agente, com o histórico.
+
+Uso (a partir de Prot_TG_BackEnd/, com benchmarks/requirements.txt instalado):  python -m pytest benchmarks/test_response_cache.py
+"""
+import asyncio, json
+
+import pytest
+
+from _fakes import TokenLatencyFakeModel, make_agent
+from Response_Cache import ResponseCache
+
+QUESTION = "Quais alimentos são ricos em ferro?"
+ANSWER = "Feijão, lentilha, espinafre e carnes vermelhas são boas fontes de ferro."
+# Formato de resposta final do agente ReAct conversacional
+AGENT_OUTPUT = "```json\n" + json.dumps({"action": "Final Answer", "action_input": ANSWER}) + "\n```"
+
+
+class RecordingFakeModel(TokenLatencyFakeModel):
+    """Modelo fake que guarda o texto de cada prompt recebido; com `fail` levanta erro"""
+    prompts: list = []
+    fail: bool = False
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs):
+        self.prompts.append("\n".join(str(message.content) for message in messages))
+        if self.fail:
+            raise RuntimeError("modelo indisponível")
+        return super()._call(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+@pytest.fixture
+def cache():
+    return ResponseCache(max_entries=10)
+
+
+def cached_agent(cache, monkeypatch, session_id, fail=False):
+    llm = RecordingFakeModel(responses=[AGENT_OUTPUT], sleep=0, prompts=[], fail=fail)
+    agent = make_agent(llm, session_id=session_id, monkeypatch=monkeypatch)
+    agent.response_cache = cache
+    return agent, llm
+
+
+def test_miss_uses_session_history_and_stores_answer(cache, monkeypatch):
+    agent, llm = cached_agent(cache, monkeypatch, "com-historico")
+    agent.memory.save_context({"input": "Sou vegetariano"}, {"output": "Anotado!"})
+
+    assert agent.run_text(QUESTION) == ANSWER
+    assert len(llm.prompts) == 1 and "Sou vegetariano" in llm.prompts[0]
+    assert cache.stats()["entries"] == 1
+    contents = [message.content for message in agent.chat_history.messages]
+    assert contents[-2:] == [QUESTION, ANSWER] and contents.count(ANSWER) == 1
+
+
+def test_hit_skips_model_and_saves_to_history(cache, monkeypatch):
+    first, _ = cached_agent(cache, monkeypatch, "primeira")
+    first.run_text(QUESTION)
+
+    second, llm = cached_agent(cache, monkeypatch, "segunda")
+    assert asyncio.run(second.arun_text(QUESTION)) == ANSWER
+    assert llm.prompts == []
+    assert [message.content for message in second.chat_history.messages] == [QUESTION, ANSWER]
+
+
+def test_model_error_is_not_cached(cache, monkeypatch):
+    agent, _ = cached_agent(cache, monkeypatch, "erro", fail=True)
+
+    assert agent.run_text(QUESTION).startswith("Desculpe")
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,125 @@
+# test_summary_memory.py
+"""Memória "summary": resumo fora da requisição e marca da última mensagem resumida.
+
+Uso (a partir de Prot_TG_BackEnd/, com benchmarks/requirements.txt instalado):  python -m pytest benchmarks/test_summary_memory.py
+"""
+import threading, time
+
+from _fakes import InMemoryHistory
+from langchain.schema import HumanMessage, AIMessage
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from Nutri import SummaryWindowMemory
+
+
+class GatedSummaryModel(FakeListChatModel):
+    """Modelo de resumo que só responde depois de `release` e guarda os prompts recebidos"""
+    prompts: list = []
+    release: threading.Event = None
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs):
+        self.prompts.append(messages[-1].content)
+        self.release.wait(5)
+        return super()._call(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+def turns(count: int, start: int = 0) -> list:
+    messages = []
+    for i in range(start, start + count):
+        messages += [HumanMessage(content=f"pergunta {i}"), AIMessage(content=f"resposta {i}")]
+    return messages
+
+
+def make_memory(history, llm, window_turns: int = 2) -> SummaryWindowMemory:
+    return SummaryWindowMemory(chat_history=history, llm=llm, max_token_limit=10_000, window_turns=window_turns,
+                               memory_key="chat_history", return_messages=True)
+
+
+def test_summary_runs_after_save_context_returns():
+    release = threading.Event()
+    llm = GatedSummaryModel(responses=["resumo 0"], prompts=[], release=release)
+    history = InMemoryHistory(turns(2))
+    memory = make_memory(history, llm)
+
+    start = time.perf_counter()
+    memory.save_context({"input": "pergunta 2"}, {"output": "resposta 2"})
+    assert time.perf_counter() - start < 1
+    # Enquanto o resumo não fica pronto o turno antigo continua na janela
+    assert len(memory.chat_memory.messages) == 6 and memory.summary == ""
+
+    release.set()
+    memory.wait_for_summary(5)
+    assert [msg.content for msg in memory.chat_memory.messages] == ["pergunta 1", "resposta 1",
+                                                                    "pergunta 2", "resposta 2"]
+    assert history.get_summary() == ("resumo 0", 2)
+
+
+def test_reload_starts_after_last_summarized_message():
+    release = threading.Event()
+    release.set()
+    llm = GatedSummaryModel(responses=["resumo 0 e 1"], prompts=[], release=release)
+    history = InMemoryHistory(turns(3), summary="resumo 0", last_message_id=2)
+
+    memory = make_memory(history, llm)
+    assert [msg.content for msg in memory.chat_memory.messages] == ["pergunta 1", "resposta 1",
+                                                                    "pergunta 2", "resposta 2"]
+    memory.save_context({"input": "pergunta 3"}, {"output": "resposta 3"})
+    memory.wait_for_summary(5)
+
+    # Só o turno 1 foi resumido agora; o turno 0 já estava no resumo
+    assert len(llm.prompts) == 1
+    assert "pergunta 1" in llm.prompts[0] and "pergunta 0" not in llm.prompts[0]
+    assert history.get_summary() == ("resumo 0 e 1", 4)
+    reloaded = make_memory(history, llm)
+    assert [msg.content for msg in reloaded.chat_memory.messages][0] == "pergunta 2"
+
+
+def test_clear_discards_summary_in_progress():
+    release = threading.Event()
+    llm = GatedSummaryModel(responses=["resumo antigo"], prompts=[], release=release)
+    history = InMemoryHistory(turns(2))
+    memory = make_memory(history, llm)
+
+    memory.save_context({"input": "pergunta 2"}, {"output": "resposta 2"})
+    memory.clear()
+    release.set()
+    memory.wait_for_summary(5)
+
+    assert memory.summary == "" and memory.chat_memory.messages == []
+    assert history.get_summary() == ("", None)
+
+
+def test_messages_between_summary_and_window_are_folded_on_load():
+    release = threading.Event()
+    release.set()
+    llm = GatedSummaryModel(responses=["resumo 0 a 2"], prompts=[], release=release)
+    # Resumo cobre só o turno 0 (ids 1-2); turnos 1 e 2 (ids 3-6) ficaram fora da janela
+    history = InMemoryHistory(turns(5), summary="resumo 0", last_message_id=2)
+
+    memory = make_memory(history, llm)
+    memory.wait_for_summary(5)
+
+    assert [msg.content for msg in memory.chat_memory.messages] == ["pergunta 3", "resposta 3",
+                                                                    "pergunta 4", "resposta 4"]
+    assert len(llm.prompts) == 1
+    assert "pergunta 1" in llm.prompts[0] and "resposta 2" in llm.prompts[0] and "pergunta 3" not in llm.prompts[0]
+    assert history.get_summary() == ("resumo 0 a 2", 6)
+
+
+def test_failed_writes_do_not_move_summary_past_saved_messages():
+    release = threading.Event()
+    release.set()
+    llm = GatedSummaryModel(responses=["resumo"], prompts=[], release=release)
+    history = InMemoryHistory()
+    memory = make_memory(history, llm, window_turns=1)
+
+    memory.save_context({"input": "pergunta 0"}, {"output": "resposta 0"})  # ids 1-2
+    history.fail_writes = 2
+    memory.save_context({"input": "pergunta 1"}, {"output": "resposta 1"})  # ids 3-4 perdidos
+    memory.wait_for_summary(5)
+    memory.save_context({"input": "pergunta 2"}, {"output": "resposta 2"})  # ids 5-6
+    memory.wait_for_summary(5)
+
+    # O turno 1 nunca foi gravado: a marca fica no turno 0 e o turno 2 continua fora do resumo
+    assert history.get_summary()[1] == 2
+    reloaded = make_memory(history, llm, window_turns=1)
+    assert [msg.content for msg in reloaded.chat_memory.messages] == ["pergunta 2", "resposta 2"]
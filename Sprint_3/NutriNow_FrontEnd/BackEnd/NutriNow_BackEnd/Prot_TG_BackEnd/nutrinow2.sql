@@ -1,12 +1,14 @@
-CREATE database nutrinow2;
+-- Retrato do esquema na versão 10 do Schema.MIGRATIONS, só para consulta.
+--
+-- A fonte da verdade é o Schema.py: crie e atualize o banco com `flask init-db`
+-- (ou `python Schema.py`); `python Schema.py --status` mostra a versão aplicada.
+-- Este arquivo não registra a tabela schema_migrations. Se ele for aplicado a um
+-- banco vazio, rode `flask init-db` em seguida: as migrações são idempotentes
+-- (CREATE ... IF NOT EXISTS e add_column/add_index checam o information_schema)
+-- e só então a versão fica registrada. Ao publicar uma migração nova, atualize
+-- também este retrato.
 
--- Banco de dados
-select * from usuarios;
-select * from perfil;
-select * from uploads;
-select * from chat_history;
-select * from redefinicao_senha;
-select * from dieta_treino;
+CREATE DATABASE IF NOT EXISTS nutrinow2;
 
 USE nutrinow2;
 
@@ -32,7 +34,7 @@ CREATE TABLE IF NOT EXISTS redefinicao_senha (
     FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
--- Tabela de histórico do chat
+-- Tabela de histórico do chat (índices: migrações 1, 2 e 4)
 CREATE TABLE IF NOT EXISTS chat_history (
     id INT AUTO_INCREMENT PRIMARY KEY,
     session_id VARCHAR(255) NOT NULL,
@@ -44,21 +46,36 @@ CREATE TABLE IF NOT EXISTS chat_history (
     INDEX idx_session_id (session_id),
     INDEX idx_user_id (user_id),
     INDEX idx_email (email),
+    INDEX idx_timestamp (timestamp),
+    INDEX idx_user_id_id (user_id, id),
+    INDEX idx_session_id_id (session_id, id),
     FOREIGN KEY (user_id) REFERENCES usuarios(id) ON DELETE SET NULL
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
--- Tabela salvar imagens
-CREATE TABLE uploads (
+-- Resumo incremental da conversa (migrações 3 e 10)
+CREATE TABLE IF NOT EXISTS chat_summary (
+    session_id VARCHAR(255) PRIMARY KEY,
+    user_id INT NULL,
+    summary TEXT NOT NULL,
+    last_message_id INT NULL,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_summary_user_id (user_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Tabela salvar imagens (content_hash: migração 8)
+CREATE TABLE IF NOT EXISTS uploads (
     id INT AUTO_INCREMENT PRIMARY KEY,
     user_id INT NOT NULL,
     file_path VARCHAR(255) NOT NULL,
+    content_hash CHAR(64) NULL,
     uploaded_at DATETIME NOT NULL,
     message_type ENUM('human','ai') NOT NULL DEFAULT 'human',
+    INDEX idx_uploads_content_hash (content_hash),
     FOREIGN KEY (user_id) REFERENCES usuarios(id) ON DELETE CASCADE
 );
 
 -- Tabela de criação de perfil de usuário
-CREATE TABLE perfil (
+CREATE TABLE IF NOT EXISTS perfil (
     usuario_id INT PRIMARY KEY,
     meta VARCHAR(255) DEFAULT 'Não definida',
     altura_peso VARCHAR(50) DEFAULT '-- / --',
@@ -78,14 +95,81 @@ CREATE TABLE IF NOT EXISTS dieta_treino (
     FOREIGN KEY (user_id) REFERENCES usuarios(id) ON DELETE CASCADE
 );
 
-delete from chat_history WHERE id > 0;
-ALTER TABLE chat_history AUTO_INCREMENT = 1;
+-- Fila persistente de análises de imagem (migrações 5 e 9)
+CREATE TABLE IF NOT EXISTS analysis_jobs (
+    id CHAR(36) PRIMARY KEY,
+    user_id INT NOT NULL,
+    session_id VARCHAR(255) NOT NULL,
+    email VARCHAR(255) NULL,
+    upload_id INT NULL,
+    file_path VARCHAR(255) NOT NULL,
+    status ENUM('queued','running','done','error') NOT NULL DEFAULT 'queued',
+    worker VARCHAR(64) NULL,
+    result MEDIUMTEXT NULL,
+    error TEXT NULL,
+    created_at DATETIME NOT NULL,
+    started_at DATETIME NULL,
+    finished_at DATETIME NULL,
+    INDEX idx_jobs_status (status, created_at),
+    INDEX idx_jobs_user (user_id, created_at),
+    FOREIGN KEY (user_id) REFERENCES usuarios(id) ON DELETE CASCADE,
+    FOREIGN KEY (upload_id) REFERENCES uploads(id) ON DELETE SET NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Nutrientes estruturados de cada análise de imagem (migração 6)
+CREATE TABLE IF NOT EXISTS meal_analyses (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    upload_id INT NOT NULL,
+    user_id INT NOT NULL,
+    meal_at DATETIME NOT NULL,
+    analyzed_at DATETIME NOT NULL,
+    kcal DECIMAL(8,1) NULL,
+    carbs_g DECIMAL(7,1) NULL,
+    protein_g DECIMAL(7,1) NULL,
+    fat_g DECIMAL(7,1) NULL,
+    saturated_fat_g DECIMAL(7,1) NULL,
+    fiber_g DECIMAL(7,1) NULL,
+    sodium_mg DECIMAL(8,1) NULL,
+    fields_parsed TINYINT NOT NULL DEFAULT 0,
+    reused TINYINT(1) NOT NULL DEFAULT 0,
+    UNIQUE KEY uq_meal_upload (upload_id),
+    INDEX idx_meal_user_time (user_id, meal_at),
+    FOREIGN KEY (upload_id) REFERENCES uploads(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES usuarios(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Rollup diário de nutrientes por usuário (migração 7)
+CREATE TABLE IF NOT EXISTS daily_nutrition (
+    user_id INT NOT NULL,
+    day DATE NOT NULL,
+    meals INT NOT NULL DEFAULT 0,
+    kcal DECIMAL(10,1) NOT NULL DEFAULT 0,
+    carbs_g DECIMAL(9,1) NOT NULL DEFAULT 0,
+    protein_g DECIMAL(9,1) NOT NULL DEFAULT 0,
+    fat_g DECIMAL(9,1) NOT NULL DEFAULT 0,
+    saturated_fat_g DECIMAL(9,1) NOT NULL DEFAULT 0,
+    fiber_g DECIMAL(9,1) NOT NULL DEFAULT 0,
+    sodium_mg DECIMAL(10,1) NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day),
+    FOREIGN KEY (user_id) REFERENCES usuarios(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Consultas de apoio ao desenvolvimento
+select * from usuarios;
+select * from perfil;
+select * from uploads;
+select * from chat_history;
+select * from redefinicao_senha;
+select * from dieta_treino;
+
+-- Limpeza do banco de desenvolvimento (apaga os dados!); comentada para não rodar junto com o esquema
+-- delete from chat_history WHERE id > 0;
+-- ALTER TABLE chat_history AUTO_INCREMENT = 1;
 
-DELETE FROM usuarios WHERE id > 0;
-ALTER TABLE usuarios AUTO_INCREMENT = 1;
+-- DELETE FROM usuarios WHERE id > 0;
+-- ALTER TABLE usuarios AUTO_INCREMENT = 1;
 
-DELETE FROM perfil WHERE usuario_id > 0;
-ALTER TABLE perfil AUTO_INCREMENT = 1;
+-- DELETE FROM perfil WHERE usuario_id > 0;
+-- ALTER TABLE perfil AUTO_INCREMENT = 1;
 
-DELETE FROM dieta_treino WHERE id > 0;
-ALTER TABLE dieta_treino AUTO_INCREMENT = 1;
\ No newline at end of file
+-- DELETE FROM dieta_treino WHERE id > 0;
@@ -77,7 +77,8 @@ export class ChatbotComponent implements OnInit, OnDestroy {
     this.chatService.getChatHistory().subscribe({
       next: (response) => {
         if (response.success && response.history?.length > 0) {
-          this.messages = response.history.map((msg: any) => ({
+          // A API devolve a página mais recente primeiro; a tela exibe em ordem cronológica
+          this.messages = [...response.history].reverse().map((msg: any) => ({
             text: msg.content,
             isUser: msg.type === 'human',
             timestamp: new Date(msg.timestamp || new Date())